@@ -0,0 +1,486 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+s3_client = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+dynamodb = boto3.resource('dynamodb')
+
+FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
+FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'users-dev')
+SHARED_LINKS_TABLE_NAME = os.environ.get('SHARED_LINKS_TABLE_NAME', 'SharedLinksTable-dev')
+BLOBS_TABLE_NAME = os.environ.get('BLOBS_TABLE_NAME', 'file-blobs-dev')
+ARCHIVES_TABLE_NAME = os.environ.get('ARCHIVES_TABLE_NAME', 'file-archives-dev')
+FILE_CHANGES_TABLE_NAME = os.environ.get('FILE_CHANGES_TABLE_NAME', 'file-changes-dev')
+USAGE_TABLE_NAME = os.environ.get('USAGE_TABLE_NAME', 'usage-dev')
+PURGES_TABLE_NAME = os.environ.get('PURGES_TABLE_NAME', 'account-purges-dev')
+SHARE_FILE_ARN = os.environ.get('SHARE_FILE_ARN', 'file-storage-dev-backend-share-file')
+files_table = dynamodb.Table(FILES_TABLE_NAME)
+users_table = dynamodb.Table(USERS_TABLE_NAME)
+shared_links_table = dynamodb.Table(SHARED_LINKS_TABLE_NAME)
+blobs_table = dynamodb.Table(BLOBS_TABLE_NAME)
+archives_table = dynamodb.Table(ARCHIVES_TABLE_NAME)
+file_changes_table = dynamodb.Table(FILE_CHANGES_TABLE_NAME)
+usage_table = dynamodb.Table(USAGE_TABLE_NAME)
+purges_table = dynamodb.Table(PURGES_TABLE_NAME)
+
+# SharedLinksTable GSI: a user's links, optionally narrowed to one file
+SHARE_OWNER_INDEX = 'userId-fileId-index'
+ARCHIVE_PREFIX = 'archives/'
+
+# Signed share links aren't stored; before their "#signed#..." markers go with
+# the user's other links, share_file (the revocation list's only writer) is
+# invoked to put the marked fileIds on the list.
+SIGNED_LINKS_MARKER = '#signed'
+
+# fileIds, blob digests and archive IDs are hex, so their first digit splits a
+# user's partition (and S3 prefix) into 16 ranges that are paged in parallel.
+# A final sequential sweep ('*') catches anything outside those ranges.
+SHARDS = '0123456789abcdef'
+SWEEP = '*'
+WORKERS = 8
+
+# BatchWriteItem takes 25 requests per call, DeleteObjects 1,000 keys
+BATCH_WRITE_SIZE = 25
+DELETE_BATCH_SIZE = 1000
+
+# Stop early, checkpoint and continue in a fresh invocation rather than be killed mid-batch
+MIN_REMAINING_MS = 60000
+# A running job not checkpointed for this long died; DELETE /account resumes it
+STALE_JOB_SECONDS = 1800
+
+# Share links go first so nothing stays publicly reachable; S3 (the slow part)
+# follows the tables. The change log and usage counters come last: deleting
+# FilesTable items streams "deleted" entries and usage decrements into them.
+# file_stream_processor drops records made before filesDeletedAt, however
+# late they arrive; the phases still wait STREAM_SETTLE_SECONDS so records it
+# was already writing when filesDeletedAt was set land before the delete.
+#
+# Left behind on purpose: the UsersTable row (only the listingVersion counter;
+# restarting it could let an ETag from before the purge match a later
+# listing) and FileTombstones rows (keyed by S3 prefix, so not queryable by
+# user; file_purger drops them on its next run, once their prefixes are empty).
+PHASES = ('shares', 'files', 'blobs', 'archives', 'objects', 'changes', 'usage')
+PHASE_COUNTERS = {
+    'shares': 'sharesDeleted',
+    'files': 'filesDeleted',
+    'blobs': 'blobsDeleted',
+    'archives': 'archivesDeleted',
+    'objects': 'versionsDeleted',
+    'changes': 'changesDeleted',
+    'usage': 'usageDeleted',
+}
+STREAM_SETTLE_SECONDS = 60
+
+RUNNING = 'running'
+COMPLETE = 'complete'
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Account closure: remove all of a user's data.
+
+    Routes (the caller's own account only):
+    - DELETE /account        - {"confirm": true}; 202, the purge runs in the background
+    - GET    /account/purge  - progress, counts and throughput of the purge
+
+    The purge runs as asynchronous invocations of this function
+    ({"purgeJob": {...}}). It revokes the user's signed share links and
+    deletes their stored ones, FilesTable items, blob and archive entries,
+    every S3 version and delete marker under "<userId>/" and the user's
+    archives, then their change log and usage counters. Each phase pages
+    the 16 hex ranges of the user's keys in parallel with batch deletes.
+
+    Progress is checkpointed in the purges table after every range, so an
+    invocation that runs low on time hands over to a fresh one, and a retried
+    or resumed invocation skips the ranges already done.
+    """
+    if 'purgeJob' in event:
+        return run_purge(event['purgeJob'], context)
+
+    try:
+        try:
+            user_id = event['requestContext']['authorizer']['claims']['sub']
+        except (KeyError, TypeError):
+            return _response(401, {'error': 'Unauthorized: Missing JWT claim'})
+
+        resource = event.get('resource')
+        method = event.get('httpMethod')
+
+        if resource == '/account' and method == 'DELETE':
+            try:
+                body = json.loads(event.get('body') or '{}')
+            except json.JSONDecodeError:
+                return _response(400, {'error': 'Request body must be valid JSON'})
+            if not isinstance(body, dict) or body.get('confirm') is not True:
+                return _response(400, {'error': 'Set "confirm": true to delete all account data'})
+            return start_purge(user_id, context)
+
+        if resource == '/account/purge' and method == 'GET':
+            job = purges_table.get_item(Key={'userId': user_id}, ConsistentRead=True).get('Item')
+            if not job:
+                return _response(404, {'error': 'No account purge found'})
+            return _response(200, _job_status(job))
+
+        return _response(404, {'error': f'Unsupported route: {method} {resource}'})
+
+    except Exception as e:
+        print(f"Error handling account request: {str(e)}")
+        return _response(500, {'error': str(e)})
+
+
+def start_purge(user_id: str, context: Any) -> Dict[str, Any]:
+    """Start a purge, or resume one whose invocation chain died."""
+    now = int(time.time())
+    job = purges_table.get_item(Key={'userId': user_id}, ConsistentRead=True).get('Item')
+
+    if job and job['status'] == RUNNING:
+        if int(job['updatedAt']) > now - STALE_JOB_SECONDS:
+            return _response(202, _job_status(job))
+        started_at = int(job['startedAt'])
+    else:
+        # First purge, or data written since the last one finished
+        started_at = now
+        job = {
+            'userId': user_id,
+            'status': RUNNING,
+            'phase': PHASES[0],
+            'startedAt': started_at,
+            'updatedAt': now,
+            'invocations': 0,
+            'activeMs': 0,
+        }
+        job.update({counter: 0 for counter in PHASE_COUNTERS.values()})
+        try:
+            purges_table.put_item(
+                Item=job,
+                ConditionExpression='attribute_not_exists(userId) OR #status <> :running',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':running': RUNNING}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # A concurrent request started it first
+            job = purges_table.get_item(Key={'userId': user_id}, ConsistentRead=True)['Item']
+            return _response(202, _job_status(job))
+
+    _continue(user_id, started_at, context)
+    return _response(202, _job_status(job))
+
+
+def run_purge(job_ref: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Work through the remaining phases until done or out of time."""
+    user_id = job_ref['userId']
+    started_at = int(job_ref['startedAt'])
+    job = purges_table.get_item(Key={'userId': user_id}, ConsistentRead=True).get('Item')
+    if not job or job['status'] != RUNNING or int(job['startedAt']) != started_at:
+        # A duplicate delivery of a finished or superseded job
+        return {'status': job['status'] if job else 'missing'}
+
+    invocation_started = time.time()
+    deleted = {counter: 0 for counter in PHASE_COUNTERS.values()}
+    phase = job['phase']
+    done_shards = set(job.get('doneShards', set()))
+    files_deleted_at = job.get('filesDeletedAt')
+
+    while phase in PHASES:
+        counter = PHASE_COUNTERS[phase]
+        if phase == 'shares':
+            # Idempotent, so a resumed shares phase simply repeats it
+            _revoke_signed_links(user_id)
+        elif phase in ('changes', 'usage') and files_deleted_at is not None:
+            settle = int(files_deleted_at) + STREAM_SETTLE_SECONDS - time.time()
+            if settle > 0:
+                time.sleep(settle)
+        # boto3 resources aren't thread-safe, so workers only get plain values
+        # and the (thread-safe) low-level client behind the phase's table
+        target = _phase_target(phase)
+        # Sort keys that aren't hex IDs (change log sequence numbers, content
+        # types) aren't split into ranges; the sweep takes them in one pass
+        sharded = target is None or target['rangeKey'] is not None
+        pending = [shard for shard in SHARDS if sharded and shard not in done_shards]
+
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            futures = {
+                executor.submit(_purge_shard, target, user_id, shard, context): shard
+                for shard in pending
+            }
+            for future in as_completed(futures):
+                count, finished = future.result()
+                deleted[counter] += count
+                _checkpoint(user_id, started_at, counter, count, futures[future] if finished else None)
+                if finished:
+                    done_shards.add(futures[future])
+
+        if all(shard in done_shards for shard in pending) and SWEEP not in done_shards:
+            count, finished = _purge_shard(target, user_id, SWEEP, context)
+            deleted[counter] += count
+            _checkpoint(user_id, started_at, counter, count, SWEEP if finished else None)
+            if finished:
+                done_shards.add(SWEEP)
+
+        if SWEEP not in done_shards:
+            # Out of time: pick up from the checkpoint in a fresh invocation
+            _finish_invocation(user_id, started_at, invocation_started, deleted, phase)
+            _continue(user_id, started_at, context)
+            return {'status': RUNNING, 'phase': phase, 'deleted': deleted}
+
+        finished_phase = phase
+        phase = PHASES[PHASES.index(phase) + 1] if phase != PHASES[-1] else COMPLETE
+        done_shards = set()
+        update_expression = 'SET phase = :phase, updatedAt = :now'
+        values = {':phase': phase, ':now': int(time.time())}
+        if finished_phase == 'files':
+            files_deleted_at = values[':now']
+            update_expression += ', filesDeletedAt = :now'
+        purges_table.update_item(
+            Key={'userId': user_id},
+            UpdateExpression=update_expression + ' REMOVE doneShards',
+            ExpressionAttributeValues=values
+        )
+        if phase == 'blobs':
+            # Clients holding a listing ETag see the now-empty listing
+            users_table.update_item(
+                Key={'userId': user_id},
+                UpdateExpression='ADD listingVersion :one',
+                ExpressionAttributeValues={':one': 1}
+            )
+
+    _finish_invocation(user_id, started_at, invocation_started, deleted, COMPLETE, status=COMPLETE)
+    return {'status': COMPLETE, 'deleted': deleted}
+
+
+def _purge_shard(target: Optional[Dict[str, Any]], user_id: str, shard: str, context: Any) -> Tuple[int, bool]:
+    """Delete one range of one phase (target None: S3 objects); returns (deleted, finished)."""
+    if target is None:
+        return _purge_objects(user_id, shard, context)
+
+    client = target['client']
+    key_attributes = target['keyAttributes']
+    key_condition = Key('userId').eq(user_id)
+    if shard != SWEEP:
+        key_condition = key_condition & Key(target['rangeKey']).begins_with(shard)
+    query_kwargs = {
+        'TableName': target['tableName'],
+        'KeyConditionExpression': key_condition,
+        'ProjectionExpression': ', '.join(key_attributes),
+    }
+    if target['index']:
+        query_kwargs['IndexName'] = target['index']
+
+    deleted = 0
+    while _has_time_left(context):
+        response = client.query(**query_kwargs)
+        keys = [{attribute: item[attribute] for attribute in key_attributes} for item in response.get('Items', [])]
+        _batch_delete(client, target['tableName'], keys)
+        deleted += len(keys)
+        if 'LastEvaluatedKey' not in response:
+            return deleted, True
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return deleted, False
+
+
+def _phase_target(phase: str) -> Optional[Dict[str, Any]]:
+    """What a DynamoDB phase deletes: client, table, index, sharded range key and key attributes.
+
+    The client is the table resource's, so it still takes plain Python values
+    and condition objects.
+    """
+    if phase == 'objects':
+        return None
+    if phase == 'shares':
+        table, index, range_key, key_attributes = shared_links_table, SHARE_OWNER_INDEX, 'fileId', ('shareToken',)
+    elif phase == 'files':
+        table, index, range_key, key_attributes = files_table, None, 'fileId', ('userId', 'fileId')
+    elif phase == 'blobs':
+        table, index, range_key, key_attributes = blobs_table, None, 'sha256', ('userId', 'sha256')
+    elif phase == 'archives':
+        table, index, range_key, key_attributes = archives_table, None, 'archiveId', ('userId', 'archiveId')
+    elif phase == 'changes':
+        table, index, range_key, key_attributes = file_changes_table, None, None, ('userId', 'changeId')
+    else:
+        table, index, range_key, key_attributes = usage_table, None, None, ('userId', 'contentType')
+    return {
+        'client': table.meta.client,
+        'tableName': table.name,
+        'index': index,
+        'rangeKey': range_key,
+        'keyAttributes': key_attributes,
+    }
+
+
+def _revoke_signed_links(user_id: str) -> None:
+    """Put every file the user holds signed links to on the revocation list."""
+    now = int(time.time())
+    signed = {}
+    query_kwargs = {
+        'IndexName': SHARE_OWNER_INDEX,
+        'KeyConditionExpression': Key('userId').eq(user_id),
+        'FilterExpression': Attr('shareToken').begins_with(f'{SIGNED_LINKS_MARKER}#'),
+    }
+    while True:
+        response = shared_links_table.query(**query_kwargs)
+        for marker in response.get('Items', []):
+            if int(marker.get('expiresAt', 0)) > now:
+                signed[marker['fileId']] = int(marker['expiresAt'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    if signed:
+        _revoke_signed_files(signed)
+
+
+def _revoke_signed_files(entries: dict) -> None:
+    """Have share_file, the revocation list's only writer, revoke {fileId: expiresAt}."""
+    response = lambda_client.invoke(
+        FunctionName=SHARE_FILE_ARN,
+        InvocationType='RequestResponse',
+        Payload=json.dumps({'revocations': entries})
+    )
+    if response.get('FunctionError'):
+        raise RuntimeError(f"share_file failed to revoke signed links: {response['Payload'].read()!r}")
+
+
+def _batch_delete(client: Any, table_name: str, keys: list) -> None:
+    for start in range(0, len(keys), BATCH_WRITE_SIZE):
+        requests = [{'DeleteRequest': {'Key': key}} for key in keys[start:start + BATCH_WRITE_SIZE]]
+        delay = 0.05
+        while requests:
+            response = client.batch_write_item(RequestItems={table_name: requests})
+            requests = response.get('UnprocessedItems', {}).get(table_name, [])
+            if requests:
+                time.sleep(delay)
+                delay = min(delay * 2, 5)
+
+
+def _purge_objects(user_id: str, shard: str, context: Any) -> Tuple[int, bool]:
+    """Delete every version and delete marker in one range of the user's S3 keys."""
+    if shard == SWEEP:
+        prefixes = [f'{user_id}/', f'{ARCHIVE_PREFIX}{user_id}/']
+        for prefix in prefixes:
+            _abort_multipart_uploads(prefix)
+    else:
+        prefixes = [f'{user_id}/{shard}']
+
+    deleted = 0
+    for prefix in prefixes:
+        while True:
+            if not _has_time_left(context):
+                return deleted, False
+            # Each pass deletes what it lists, so listing from the start always
+            # returns the next batch (MaxKeys counts versions and markers together)
+            page = s3_client.list_object_versions(Bucket=FILE_BUCKET_NAME, Prefix=prefix, MaxKeys=DELETE_BATCH_SIZE)
+            objects = [
+                {'Key': version['Key'], 'VersionId': version['VersionId']}
+                for version in page.get('Versions', []) + page.get('DeleteMarkers', [])
+            ]
+            if not objects:
+                break
+            response = s3_client.delete_objects(Bucket=FILE_BUCKET_NAME, Delete={'Objects': objects, 'Quiet': True})
+            errors = response.get('Errors', [])
+            if errors:
+                error = errors[0]
+                raise ClientError(
+                    {'Error': {'Code': error.get('Code', 'DeleteFailed'), 'Message': error.get('Message', error['Key'])}},
+                    'DeleteObjects'
+                )
+            deleted += len(objects)
+    return deleted, True
+
+
+def _abort_multipart_uploads(prefix: str) -> None:
+    paginator = s3_client.get_paginator('list_multipart_uploads')
+    for page in paginator.paginate(Bucket=FILE_BUCKET_NAME, Prefix=prefix):
+        for upload in page.get('Uploads', []):
+            try:
+                s3_client.abort_multipart_upload(Bucket=FILE_BUCKET_NAME, Key=upload['Key'], UploadId=upload['UploadId'])
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                    raise
+
+
+def _checkpoint(user_id: str, started_at: int, counter: str, count: int, finished_shard: Optional[str]) -> None:
+    """Record a range's deletes, and the range itself once it is empty."""
+    update_expression = 'SET updatedAt = :now ADD #counter :count'
+    values = {':now': int(time.time()), ':count': count, ':startedAt': started_at}
+    if finished_shard:
+        update_expression += ', doneShards :shard'
+        values[':shard'] = {finished_shard}
+    purges_table.update_item(
+        Key={'userId': user_id},
+        UpdateExpression=update_expression,
+        ConditionExpression='startedAt = :startedAt',
+        ExpressionAttributeNames={'#counter': counter},
+        ExpressionAttributeValues=values
+    )
+
+
+def _finish_invocation(user_id: str, started_at: int, invocation_started: float,
+                       deleted: Dict[str, int], phase: str, status: str = RUNNING) -> None:
+    elapsed_ms = int((time.time() - invocation_started) * 1000)
+    total = sum(deleted.values())
+    rate = total / (elapsed_ms / 1000) if elapsed_ms else 0.0
+    print(f"Account purge {user_id}: {total} deleted in {elapsed_ms} ms ({rate:.0f}/s), "
+          f"phase {phase}: {json.dumps(deleted)}")
+    purges_table.update_item(
+        Key={'userId': user_id},
+        UpdateExpression='SET #status = :status, updatedAt = :now ADD invocations :one, activeMs :elapsed',
+        ConditionExpression='startedAt = :startedAt',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={
+            ':status': status,
+            ':now': int(time.time()),
+            ':one': 1,
+            ':elapsed': elapsed_ms,
+            ':startedAt': started_at,
+        }
+    )
+
+
+def _continue(user_id: str, started_at: int, context: Any) -> None:
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'purgeJob': {'userId': user_id, 'startedAt': started_at}})
+    )
+
+
+def _job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    counts = {counter: int(job.get(counter, 0)) for counter in PHASE_COUNTERS.values()}
+    active_seconds = int(job.get('activeMs', 0)) / 1000
+    total = sum(counts.values())
+    return {
+        'status': job['status'],
+        'phase': job['phase'],
+        'startedAt': int(job['startedAt']),
+        'updatedAt': int(job['updatedAt']),
+        'invocations': int(job.get('invocations', 0)),
+        'deleted': counts,
+        'activeSeconds': active_seconds,
+        'deletesPerSecond': round(total / active_seconds, 1) if active_seconds else None,
+    }
+
+
+def _has_time_left(context: Any) -> bool:
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return True
+    return context.get_remaining_time_in_millis() > MIN_REMAINING_MS
+
+
+def _response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
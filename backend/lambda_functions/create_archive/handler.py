@@ -0,0 +1,413 @@
+import hashlib
+import json
+import os
+import time
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, List
+
+import boto3
+from botocore.exceptions import ClientError
+
+s3_client = boto3.client('s3')
+lambda_client = boto3.client('lambda')
+dynamodb = boto3.resource('dynamodb')
+
+FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
+FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+ARCHIVES_TABLE_NAME = os.environ.get('ARCHIVES_TABLE_NAME', 'file-archives-dev')
+files_table = dynamodb.Table(FILES_TABLE_NAME)
+archives_table = dynamodb.Table(ARCHIVES_TABLE_NAME)
+
+# Archives live outside the "<userId>/<fileId>/<fileName>" layout; the bucket
+# lifecycle expires this prefix after a day
+ARCHIVE_PREFIX = 'archives/'
+
+# Request limits; BatchGetItem reads at most 100 keys per call
+MAX_ARCHIVE_FILES = 1000
+MAX_ARCHIVE_BYTES = 5 * 1024 * 1024 * 1024
+BATCH_GET_SIZE = 100
+
+# A finished archive is served from cache for this long
+ARCHIVE_TTL_SECONDS = 12 * 3600
+# A build that hasn't finished by now died with its Lambda (timeout is 900s)
+STALE_BUILD_SECONDS = 1000
+DOWNLOAD_URL_EXPIRY_SECONDS = 3600
+
+# Memory stays at about one part buffer plus one read chunk, whatever the archive size
+PART_SIZE = 8 * 1024 * 1024
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Deflate only what is likely to shrink; media and archives are stored as-is
+COMPRESSIBLE_CONTENT_TYPES = ('application/json', 'application/xml', 'application/javascript',
+                              'application/x-ndjson', 'image/svg+xml')
+
+BUILDING = 'building'
+READY = 'ready'
+FAILED = 'failed'
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    "Download selected as ZIP".
+
+    Routes (all scoped to the caller's own files):
+    - POST /files/archive              - {"fileIds": [...]}; 200 with a URL if a cached
+                                         archive exists, otherwise 202 and a build starts
+    - GET  /files/archive/{archiveId}  - poll a build; 200 with a URL once ready
+
+    Builds run as an asynchronous invocation of this function
+    ({"archiveJob": {...}}). Objects are streamed from S3 through zipfile into
+    an S3 multipart upload, so memory use doesn't depend on archive size.
+
+    The archiveId is a digest of the selected files and their ETags, so the
+    same selection is served from the cached archive until a file changes or
+    the cache entry expires.
+    """
+    if 'archiveJob' in event:
+        return build_archive(event['archiveJob'])
+
+    try:
+        try:
+            user_id = event['requestContext']['authorizer']['claims']['sub']
+        except (KeyError, TypeError):
+            return _response(401, {'error': 'Unauthorized: Missing JWT claim'})
+
+        resource = event.get('resource')
+        method = event.get('httpMethod')
+
+        if resource == '/files/archive' and method == 'POST':
+            try:
+                body = json.loads(event.get('body') or '{}')
+            except json.JSONDecodeError:
+                return _response(400, {'error': 'Request body must be valid JSON'})
+            if not isinstance(body, dict):
+                return _response(400, {'error': 'Request body must be a JSON object'})
+            return request_archive(user_id, body, context)
+
+        if resource == '/files/archive/{archiveId}' and method == 'GET':
+            archive_id = (event.get('pathParameters') or {}).get('archiveId')
+            if not archive_id:
+                return _response(400, {'error': 'archiveId is required'})
+            return get_archive(user_id, archive_id)
+
+        return _response(404, {'error': f'Unsupported route: {method} {resource}'})
+
+    except Exception as e:
+        print(f"Error handling archive request: {str(e)}")
+        return _response(500, {'error': str(e)})
+
+
+def request_archive(user_id: str, body: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """Return the cached archive for this selection, or start building it."""
+    file_ids = body.get('fileIds')
+    if (not isinstance(file_ids, list) or not 0 < len(file_ids) <= MAX_ARCHIVE_FILES
+            or any(not isinstance(file_id, str) or not file_id for file_id in file_ids)):
+        return _response(400, {'error': f'fileIds must be a list of 1-{MAX_ARCHIVE_FILES} file IDs'})
+    file_ids = sorted(set(file_ids))
+
+    items = _get_items(user_id, file_ids)
+    found = [file_id for file_id in file_ids if file_id in items]
+    skipped = [file_id for file_id in file_ids if file_id not in items]
+    if not found:
+        return _response(404, {'error': 'None of the selected files are available', 'skipped': skipped})
+
+    total_size = sum(int(items[file_id].get('size', items[file_id].get('fileSize', 0)) or 0) for file_id in found)
+    if total_size > MAX_ARCHIVE_BYTES:
+        return _response(400, {'error': f'Selected files exceed the {MAX_ARCHIVE_BYTES} byte archive limit'})
+
+    archive_id = _archive_id([items[file_id] for file_id in found])
+    now = int(time.time())
+
+    cached = archives_table.get_item(Key={'userId': user_id, 'archiveId': archive_id}).get('Item')
+    if cached and cached['status'] == READY and int(cached['expiresAt']) > now:
+        return _archive_response(cached, skipped)
+    if cached and cached['status'] == BUILDING and int(cached['startedAt']) >= now - STALE_BUILD_SECONDS:
+        return _response(202, {'archiveId': archive_id, 'status': BUILDING, 'skipped': skipped})
+
+    try:
+        archives_table.put_item(
+            Item={
+                'userId': user_id,
+                'archiveId': archive_id,
+                'status': BUILDING,
+                'fileIds': found,
+                'fileCount': len(found),
+                'startedAt': now,
+                # TTL attribute; also clears builds that never finished
+                'expiresAt': now + ARCHIVE_TTL_SECONDS,
+            },
+            ConditionExpression='attribute_not_exists(archiveId) OR #status = :failed '
+                                'OR expiresAt < :now OR (#status = :building AND startedAt < :stale)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':failed': FAILED,
+                ':building': BUILDING,
+                ':now': now,
+                ':stale': now - STALE_BUILD_SECONDS,
+            }
+        )
+    except ClientError as e:
+        # A concurrent request already started (or finished) this build
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+        return _response(202, {'archiveId': archive_id, 'status': BUILDING, 'skipped': skipped})
+
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'archiveJob': {'userId': user_id, 'archiveId': archive_id, 'startedAt': now}})
+    )
+
+    return _response(202, {'archiveId': archive_id, 'status': BUILDING, 'skipped': skipped})
+
+
+def get_archive(user_id: str, archive_id: str) -> Dict[str, Any]:
+    """Report a build's progress, with the download URL once it is ready."""
+    now = int(time.time())
+    archive = archives_table.get_item(Key={'userId': user_id, 'archiveId': archive_id}).get('Item')
+    if not archive or int(archive['expiresAt']) <= now:
+        return _response(404, {'error': 'Archive not found'})
+    if archive['status'] == READY:
+        return _archive_response(archive, [])
+    if archive['status'] == BUILDING and int(archive['startedAt']) < now - STALE_BUILD_SECONDS:
+        # Its Lambda died (timeout, out of memory) before recording the outcome;
+        # pollers stop here and a new POST starts a fresh build
+        return _response(200, {'archiveId': archive_id, 'status': FAILED,
+                               'error': 'Archive build did not finish; request it again'})
+    body = {'archiveId': archive_id, 'status': archive['status']}
+    if archive['status'] == FAILED:
+        body['error'] = archive.get('error', 'Archive could not be built')
+    return _response(200, body)
+
+
+def build_archive(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Asynchronous job: stream the selected files into a ZIP in S3 and mark the archive ready."""
+    user_id, archive_id, started_at = job['userId'], job['archiveId'], job['startedAt']
+    archive = archives_table.get_item(
+        Key={'userId': user_id, 'archiveId': archive_id},
+        ConsistentRead=True
+    ).get('Item')
+    if not archive or archive['status'] != BUILDING or int(archive['startedAt']) != started_at:
+        # Superseded by a newer build, or already done
+        return {'archiveId': archive_id, 'status': 'skipped'}
+
+    s3_key = f"{ARCHIVE_PREFIX}{user_id}/{archive_id}.zip"
+    items = _get_items(user_id, archive['fileIds'])
+    writer = _MultipartWriter(FILE_BUCKET_NAME, s3_key)
+    names = set()
+    try:
+        with zipfile.ZipFile(writer, mode='w', allowZip64=True) as archive_zip:
+            for file_id in archive['fileIds']:
+                item = items.get(file_id)
+                if item is None:
+                    continue  # deleted since the request
+                _add_object(archive_zip, item, _unique_name(item['fileName'], names))
+        size = writer.complete()
+    except Exception as e:
+        print(f"Error building archive {archive_id}: {str(e)}")
+        writer.abort()
+        _finish(user_id, archive_id, started_at, 'SET #status = :status, #error = :error',
+                {'#error': 'error'}, {':status': FAILED, ':error': 'Archive could not be built'})
+        return {'archiveId': archive_id, 'status': FAILED}
+
+    now = int(time.time())
+    _finish(user_id, archive_id, started_at,
+            'SET #status = :status, s3Key = :s3Key, #size = :size, fileCount = :fileCount, '
+            'completedAt = :completedAt, expiresAt = :expiresAt',
+            {'#size': 'size'},
+            {':status': READY, ':s3Key': s3_key, ':size': size, ':fileCount': len(names),
+             ':completedAt': now, ':expiresAt': now + ARCHIVE_TTL_SECONDS})
+    print(f"Built archive {archive_id}: {len(names)} files, {size} bytes")
+    return {'archiveId': archive_id, 'status': READY}
+
+
+class _MultipartWriter:
+    """Write-only file object that ships every PART_SIZE bytes to S3 as one multipart part.
+
+    zipfile treats it as an unseekable stream and writes data descriptors
+    after each entry instead of seeking back to patch local headers.
+    """
+
+    def __init__(self, bucket: str, key: str):
+        self.bucket = bucket
+        self.key = key
+        self.upload_id = None
+        self.parts = []
+        self.buffer = bytearray()
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.size += len(data)
+        while len(self.buffer) >= PART_SIZE:
+            self._upload_part(bytes(self.buffer[:PART_SIZE]))
+            del self.buffer[:PART_SIZE]
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def complete(self) -> int:
+        # The last part may be short (or the only, even empty, part)
+        if self.buffer or not self.parts:
+            self._upload_part(bytes(self.buffer))
+            self.buffer = bytearray()
+        s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts}
+        )
+        return self.size
+
+    def abort(self) -> None:
+        if self.upload_id:
+            try:
+                s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            except ClientError as e:
+                print(f"Could not abort archive upload {self.key}: {str(e)}")
+
+    def _upload_part(self, data: bytes) -> None:
+        if self.upload_id is None:
+            self.upload_id = s3_client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType='application/zip'
+            )['UploadId']
+        part_number = len(self.parts) + 1
+        response = s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+
+
+def _add_object(archive_zip: zipfile.ZipFile, item: Dict[str, Any], name: str) -> None:
+    """Copy one object into the archive a chunk at a time."""
+    info = zipfile.ZipInfo(name, date_time=_zip_timestamp(item.get('uploadDate', '')))
+    content_type = item.get('contentType', '')
+    if content_type.startswith('text/') or content_type in COMPRESSIBLE_CONTENT_TYPES:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    else:
+        info.compress_type = zipfile.ZIP_STORED
+
+    body = s3_client.get_object(Bucket=FILE_BUCKET_NAME, Key=item['s3Key'])['Body']
+    try:
+        # Sizes aren't known up front, so always leave room for ZIP64
+        with archive_zip.open(info, mode='w', force_zip64=True) as entry:
+            for chunk in body.iter_chunks(READ_CHUNK_SIZE):
+                entry.write(chunk)
+    finally:
+        body.close()
+
+
+def _get_items(user_id: str, file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """The caller's completed items among file_ids, read in BatchGetItem chunks."""
+    client = files_table.meta.client
+    items = {}
+    for start in range(0, len(file_ids), BATCH_GET_SIZE):
+        request = {
+            files_table.name: {
+                'Keys': [{'userId': user_id, 'fileId': file_id} for file_id in file_ids[start:start + BATCH_GET_SIZE]],
+                'ProjectionExpression': 'fileId, fileName, s3Key, contentType, uploadDate, etag, #status, #size, fileSize',
+                'ExpressionAttributeNames': {'#status': 'status', '#size': 'size'},
+            }
+        }
+        delay = 0.05
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(files_table.name, []):
+                # Pending uploads have no object to archive yet
+                if item.get('status', 'completed') == 'completed':
+                    items[item['fileId']] = item
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                time.sleep(delay)
+                delay = min(delay * 2, 1)
+    return items
+
+
+def _archive_id(items: List[Dict[str, Any]]) -> str:
+    """Digest of the selection; a new upload to any file changes its ETag and so the id."""
+    selection = '\n'.join(
+        f"{item['fileId']}:{item.get('etag') or item.get('uploadDate', '')}"
+        for item in sorted(items, key=lambda item: item['fileId'])
+    )
+    return hashlib.sha256(selection.encode('utf-8')).hexdigest()[:32]
+
+
+def _unique_name(file_name: str, taken: set) -> str:
+    """A safe entry name, suffixed " (n)" when several selected files share it."""
+    name = file_name.replace('\\', '/').lstrip('/')
+    name = '/'.join(part for part in name.split('/') if part not in ('', '.', '..')) or 'file'
+    stem, dot, extension = name.rpartition('.')
+    if not stem:
+        stem, dot, extension = name, '', ''
+    candidate = name
+    counter = 1
+    while candidate in taken:
+        candidate = f"{stem} ({counter}){dot}{extension}"
+        counter += 1
+    taken.add(candidate)
+    return candidate
+
+
+def _zip_timestamp(upload_date: str):
+    try:
+        moment = datetime.strptime(upload_date[:19], '%Y-%m-%dT%H:%M:%S')
+    except ValueError:
+        moment = datetime.utcnow()
+    # ZIP timestamps can't predate 1980
+    return max(moment.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+def _finish(user_id: str, archive_id: str, started_at: int, update_expression: str,
+            names: Dict[str, str], values: Dict[str, Any]) -> None:
+    """Record the build's outcome unless a newer build has taken over the entry."""
+    try:
+        archives_table.update_item(
+            Key={'userId': user_id, 'archiveId': archive_id},
+            UpdateExpression=update_expression,
+            ConditionExpression='startedAt = :startedAt',
+            ExpressionAttributeNames={'#status': 'status', **names},
+            ExpressionAttributeValues={':startedAt': started_at, **values}
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+
+
+def _archive_response(archive: Dict[str, Any], skipped: List[str]) -> Dict[str, Any]:
+    download_url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': FILE_BUCKET_NAME,
+            'Key': archive['s3Key'],
+            'ResponseContentDisposition': 'attachment; filename="files.zip"'
+        },
+        ExpiresIn=DOWNLOAD_URL_EXPIRY_SECONDS
+    )
+    return _response(200, {
+        'archiveId': archive['archiveId'],
+        'status': READY,
+        'downloadUrl': download_url,
+        'size': int(archive['size']),
+        'fileCount': int(archive['fileCount']),
+        'expiresIn': DOWNLOAD_URL_EXPIRY_SECONDS,
+        'skipped': skipped
+    })
+
+
+def _response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
@@ -1,22 +1,65 @@
 import json
 import os
+import time
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from datetime import datetime
 
-s3_client = boto3.client('s3')
 dynamodb = boto3.resource('dynamodb')
+lambda_client = boto3.client('lambda')
 
-FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
 FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'users-dev')
+BLOBS_TABLE_NAME = os.environ.get('BLOBS_TABLE_NAME', 'file-blobs-dev')
+TOMBSTONES_TABLE_NAME = os.environ.get('TOMBSTONES_TABLE_NAME', 'file-tombstones-dev')
+SHARED_LINKS_TABLE_NAME = os.environ.get('SHARED_LINKS_TABLE_NAME', 'SharedLinksTable-dev')
+SHARE_FILE_ARN = os.environ.get('SHARE_FILE_ARN', 'file-storage-dev-backend-share-file')
 files_table = dynamodb.Table(FILES_TABLE_NAME)
+users_table = dynamodb.Table(USERS_TABLE_NAME)
+blobs_table = dynamodb.Table(BLOBS_TABLE_NAME)
+tombstones_table = dynamodb.Table(TOMBSTONES_TABLE_NAME)
+shared_links_table = dynamodb.Table(SHARED_LINKS_TABLE_NAME)
+
+# SharedLinksTable GSI: a user's links, optionally narrowed to one file
+SHARE_OWNER_INDEX = 'userId-fileId-index'
+
+# Signed share links (share_file's "signed" mode) aren't stored. share_file
+# leaves a "#signed#<userId>#<fileId>" marker in the owner index instead, and
+# a deleted file that has one gets its fileId onto the revocation list until
+# its last signed link would have expired. share_file is the list's only
+# writer, so those fileIds are handed to it with a synchronous invoke. Files
+# never shared that way cost the list nothing.
+SIGNED_LINKS_MARKER = '#signed'
+
+# POST /files/delete limits; BatchGetItem reads at most 100 keys per call
+MAX_BULK_DELETE_FILES = 1000
+BATCH_GET_SIZE = 100
+MAX_BATCH_ATTEMPTS = 5
+# TransactWriteItems takes 100 actions: two per file plus the listing bump
+FILES_PER_TRANSACTION = 49
+BATCH_WRITE_SIZE = 25
 
 
 def lambda_handler(event, context):
     """
-    Deletes a file from S3 and removes metadata from DynamoDB.
+    Deletes a file: removes its metadata and leaves a tombstone for the purger.
+
+    The delete never waits on S3. The tombstone (written in the same
+    transaction as the item delete) names the object's key prefix, and
+    file_purger later removes every version and delete marker under it.
+
+    Deduplicated files share one object through a reference-counted blob;
+    the object is only tombstoned when its last reference goes.
+
+    Share links to the file are revoked, so they stop resolving right away
+    instead of at their TTL (signed links through the revocation list).
+
+    POST /files/delete removes many files at once.
     """
     try:
         # Get fileId from path parameters
-        path_params = event.get('pathParameters', {})
+        path_params = event.get('pathParameters') or {}
         file_id = path_params.get('fileId')
 
         # Get userId from JWT token (Cognito authorizer)
@@ -31,6 +74,13 @@ def lambda_handler(event, context):
                 },
                 'body': json.dumps({'error': 'Unauthorized: Missing authentication'})
             }
+
+        if event.get('resource') == '/files/delete':
+            try:
+                body = json.loads(event.get('body') or '{}')
+            except json.JSONDecodeError:
+                return _response(400, {'error': 'Request body must be valid JSON'})
+            return handle_bulk_delete(user_id, body)
         
         if not file_id:
             return {
@@ -61,18 +111,21 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Access denied. You do not have permission to delete this file.'})
             }
 
-        s3_key = file_item['s3Key']
+        if _references_blob(user_id, file_item):
+            deleted = _delete_blob_reference(user_id, file_id, file_item)
+        else:
+            # Delete the item, tombstone its object and bump the listing version atomically
+            deleted = not _soft_delete_items(user_id, [file_item])[1]
 
-        # Delete from S3
-        s3_client.delete_object(
-            Bucket=FILE_BUCKET_NAME,
-            Key=s3_key
-        )
-        
-        # Delete from DynamoDB
-        files_table.delete_item(
-            Key={'userId': user_id, 'fileId': file_id}
-        )
+        if not deleted:
+            # A concurrent delete (a double click, or a bulk delete) got there first
+            return {
+                'statusCode': 404,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'File not found'})
+            }
+
+        _revoke_share_links_after_delete(user_id, {file_id})
         
         return {
             'statusCode': 200,
@@ -92,4 +145,331 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+
+
+def handle_bulk_delete(user_id: str, body: dict) -> dict:
+    """
+    POST /files/delete - delete many files in one request.
+
+    Expected body: {"fileIds": ["...", ...]}
+    Returns: {"results": [{"fileId", "status": "deleted" | "not_found" | "failed", "error"?}, ...],
+              "deleted": n, "notFound": n, "failed": n}
+
+    Ownership is checked with BatchGetItem under the caller's userId. Items
+    are deleted and tombstoned FILES_PER_TRANSACTION at a time, so a file is
+    either fully deleted or untouched and a failed one can simply be
+    retried. Files sharing a deduplicated blob still go through the
+    reference-count path one by one.
+    """
+    file_ids = body.get('fileIds') if isinstance(body, dict) else None
+    if (not isinstance(file_ids, list) or not 0 < len(file_ids) <= MAX_BULK_DELETE_FILES
+            or any(not isinstance(file_id, str) or not file_id for file_id in file_ids)):
+        return _response(400, {'error': f'fileIds must be a list of 1-{MAX_BULK_DELETE_FILES} file IDs'})
+    file_ids = list(dict.fromkeys(file_ids))
+
+    found, unread = _batch_get(files_table, [{'userId': user_id, 'fileId': file_id} for file_id in file_ids],
+                               'fileId, s3Key, sha256')
+    items = {item['fileId']: item for item in found}
+    errors = {key['fileId']: 'Lookup throttled; retry this file' for key in unread}
+
+    shared, unverified = _blob_referencing(user_id, items.values())
+    errors.update({file_id: 'Lookup throttled; retry this file' for file_id in unverified})
+    gone = set()
+    for file_id in shared:
+        try:
+            if not _delete_blob_reference(user_id, file_id, items[file_id]):
+                gone.add(file_id)
+        except ClientError as e:
+            errors[file_id] = e.response.get('Error', {}).get('Code', 'Delete failed')
+
+    plain = [items[file_id] for file_id in file_ids
+             if file_id in items and file_id not in shared and file_id not in errors]
+    failed, already_deleted = _soft_delete_items(user_id, plain)
+    errors.update(failed)
+    gone |= already_deleted
+    # Files a concurrent delete removed first are reported like unknown ones
+    for file_id in gone:
+        items.pop(file_id, None)
+    _revoke_share_links_after_delete(user_id, {file_id for file_id in items if file_id not in errors})
+
+    results = []
+    for file_id in file_ids:
+        if file_id in errors:
+            results.append({'fileId': file_id, 'status': 'failed', 'error': errors[file_id]})
+        elif file_id not in items:
+            results.append({'fileId': file_id, 'status': 'not_found'})
+        else:
+            results.append({'fileId': file_id, 'status': 'deleted'})
+
+    return _response(200, {
+        'results': results,
+        'deleted': sum(1 for result in results if result['status'] == 'deleted'),
+        'notFound': sum(1 for result in results if result['status'] == 'not_found'),
+        'failed': len(errors)
+    })
+
+
+def _batch_get(table, keys: list, projection: str):
+    """BatchGetItem in chunks, retrying unprocessed keys with backoff.
+
+    Returns (items, keys still unprocessed).
+    """
+    client = table.meta.client
+    found = []
+    unprocessed = []
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        request = {table.name: {'Keys': keys[start:start + BATCH_GET_SIZE], 'ProjectionExpression': projection}}
+        for attempt in range(MAX_BATCH_ATTEMPTS):
+            response = client.batch_get_item(RequestItems=request)
+            found.extend(response.get('Responses', {}).get(table.name, []))
+            request = response.get('UnprocessedKeys') or None
+            if not request:
+                break
+            if attempt < MAX_BATCH_ATTEMPTS - 1:
+                time.sleep(0.05 * (2 ** attempt))
+        if request:
+            unprocessed.extend(request[table.name]['Keys'])
+    return found, unprocessed
+
+
+def _blob_referencing(user_id: str, items):
+    """Split out fileIds whose object is the user's reference-counted blob (see _references_blob).
+
+    Returns (referencing fileIds, fileIds whose blob couldn't be read).
+    """
+    by_digest = {}
+    for item in items:
+        if item.get('sha256'):
+            by_digest.setdefault(item['sha256'], []).append(item)
+    if not by_digest:
+        return set(), set()
+    blobs, unread = _batch_get(blobs_table, [{'userId': user_id, 'sha256': digest} for digest in by_digest],
+                               'sha256, s3Key')
+    shared = {
+        item['fileId']
+        for blob in blobs
+        for item in by_digest[blob['sha256']]
+        if item['s3Key'] == blob.get('s3Key')
+    }
+    unverified = {item['fileId'] for key in unread for item in by_digest[key['sha256']]}
+    return shared, unverified
+
+
+def _soft_delete_items(user_id: str, items: list):
+    """Delete and tombstone items in transactions.
+
+    Each item delete is conditional on the item still existing, so a file
+    removed by a concurrent delete isn't tombstoned or counted twice; such
+    files are dropped and the rest of their chunk retried.
+
+    Returns ({fileId: error} for chunks that failed, fileIds already deleted).
+    """
+    errors = {}
+    gone = set()
+    for start in range(0, len(items), FILES_PER_TRANSACTION):
+        chunk = items[start:start + FILES_PER_TRANSACTION]
+        while chunk:
+            actions = []
+            for item in chunk:
+                actions.append(_delete_file_item(user_id, item['fileId']))
+                actions.append(_tombstone(user_id, item['fileId'], item['s3Key']))
+            actions.append(_listing_version_bump(user_id))
+            try:
+                files_table.meta.client.transact_write_items(TransactItems=actions)
+                break
+            except ClientError as e:
+                reasons = _failed_conditions(e)
+                missing = {chunk[i // 2]['fileId'] for i in reasons if i < 2 * len(chunk) and i % 2 == 0}
+                if not missing:
+                    code = e.response.get('Error', {}).get('Code', 'Delete failed')
+                    errors.update({item['fileId']: code for item in chunk})
+                    break
+                gone |= missing
+                chunk = [item for item in chunk if item['fileId'] not in missing]
+    return errors, gone
+
+
+def _delete_file_item(user_id: str, file_id: str) -> dict:
+    """Delete action for a file item that fails if the item is already gone."""
+    return {
+        'Delete': {
+            'TableName': files_table.name,
+            'Key': {'userId': user_id, 'fileId': file_id},
+            'ConditionExpression': 'attribute_exists(fileId)'
+        }
+    }
+
+
+def _failed_conditions(error: ClientError) -> list:
+    """Indexes of the actions whose condition cancelled a transaction (empty for any other failure)."""
+    if error.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+        return []
+    reasons = error.response.get('CancellationReasons') or []
+    return [i for i, reason in enumerate(reasons) if reason.get('Code') == 'ConditionalCheckFailed']
+
+
+def _revoke_share_links_after_delete(user_id: str, file_ids: set) -> None:
+    """Revoke the deleted files' links without failing the already committed delete.
+
+    Reporting an error here would have the client retry a delete that
+    succeeded (and get a 404), so failures are only logged. Markers are
+    dropped only after their revocation went through, so signed links of a
+    file logged here stay recoverable until the marker's TTL.
+    """
+    try:
+        _revoke_share_links(user_id, file_ids)
+    except Exception as e:
+        print(f"Error revoking share links of deleted files {sorted(file_ids)} for {user_id}: {str(e)}")
+
+
+def _revoke_share_links(user_id: str, file_ids: set) -> int:
+    """Delete the user's share links to file_ids, found through the owner index rather than a scan.
+
+    Files with signed links (a marker among their links) are revoked first,
+    so a failure never drops the marker without the revocation.
+    """
+    if not file_ids:
+        return 0
+    query_kwargs = {'IndexName': SHARE_OWNER_INDEX}
+    if len(file_ids) == 1:
+        query_kwargs['KeyConditionExpression'] = Key('userId').eq(user_id) & Key('fileId').eq(next(iter(file_ids)))
+    else:
+        # One pass over the user's links beats a query per deleted file
+        query_kwargs['KeyConditionExpression'] = Key('userId').eq(user_id)
+
+    tokens = []
+    signed = {}
+    now = int(time.time())
+    while True:
+        response = shared_links_table.query(**query_kwargs)
+        for link in response.get('Items', []):
+            if link['fileId'] not in file_ids:
+                continue
+            tokens.append(link['shareToken'])
+            if link['shareToken'].startswith(SIGNED_LINKS_MARKER) and int(link.get('expiresAt', 0)) > now:
+                signed[link['fileId']] = int(link['expiresAt'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if signed:
+        _revoke_signed_files(signed)
+
+    client = shared_links_table.meta.client
+    for start in range(0, len(tokens), BATCH_WRITE_SIZE):
+        requests = [{'DeleteRequest': {'Key': {'shareToken': token}}} for token in tokens[start:start + BATCH_WRITE_SIZE]]
+        delay = 0.05
+        while requests:
+            response = client.batch_write_item(RequestItems={shared_links_table.name: requests})
+            requests = response.get('UnprocessedItems', {}).get(shared_links_table.name, [])
+            if requests:
+                time.sleep(delay)
+                delay = min(delay * 2, 1)
+    return len(tokens)
+
+
+def _revoke_signed_files(entries: dict) -> None:
+    """Have share_file, the revocation list's only writer, revoke {fileId: expiresAt}."""
+    response = lambda_client.invoke(
+        FunctionName=SHARE_FILE_ARN,
+        InvocationType='RequestResponse',
+        Payload=json.dumps({'revocations': entries})
+    )
+    if response.get('FunctionError'):
+        raise RuntimeError(f"share_file failed to revoke signed links: {response['Payload'].read()!r}")
+
+
+def _references_blob(user_id: str, file_item: dict) -> bool:
+    """True if the file's object is the user's reference-counted blob for its sha256."""
+    if not file_item.get('sha256'):
+        return False
+    blob = blobs_table.get_item(Key={'userId': user_id, 'sha256': file_item['sha256']}).get('Item')
+    return bool(blob) and blob.get('s3Key') == file_item['s3Key']
+
+
+def _delete_blob_reference(user_id: str, file_id: str, file_item: dict) -> bool:
+    """Drop the item and its blob reference; tombstone the object once nothing references it.
+
+    Returns False if the item was already deleted, in which case its
+    reference was already dropped too.
+    """
+    blob_key = {'userId': user_id, 'sha256': file_item['sha256']}
+    try:
+        files_table.meta.client.transact_write_items(
+            TransactItems=[
+                _delete_file_item(user_id, file_id),
+                {
+                    'Update': {
+                        'TableName': blobs_table.name,
+                        'Key': blob_key,
+                        'UpdateExpression': 'ADD refCount :minusOne',
+                        'ExpressionAttributeValues': {':minusOne': -1}
+                    }
+                },
+                _listing_version_bump(user_id)
+            ]
+        )
+    except ClientError as e:
+        if _failed_conditions(e) == [0]:
+            return False
+        raise
+
+    try:
+        # Only succeeds if no upload took a new reference in the meantime
+        files_table.meta.client.transact_write_items(
+            TransactItems=[
+                {
+                    'Delete': {
+                        'TableName': blobs_table.name,
+                        'Key': blob_key,
+                        'ConditionExpression': 'refCount <= :zero',
+                        'ExpressionAttributeValues': {':zero': 0}
+                    }
+                },
+                _tombstone(user_id, file_id, file_item['s3Key'])
+            ]
+        )
+    except ClientError as e:
+        if _failed_conditions(e) == [0]:
+            return True
+        raise
+    return True
+
+
+def _tombstone(user_id: str, file_id: str, s3_key: str) -> dict:
+    """Put action queueing every version under the object's "<userId>/<fileId>/" prefix for purging."""
+    owner, object_dir = s3_key.split('/', 2)[:2]
+    return {
+        'Put': {
+            'TableName': tombstones_table.name,
+            'Item': {
+                's3Prefix': f"{owner}/{object_dir}/",
+                'userId': user_id,
+                'fileId': file_id,
+                'deletedAt': datetime.utcnow().isoformat()
+            }
+        }
+    }
+
+
+def _listing_version_bump(user_id: str) -> dict:
+    return {
+        'Update': {
+            'TableName': users_table.name,
+            'Key': {'userId': user_id},
+            'UpdateExpression': 'ADD listingVersion :one',
+            'ExpressionAttributeValues': {':one': 1}
+        }
+    }
+
+
+def _response(status_code: int, body: dict) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
@@ -1,5 +1,8 @@
+import base64
+import codecs
 import json
 import os
+import time
 import boto3
 
 s3_client = boto3.client('s3')
@@ -9,14 +12,35 @@ FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
 FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
 files_table = dynamodb.Table(FILES_TABLE_NAME)
 
+# ?preview=true returns the first previewKB kilobytes inline (base64 inflates
+# binary previews by a third, well under API Gateway's 6 MB response limit)
+DEFAULT_PREVIEW_KB = 64
+MAX_PREVIEW_KB = 1024
+TEXT_CONTENT_TYPES = ('application/json', 'application/xml', 'application/javascript', 'application/x-ndjson')
+
+DOWNLOAD_URL_EXPIRY_SECONDS = 3600
+
+# POST /files/download-urls limits; BatchGetItem reads at most 100 keys per call
+MAX_BATCH_FILES = 500
+BATCH_GET_SIZE = 100
+MAX_BATCH_GET_ATTEMPTS = 5
+
 
 def lambda_handler(event, context):
     """
     Generates a presigned URL for file download.
+
+    The URL supports HTTP Range requests: send e.g. `Range: bytes=0-1048575`
+    with the GET to S3 to fetch part of the object (206 Partial Content).
+
+    With ?preview=true the first previewKB KB are instead read with a ranged
+    GetObject and returned inline, so preview latency doesn't grow with file size.
+
+    POST /files/download-urls issues URLs for many files at once.
     """
     try:
         # Get fileId from path parameters
-        path_params = event.get('pathParameters', {})
+        path_params = event.get('pathParameters') or {}
         file_id = path_params.get('fileId')
 
         # Get userId from JWT token (Cognito authorizer)
@@ -31,6 +55,13 @@ def lambda_handler(event, context):
                 },
                 'body': json.dumps({'error': 'Unauthorized: Missing authentication'})
             }
+
+        if event.get('resource') == '/files/download-urls':
+            try:
+                body = json.loads(event.get('body') or '{}')
+            except json.JSONDecodeError:
+                return _response(400, {'error': 'Request body must be valid JSON'})
+            return handle_batch_download(user_id, body)
         
         if not file_id:
             return {
@@ -63,15 +94,12 @@ def lambda_handler(event, context):
 
         s3_key = file_item['s3Key']
 
+        query_params = event.get('queryStringParameters') or {}
+        if str(query_params.get('preview', '')).lower() == 'true':
+            return _preview(file_item, query_params.get('previewKB'))
+
         # Generate presigned URL for download
-        download_url = s3_client.generate_presigned_url(
-            'get_object',
-            Params={
-                'Bucket': FILE_BUCKET_NAME,
-                'Key': s3_key
-            },
-            ExpiresIn=3600  # 1 hour
-        )
+        download_url = _presign_download(s3_key)
         
         return {
             'statusCode': 200,
@@ -82,7 +110,8 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'downloadUrl': download_url,
                 'fileName': file_item['fileName'],
-                'fileId': file_id
+                'fileId': file_id,
+                'acceptRanges': 'bytes'
             })
         }
         
@@ -92,4 +121,168 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+
+
+def handle_batch_download(user_id: str, body: dict) -> dict:
+    """
+    POST /files/download-urls - issue download URLs for many files in one request.
+
+    Expected body: {"fileIds": ["...", ...]}
+    Returns: {"files": [{"fileId", "fileName", "downloadUrl"}, ...],
+              "notFound": ["...", ...], "failed": ["...", ...], "expiresIn": 3600}
+
+    Items are read with BatchGetItem under the caller's own userId, so other
+    users' files come back as notFound. Keys still unprocessed after retrying
+    are reported in "failed" so the client can resubmit just those.
+    """
+    file_ids = body.get('fileIds') if isinstance(body, dict) else None
+    if (not isinstance(file_ids, list) or not 0 < len(file_ids) <= MAX_BATCH_FILES
+            or any(not isinstance(file_id, str) or not file_id for file_id in file_ids)):
+        return _response(400, {'error': f'fileIds must be a list of 1-{MAX_BATCH_FILES} file IDs'})
+
+    # BatchGetItem rejects duplicate keys within a request
+    file_ids = list(dict.fromkeys(file_ids))
+    items, unprocessed_ids = _batch_get_items(user_id, file_ids)
+
+    files = []
+    not_found = []
+    for file_id in file_ids:
+        item = items.get(file_id)
+        if item is not None:
+            files.append({
+                'fileId': file_id,
+                'fileName': item['fileName'],
+                'downloadUrl': _presign_download(item['s3Key'])
+            })
+        elif file_id not in unprocessed_ids:
+            not_found.append(file_id)
+
+    return _response(200, {
+        'files': files,
+        'notFound': not_found,
+        'failed': [file_id for file_id in file_ids if file_id in unprocessed_ids],
+        'expiresIn': DOWNLOAD_URL_EXPIRY_SECONDS
+    })
+
+
+def _batch_get_items(user_id: str, file_ids: list):
+    """Read the caller's items in BatchGetItem chunks, retrying unprocessed keys with backoff.
+
+    Returns ({fileId: item}, fileIds that still could not be read).
+    """
+    client = files_table.meta.client
+    items = {}
+    unprocessed = set()
+    for start in range(0, len(file_ids), BATCH_GET_SIZE):
+        request = {
+            files_table.name: {
+                'Keys': [{'userId': user_id, 'fileId': file_id} for file_id in file_ids[start:start + BATCH_GET_SIZE]],
+                'ProjectionExpression': 'fileId, fileName, s3Key',
+            }
+        }
+        for attempt in range(MAX_BATCH_GET_ATTEMPTS):
+            response = client.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(files_table.name, []):
+                items[item['fileId']] = item
+            request = response.get('UnprocessedKeys') or None
+            if not request:
+                break
+            if attempt < MAX_BATCH_GET_ATTEMPTS - 1:
+                time.sleep(0.05 * (2 ** attempt))
+        if request:
+            unprocessed.update(key['fileId'] for key in request[files_table.name]['Keys'])
+    return items, unprocessed
+
+
+def _presign_download(s3_key: str) -> str:
+    return s3_client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': FILE_BUCKET_NAME,
+            'Key': s3_key
+        },
+        ExpiresIn=DOWNLOAD_URL_EXPIRY_SECONDS
+    )
+
+
+def _response(status_code: int, body: dict) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
+
+
+def _preview(file_item: dict, raw_kb) -> dict:
+    """Return the first N KB of the object, read with a ranged GetObject."""
+    try:
+        preview_kb = int(raw_kb) if raw_kb is not None else DEFAULT_PREVIEW_KB
+    except (TypeError, ValueError):
+        preview_kb = DEFAULT_PREVIEW_KB
+    preview_kb = max(1, min(preview_kb, MAX_PREVIEW_KB))
+
+    try:
+        obj = s3_client.get_object(
+            Bucket=FILE_BUCKET_NAME,
+            Key=file_item['s3Key'],
+            Range=f"bytes=0-{preview_kb * 1024 - 1}"
+        )
+        data = obj['Body'].read()
+        total_size = _total_size(obj, len(data))
+    except s3_client.exceptions.ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code == 'NoSuchKey':
+            # A pending upload's object isn't there until the client's PUT lands
+            if file_item.get('status') == 'pending':
+                return _response(409, {'error': 'File upload has not completed'})
+            return _response(404, {'error': 'File not found'})
+        # An empty object can't satisfy any range
+        if code != 'InvalidRange':
+            raise
+        data, total_size = b'', 0
+
+    content_type = file_item.get('contentType', 'application/octet-stream')
+    preview, encoding = _encode_preview(data, content_type)
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps({
+            'fileId': file_item['fileId'],
+            'fileName': file_item['fileName'],
+            'contentType': content_type,
+            'preview': preview,
+            'encoding': encoding,
+            'previewBytes': len(data),
+            'totalSize': total_size,
+            'truncated': len(data) < total_size
+        })
+    }
+
+
+def _total_size(obj: dict, fallback: int) -> int:
+    """Object size from 'Content-Range: bytes 0-65535/2147483648'."""
+    content_range = obj.get('ContentRange') or ''
+    if '/' in content_range:
+        try:
+            return int(content_range.rsplit('/', 1)[1])
+        except ValueError:
+            pass
+    return fallback
+
+
+def _encode_preview(data: bytes, content_type: str):
+    """Text previews come back as UTF-8 (dropping a character cut off by the range), others as base64."""
+    if content_type.startswith('text/') or content_type in TEXT_CONTENT_TYPES:
+        try:
+            return codecs.getincrementaldecoder('utf-8')().decode(data, final=False), 'utf-8'
+        except UnicodeDecodeError:
+            pass
+    return base64.b64encode(data).decode('ascii'), 'base64'
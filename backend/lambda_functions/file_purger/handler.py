@@ -0,0 +1,113 @@
+import os
+from typing import Any, Dict, List
+
+import boto3
+from botocore.exceptions import ClientError
+
+s3_client = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+
+FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
+TOMBSTONES_TABLE_NAME = os.environ.get('TOMBSTONES_TABLE_NAME', 'file-tombstones-dev')
+tombstones_table = dynamodb.Table(TOMBSTONES_TABLE_NAME)
+
+# DeleteObjects removes at most 1,000 keys (or versions) per call
+DELETE_BATCH_SIZE = 1000
+# Stop early rather than be killed mid-prefix by the Lambda timeout
+MIN_REMAINING_MS = 20000
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Scheduled job: permanently remove the objects of deleted files.
+
+    delete_file only writes a tombstone naming the file's "<userId>/<fileId>/"
+    prefix. Because FileStorageBucket is versioned, a plain DeleteObject
+    would just add a delete marker and keep paying for every version, so
+    this job pages through ListObjectVersions for each prefix and deletes
+    all versions and delete markers in DeleteObjects batches. Multipart
+    uploads still open under the prefix are aborted too.
+
+    A tombstone is removed only after its prefix is empty; anything that
+    fails (or doesn't fit in this run) is retried on the next run.
+    """
+    purged = 0
+    versions_deleted = 0
+    failed = 0
+
+    scan_kwargs = {}
+    while _has_time_left(context):
+        response = tombstones_table.scan(**scan_kwargs)
+        for tombstone in response.get('Items', []):
+            if not _has_time_left(context):
+                break
+            try:
+                versions_deleted += purge_prefix(tombstone['s3Prefix'])
+            except ClientError as e:
+                print(f"Error purging {tombstone['s3Prefix']}: {str(e)}")
+                failed += 1
+                continue
+            tombstones_table.delete_item(Key={'s3Prefix': tombstone['s3Prefix']})
+            purged += 1
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Purged {purged} deleted files ({versions_deleted} object versions, {failed} failed)")
+    return {'purged': purged, 'versionsDeleted': versions_deleted, 'failed': failed}
+
+
+def purge_prefix(prefix: str) -> int:
+    """Delete every version and delete marker under prefix; returns how many were removed."""
+    _abort_multipart_uploads(prefix)
+
+    deleted = 0
+    while True:
+        # Each pass deletes what it lists, so listing from the start always
+        # returns the next batch (MaxKeys counts versions and markers together)
+        page = s3_client.list_object_versions(Bucket=FILE_BUCKET_NAME, Prefix=prefix, MaxKeys=DELETE_BATCH_SIZE)
+        objects = [
+            {'Key': version['Key'], 'VersionId': version['VersionId']}
+            for version in page.get('Versions', []) + page.get('DeleteMarkers', [])
+        ]
+        if not objects:
+            return deleted
+        deleted += _delete_versions(objects)
+
+
+def _delete_versions(objects: List[Dict[str, str]]) -> int:
+    response = s3_client.delete_objects(
+        Bucket=FILE_BUCKET_NAME,
+        Delete={'Objects': objects, 'Quiet': True}
+    )
+    errors = response.get('Errors', [])
+    if errors:
+        # Keep the tombstone so the next run tries again
+        error = errors[0]
+        raise ClientError(
+            {'Error': {'Code': error.get('Code', 'DeleteFailed'), 'Message': error.get('Message', error['Key'])}},
+            'DeleteObjects'
+        )
+    return len(objects)
+
+
+def _abort_multipart_uploads(prefix: str) -> None:
+    paginator = s3_client.get_paginator('list_multipart_uploads')
+    for page in paginator.paginate(Bucket=FILE_BUCKET_NAME, Prefix=prefix):
+        for upload in page.get('Uploads', []):
+            try:
+                s3_client.abort_multipart_upload(
+                    Bucket=FILE_BUCKET_NAME,
+                    Key=upload['Key'],
+                    UploadId=upload['UploadId']
+                )
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                    raise
+
+
+def _has_time_left(context: Any) -> bool:
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return True
+    return context.get_remaining_time_in_millis() > MIN_REMAINING_MS
@@ -0,0 +1,194 @@
+import os
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+dynamodb = boto3.resource('dynamodb')
+deserializer = TypeDeserializer()
+
+FILE_CHANGES_TABLE_NAME = os.environ.get('FILE_CHANGES_TABLE_NAME', 'file-changes-dev')
+USAGE_TABLE_NAME = os.environ.get('USAGE_TABLE_NAME', 'usage-dev')
+PURGES_TABLE_NAME = os.environ.get('PURGES_TABLE_NAME', 'account-purges-dev')
+file_changes_table = dynamodb.Table(FILE_CHANGES_TABLE_NAME)
+usage_table = dynamodb.Table(USAGE_TABLE_NAME)
+purges_table = dynamodb.Table(PURGES_TABLE_NAME)
+
+# Change log entries expire after this many days (TTL on expiresAt)
+CHANGE_RETENTION_DAYS = int(os.environ.get('CHANGE_RETENTION_DAYS', '30'))
+
+# Attributes copied into created/updated change entries (mirrors list_files' summary projection)
+SUMMARY_FIELDS = ('fileId', 'fileName', 'contentType', 'size', 'uploadDate', 'status', 'folder')
+
+# Sort key of the per-user totals item in UsageTable; other items are per content type
+USAGE_TOTAL_KEY = '*'
+DEFAULT_CONTENT_TYPE = 'application/octet-stream'
+
+CHANGE_TYPES = {
+    'INSERT': 'created',
+    'MODIFY': 'updated',
+    'REMOVE': 'deleted',
+}
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Consume the FilesTable stream: append one change log entry per file write
+    and apply the write's effect to the user's usage counters.
+
+    Each record is one transaction: a conditional Put of its change log entry
+    (keyed by stream sequence number) plus ADDs on the usage items. A retried
+    batch fails the condition for records it already applied, so counters are
+    never double-counted.
+
+    Records made before an account purge finished deleting the user's files
+    are dropped: account_purger deletes the change log and usage rows after
+    that point, and a lagging (retried, bisected) batch must not bring them
+    back once the purge has reported complete.
+    """
+    records = event.get('Records', [])
+    changes = [(record, _to_change(record)) for record in records]
+    purged_at = _files_purged_at({change['userId'] for _, change in changes if change})
+
+    recorded = 0
+    replayed = 0
+    purged = 0
+    for record, change in changes:
+        if not change:
+            continue
+        if change['changedAt'] <= purged_at.get(change['userId'], -1):
+            purged += 1
+        elif _apply(change, _usage_deltas(record)):
+            recorded += 1
+        else:
+            replayed += 1
+
+    print(f"Recorded {recorded} file changes ({replayed} already applied, {purged} from purged accounts)")
+    return {'recorded': recorded, 'replayed': replayed, 'purged': purged}
+
+
+def _files_purged_at(user_ids: set) -> Dict[str, int]:
+    """{userId: filesDeletedAt} for the users whose account purge has deleted their files."""
+    purged_at = {}
+    keys = [{'userId': user_id} for user_id in sorted(user_ids)]
+    # BatchGetItem reads at most 100 keys per call
+    for start in range(0, len(keys), 100):
+        request = {purges_table.name: {
+            'Keys': keys[start:start + 100],
+            'ProjectionExpression': 'userId, filesDeletedAt',
+        }}
+        while request:
+            response = purges_table.meta.client.batch_get_item(RequestItems=request)
+            for job in response.get('Responses', {}).get(purges_table.name, []):
+                if 'filesDeletedAt' in job:
+                    purged_at[job['userId']] = int(job['filesDeletedAt'])
+            request = response.get('UnprocessedKeys') or None
+    return purged_at
+
+
+def _apply(change: Dict[str, Any], deltas: Dict[str, List[int]]) -> bool:
+    transact_items = [{
+        'Put': {
+            'TableName': file_changes_table.name,
+            'Item': change,
+            'ConditionExpression': 'attribute_not_exists(changeId)',
+        }
+    }]
+    for content_type, (file_delta, byte_delta) in deltas.items():
+        transact_items.append({
+            'Update': {
+                'TableName': usage_table.name,
+                'Key': {'userId': change['userId'], 'contentType': content_type},
+                'UpdateExpression': 'ADD fileCount :files, totalBytes :bytes',
+                'ExpressionAttributeValues': {':files': file_delta, ':bytes': byte_delta},
+            }
+        })
+
+    try:
+        # The resource's client serializes plain Python values
+        file_changes_table.meta.client.transact_write_items(TransactItems=transact_items)
+        return True
+    except ClientError as err:
+        reasons = err.response.get('CancellationReasons') or [{}]
+        if err.response['Error']['Code'] == 'TransactionCanceledException' and \
+                reasons[0].get('Code') == 'ConditionalCheckFailed':
+            return False
+        raise
+
+
+def _to_change(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    change_type = CHANGE_TYPES.get(record.get('eventName'))
+    stream_record = record.get('dynamodb') or {}
+    keys = _deserialize(stream_record.get('Keys'))
+    if not change_type or not keys.get('userId') or not keys.get('fileId'):
+        return None
+
+    changed_at = int(stream_record.get('ApproximateCreationDateTime', time.time()))
+    change = {
+        'userId': keys['userId'],
+        'changeId': _change_id(stream_record['SequenceNumber']),
+        'fileId': keys['fileId'],
+        'changeType': change_type,
+        'changedAt': changed_at,
+        'expiresAt': changed_at + CHANGE_RETENTION_DAYS * 86400,
+    }
+
+    # Deletes are tombstones: the fileId is all a client needs to drop the file
+    if change_type != 'deleted':
+        new_image = _deserialize(stream_record.get('NewImage'))
+        change['file'] = {k: new_image[k] for k in SUMMARY_FIELDS if k in new_image}
+
+    return change
+
+
+def _usage_deltas(record: Dict[str, Any]) -> Dict[str, List[int]]:
+    """
+    Return {contentType: [fileDelta, byteDelta]} for one stream record,
+    including the per-user total under USAGE_TOTAL_KEY. Zero deltas are dropped.
+    """
+    stream_record = record.get('dynamodb') or {}
+    deltas = defaultdict(lambda: [0, 0])
+
+    old_image = _deserialize(stream_record.get('OldImage')) if record.get('eventName') != 'INSERT' else None
+    new_image = _deserialize(stream_record.get('NewImage')) if record.get('eventName') != 'REMOVE' else None
+
+    for image, sign in ((old_image, -1), (new_image, 1)):
+        if image is None:
+            continue
+        size = _size(image)
+        for key in (_content_type(image), USAGE_TOTAL_KEY):
+            deltas[key][0] += sign
+            deltas[key][1] += sign * size
+
+    return {k: v for k, v in deltas.items() if v != [0, 0]}
+
+
+def _size(image: Dict[str, Any]) -> int:
+    """The image's size in bytes; a missing or malformed size counts as 0 rather than failing the batch."""
+    raw = image.get('size')
+    try:
+        size = int(raw or 0)
+    except (TypeError, ValueError):
+        size = -1
+    if size < 0:
+        print(f"Ignoring invalid size {raw!r} for file {image.get('fileId')}")
+        return 0
+    return size
+
+
+def _content_type(image: Dict[str, Any]) -> str:
+    content_type = image.get('contentType') or DEFAULT_CONTENT_TYPE
+    return DEFAULT_CONTENT_TYPE if content_type == USAGE_TOTAL_KEY else content_type
+
+
+def _change_id(sequence_number: str) -> str:
+    # Stream sequence numbers are numeric strings of varying length; pad them
+    # so the change log's string sort key orders them numerically
+    return sequence_number.zfill(40)
+
+
+def _deserialize(image: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: deserializer.deserialize(v) for k, v in (image or {}).items()}
@@ -0,0 +1,66 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+dynamodb = boto3.resource('dynamodb')
+
+USAGE_TABLE_NAME = os.environ.get('USAGE_TABLE_NAME', 'usage-dev')
+usage_table = dynamodb.Table(USAGE_TABLE_NAME)
+
+# Sort key of the totals item; written by file_stream_processor
+USAGE_TOTAL_KEY = '*'
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Handle GET /usage - return the user's storage totals and per-content-type breakdown.
+
+    Counters are maintained incrementally from the FilesTable stream, so this
+    is a single Query over one small partition regardless of library size.
+    """
+    try:
+        user_id = _get_user_id(event)
+        if not user_id:
+            return _response(401, {'error': 'Unauthorized: Missing or invalid authentication token'})
+
+        response = usage_table.query(KeyConditionExpression=Key('userId').eq(user_id))
+
+        usage = {'fileCount': 0, 'totalBytes': 0, 'byContentType': {}}
+        for item in response.get('Items', []):
+            counters = {
+                'fileCount': int(item.get('fileCount', 0)),
+                'totalBytes': int(item.get('totalBytes', 0)),
+            }
+            if item['contentType'] == USAGE_TOTAL_KEY:
+                usage.update(counters)
+            elif counters['fileCount'] > 0:
+                usage['byContentType'][item['contentType']] = counters
+
+        return _response(200, usage)
+
+    except Exception as exc:
+        print(f"Error reading usage: {exc}")
+        return _response(500, {'error': 'Internal server error'})
+
+
+def _get_user_id(event: dict) -> Optional[str]:
+    return (
+        (event.get('requestContext') or {})
+        .get('authorizer', {})
+        .get('claims', {})
+        .get('sub')
+    )
+
+
+def _response(status_code: int, body: dict) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json',
+        },
+        'body': json.dumps(body),
+    }
@@ -0,0 +1,170 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+dynamodb = boto3.resource('dynamodb')
+
+FILE_CHANGES_TABLE_NAME = os.environ.get('FILE_CHANGES_TABLE_NAME', 'file-changes-dev')
+file_changes_table = dynamodb.Table(FILE_CHANGES_TABLE_NAME)
+
+# Sync tokens are signed with the same key as list_files cursors
+CURSOR_SIGNING_KEY = os.environ.get('CURSOR_SIGNING_KEY', 'dev-cursor-signing-key')
+
+# Tokens older than this may point at entries the change log TTL already
+# removed, so the client has to re-list instead
+SYNC_TOKEN_MAX_AGE_SECONDS = int(os.environ.get('SYNC_TOKEN_MAX_AGE_DAYS', '7')) * 86400
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+# Sorts before every padded stream sequence number
+LOG_START = '0' * 40
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Handle GET /files/changes - return files created, updated or deleted since a sync token.
+
+    Without a token, returns no changes and a token for the current head of the
+    log. Clients should fetch that token *before* their initial full listing.
+    """
+    try:
+        user_id = _get_user_id(event)
+        if not user_id:
+            return _response(401, {'error': 'Unauthorized: Missing or invalid authentication token'})
+
+        query_params = event.get('queryStringParameters') or {}
+        limit = _parse_limit(query_params.get('limit'))
+
+        token = query_params.get('since')
+        if not token:
+            return _response(200, {
+                'changes': [],
+                'count': 0,
+                'hasMore': False,
+                'nextToken': _encode_token(user_id, _head_change_id(user_id)),
+            })
+
+        decoded = _decode_token(user_id, token)
+        if decoded is None:
+            return _response(400, {'error': 'Invalid sync token'})
+
+        change_id, issued_at = decoded
+        if time.time() - issued_at > SYNC_TOKEN_MAX_AGE_SECONDS:
+            return _response(410, {'error': 'Sync token expired; re-list files and start a new sync'})
+
+        response = file_changes_table.query(
+            KeyConditionExpression=Key('userId').eq(user_id) & Key('changeId').gt(change_id),
+            Limit=limit,
+        )
+        items = response.get('Items', [])
+
+        changes = [
+            {
+                'fileId': item['fileId'],
+                'changeType': item['changeType'],
+                'changedAt': int(item['changedAt']),
+                'file': _decimal_to_number(item.get('file')),
+            }
+            for item in items
+        ]
+        last_change_id = items[-1]['changeId'] if items else change_id
+
+        return _response(200, {
+            'changes': changes,
+            'count': len(changes),
+            'hasMore': 'LastEvaluatedKey' in response,
+            'nextToken': _encode_token(user_id, last_change_id),
+        })
+
+    except Exception as exc:
+        print(f"Error listing file changes: {exc}")
+        return _response(500, {'error': 'Internal server error'})
+
+
+def _head_change_id(user_id: str) -> str:
+    response = file_changes_table.query(
+        KeyConditionExpression=Key('userId').eq(user_id),
+        ScanIndexForward=False,
+        Limit=1,
+        ProjectionExpression='changeId',
+    )
+    items = response.get('Items', [])
+    return items[0]['changeId'] if items else LOG_START
+
+
+def _get_user_id(event: dict) -> Optional[str]:
+    return (
+        (event.get('requestContext') or {})
+        .get('authorizer', {})
+        .get('claims', {})
+        .get('sub')
+    )
+
+
+def _parse_limit(raw_value) -> int:
+    try:
+        value = int(raw_value) if raw_value is not None else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        value = DEFAULT_PAGE_SIZE
+    return max(1, min(value, MAX_PAGE_SIZE))
+
+
+def _decimal_to_number(obj):
+    if isinstance(obj, list):
+        return [_decimal_to_number(i) for i in obj]
+    if isinstance(obj, dict):
+        return {k: _decimal_to_number(v) for k, v in obj.items()}
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    return obj
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(user_id: str, payload: str) -> str:
+    message = f"{user_id}.sync.{payload}".encode('utf-8')
+    digest = hmac.new(CURSOR_SIGNING_KEY.encode('utf-8'), message, hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def _encode_token(user_id: str, change_id: str) -> str:
+    payload = _b64encode(json.dumps({'c': change_id, 't': int(time.time())}).encode('utf-8'))
+    return f"{payload}.{_sign(user_id, payload)}"
+
+
+def _decode_token(user_id: str, token: str):
+    """Return (changeId, issuedAt) for a token, or None if it was tampered with."""
+    try:
+        payload, signature = token.split('.', 1)
+        if not hmac.compare_digest(signature, _sign(user_id, payload)):
+            return None
+        data = json.loads(_b64decode(payload))
+        return str(data['c']), int(data['t'])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def _response(status_code: int, body: dict) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json',
+        },
+        'body': json.dumps(body),
+    }
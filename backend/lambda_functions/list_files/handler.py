@@ -1,5 +1,9 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
+import re
 import boto3
 from boto3.dynamodb.conditions import Key
 from decimal import Decimal
@@ -7,7 +11,29 @@ from decimal import Decimal
 # Initialize DynamoDB resource
 dynamodb = boto3.resource('dynamodb')
 FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'users-dev')
 files_table = dynamodb.Table(FILES_TABLE_NAME)
+users_table = dynamodb.Table(USERS_TABLE_NAME)
+
+# Continuation tokens are signed so clients can't forge a LastEvaluatedKey
+# that points into another user's partition
+CURSOR_SIGNING_KEY = os.environ.get('CURSOR_SIGNING_KEY', 'dev-cursor-signing-key')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Secondary indexes on FilesTable (see infrastructure.yml). Each is keyed by
+# userId so every sorted/filtered view is a single-partition Query.
+UPLOAD_DATE_INDEX = 'userId-uploadDate-index'
+CONTENT_TYPE_INDEX = 'userId-contentTypeDate-index'
+STATUS_INDEX = 'userId-statusDate-index'
+
+SORT_FIELDS = ('fileId', 'uploadDate')
+
+# Attributes the file grid renders; returned unless the caller asks for more
+SUMMARY_FIELDS = ('userId', 'fileId', 'fileName', 'contentType', 'size', 'uploadDate', 'status', 'folder')
+MAX_FIELDS = 20
+FIELD_NAME_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9_]{0,63}$')
 
 
 def decimal_to_number(obj):
@@ -24,7 +50,19 @@ def decimal_to_number(obj):
 
 def lambda_handler(event, context):
     """
-    Lists all files for a user by querying DynamoDB.
+    Lists a page of files for a user by querying DynamoDB.
+
+    Query parameters:
+    - limit: page size (default 100, clamped to 1..1000)
+    - cursor: opaque token returned as nextCursor by the previous page
+    - sort: 'fileId' (default) or 'uploadDate'
+    - order: 'asc' (default) or 'desc'
+    - contentType: only files of this MIME type, newest/oldest by uploadDate
+    - status: only files in this upload status, newest/oldest by uploadDate
+    - fields: 'summary' (default), 'all', or a comma-separated attribute list
+
+    Responses carry an ETag derived from the user's listing version; a matching
+    If-None-Match is answered with 304 after a single GetItem.
     """
     try:
         # Extract userId from request
@@ -40,27 +78,71 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Unauthorized: Missing JWT claim'})
             }
 
-        # Query DynamoDB for user's files
-        response = files_table.query(
-            KeyConditionExpression=Key('userId').eq(user_id)
-        )
+        query_params = event.get('queryStringParameters') or {}
+        limit = _parse_limit(query_params.get('limit'))
+
+        try:
+            query_kwargs = _build_query(user_id, query_params)
+        except ValueError as err:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(err)})
+            }
+        query_kwargs['Limit'] = limit
+
+        try:
+            query_kwargs.update(_build_projection(query_params.get('fields')))
+        except ValueError as err:
+            return {
+                'statusCode': 400,
+                'headers': {'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': str(err)})
+            }
+
+        # Cursors are only valid for the view (index, filter and order) that issued them
+        scope = _cursor_scope(query_params)
+
+        # Read the version before querying so a concurrent write can only make
+        # the ETag older than the body, never newer
+        etag = _listing_etag(_get_listing_version(user_id), query_params)
+        if etag in _if_none_match(event):
+            return {
+                'statusCode': 304,
+                'headers': _listing_headers(etag),
+                'body': ''
+            }
+
+        cursor = query_params.get('cursor')
+        if cursor:
+            start_key = _decode_cursor(user_id, cursor, scope)
+            if start_key is None:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Invalid cursor'})
+                }
+            query_kwargs['ExclusiveStartKey'] = start_key
+
+        # Query DynamoDB for one page of the user's files
+        response = files_table.query(**query_kwargs)
 
         files = response.get('Items', [])
 
         # Convert Decimal types to int/float for JSON serialization
         files = decimal_to_number(files)
 
+        last_key = response.get('LastEvaluatedKey')
+        next_cursor = _encode_cursor(user_id, last_key, scope) if last_key else None
+
         return {
             'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-                'Access-Control-Allow-Methods': 'GET,OPTIONS',
-                'Content-Type': 'application/json'
-            },
+            'headers': _listing_headers(etag),
             'body': json.dumps({
                 'files': files,
-                'count': len(files)
+                'count': len(files),
+                'hasMore': next_cursor is not None,
+                'nextCursor': next_cursor
             })
         }
         
@@ -76,4 +158,160 @@ def lambda_handler(event, context):
                 'error': 'Failed to list files',
                 'message': str(e)
             })
-        }
\ No newline at end of file
+        }
+
+
+def _listing_headers(etag: str) -> dict:
+    return {
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,If-None-Match',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Content-Type': 'application/json',
+        # Let the browser keep the listing but revalidate it on every use
+        'Cache-Control': 'private, no-cache',
+        'ETag': etag
+    }
+
+
+def _get_listing_version(user_id: str) -> int:
+    """Current listing version; upload/delete/status changes bump it atomically."""
+    response = users_table.get_item(
+        Key={'userId': user_id},
+        ProjectionExpression='listingVersion',
+        ConsistentRead=True
+    )
+    return int(response.get('Item', {}).get('listingVersion', 0))
+
+
+def _listing_etag(version: int, query_params: dict) -> str:
+    # Every view/page of the same listing version gets its own validator
+    view = json.dumps(query_params, sort_keys=True, separators=(',', ':'))
+    view_hash = hashlib.sha256(view.encode('utf-8')).hexdigest()[:16]
+    return f'"{version}-{view_hash}"'
+
+
+def _if_none_match(event: dict) -> list:
+    headers = event.get('headers') or {}
+    value = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), None)
+    if not value:
+        return []
+    return [tag.strip().replace('W/', '', 1) for tag in value.split(',')]
+
+
+def _build_query(user_id: str, query_params: dict) -> dict:
+    """
+    Route the requested view to the table or the secondary index that serves it.
+    Raises ValueError for combinations no index can answer without a filter.
+    """
+    sort = query_params.get('sort') or 'fileId'
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+
+    order = (query_params.get('order') or 'asc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+
+    content_type = query_params.get('contentType')
+    status = query_params.get('status')
+    if content_type and status:
+        raise ValueError('contentType and status filters cannot be combined')
+
+    user_key = Key('userId').eq(user_id)
+    if content_type:
+        query = {
+            'IndexName': CONTENT_TYPE_INDEX,
+            'KeyConditionExpression': user_key & Key('contentTypeDate').begins_with(f"{content_type}#")
+        }
+    elif status:
+        query = {
+            'IndexName': STATUS_INDEX,
+            'KeyConditionExpression': user_key & Key('statusDate').begins_with(f"{status}#")
+        }
+    elif sort == 'uploadDate':
+        query = {
+            'IndexName': UPLOAD_DATE_INDEX,
+            'KeyConditionExpression': user_key
+        }
+    else:
+        query = {'KeyConditionExpression': user_key}
+
+    query['ScanIndexForward'] = order == 'asc'
+    return query
+
+
+def _build_projection(raw_fields) -> dict:
+    """
+    Turn the fields parameter into ProjectionExpression kwargs.
+    Names go through ExpressionAttributeNames since 'size' and 'status' are reserved words.
+    """
+    if not raw_fields or raw_fields == 'summary':
+        fields = SUMMARY_FIELDS
+    elif raw_fields == 'all':
+        return {}
+    else:
+        fields = tuple(dict.fromkeys(f.strip() for f in raw_fields.split(',') if f.strip()))
+        if not fields or len(fields) > MAX_FIELDS:
+            raise ValueError(f'fields must list between 1 and {MAX_FIELDS} attributes')
+        invalid = [f for f in fields if not FIELD_NAME_PATTERN.match(f)]
+        if invalid:
+            raise ValueError(f"Invalid field name: {invalid[0]}")
+
+    names = {f'#f{i}': field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+
+def _cursor_scope(query_params: dict) -> str:
+    return '|'.join([
+        query_params.get('sort') or 'fileId',
+        query_params.get('contentType') or '',
+        query_params.get('status') or '',
+        (query_params.get('order') or 'asc').lower()
+    ])
+
+
+def _parse_limit(raw_value) -> int:
+    try:
+        value = int(raw_value) if raw_value is not None else DEFAULT_PAGE_SIZE
+    except (TypeError, ValueError):
+        value = DEFAULT_PAGE_SIZE
+    return max(1, min(value, MAX_PAGE_SIZE))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(user_id: str, scope: str, payload: str) -> str:
+    message = f"{user_id}.{scope}.{payload}".encode('utf-8')
+    digest = hmac.new(CURSOR_SIGNING_KEY.encode('utf-8'), message, hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def _encode_cursor(user_id: str, last_evaluated_key: dict, scope: str) -> str:
+    """Wrap a LastEvaluatedKey in an opaque token bound to the caller's userId and view."""
+    key_json = json.dumps(decimal_to_number(last_evaluated_key), separators=(',', ':'), sort_keys=True)
+    payload = _b64encode(key_json.encode('utf-8'))
+    return f"{payload}.{_sign(user_id, scope, payload)}"
+
+
+def _decode_cursor(user_id: str, cursor: str, scope: str):
+    """Return the ExclusiveStartKey for a cursor, or None if it was tampered with."""
+    try:
+        payload, signature = cursor.split('.', 1)
+        if not hmac.compare_digest(signature, _sign(user_id, scope, payload)):
+            return None
+        start_key = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+
+    if not isinstance(start_key, dict) or start_key.get('userId') != user_id:
+        return None
+    return start_key
@@ -1,6 +1,9 @@
 import json
 import os
+import hashlib
+import hmac
 import boto3
+from boto3.dynamodb.conditions import Key
 from PyPDF2 import PdfReader
 from io import BytesIO
 import logging
@@ -17,9 +20,24 @@ s3 = boto3.client('s3')
 # Get environment variables
 FILES_TABLE_NAME = os.environ['FILES_TABLE_NAME']
 FILE_BUCKET_NAME = os.environ['FILE_BUCKET_NAME']
+CURSOR_SIGNING_KEY = os.environ.get('CURSOR_SIGNING_KEY', 'dev-cursor-signing-key')
+
+# Resources returned per resources/list page; clients follow nextCursor for the rest
+RESOURCES_PAGE_SIZE = 100
 
 table = dynamodb.Table(FILES_TABLE_NAME)
 
+# MCP resource property -> FilesTable attribute it is built from
+RESOURCE_FIELD_ATTRIBUTES = {
+    'id': 'fileId',
+    'name': 'fileName',
+    'uri': 's3Key',
+    'mimeType': 'contentType',
+    'size': 'size'
+}
+# Some older FilesTable items carry their size as fileSize
+LEGACY_SIZE_ATTRIBUTE = 'fileSize'
+
 
 def extract_user_id_from_event(event):
     """
@@ -109,7 +127,7 @@ def lambda_handler(event, context):
     MCP Handler - Implements Model Context Protocol endpoints
     
     Handles:
-    - resources/list: Query DynamoDB for user's files
+    - resources/list: Query DynamoDB for a page of the user's files
     - resources/read: Fetch file from S3 and extract text (PDF support)
     """
     try:
@@ -128,7 +146,7 @@ def lambda_handler(event, context):
         
         # Pass the secure user_id to the handlers
         if action == 'resources/list':
-            return handle_resources_list(user_id)
+            return handle_resources_list(user_id, body)
         elif action == 'resources/read':
             # The 'body' is still needed to get 'resource_id'
             return handle_resources_read(user_id, body)
@@ -160,40 +178,74 @@ def lambda_handler(event, context):
         }
 
 
-def handle_resources_list(user_id):
+def handle_resources_list(user_id, body=None):
     """
-    List all files for a user from DynamoDB
+    List a page of the user's files from DynamoDB
     
-    Expected body: {"action": "resources/list", "userId": "user123"}
-    Returns: {"resources": [{"id": "...", "name": "...", "uri": "..."}]}
+    Expected body: {"action": "resources/list", "userId": "user123", "fields": ["name", "size"], "cursor": "..."}
+    Returns: {"resources": [{"id": "...", "name": "...", "uri": "..."}], "nextCursor": "..."}
+
+    "fields" is optional; "id" is always returned and omitting "fields" returns every property.
+    "nextCursor" is only present when more resources remain; pass it back as "cursor" to continue.
     """
     try:
         logger.info(f"Listing resources for user: {user_id}")
-        
-        # Query DynamoDB for user's files
-        response = table.scan(
-            FilterExpression='userId = :uid',
-            ExpressionAttributeValues={':uid': user_id}
-        )
+        body = body or {}
+
+        fields = _resolve_resource_fields(body.get('fields'))
+        if fields is None:
+            return _response(400, {
+                'error': 'Invalid fields',
+                'message': f'fields must be a list drawn from: {", ".join(RESOURCE_FIELD_ATTRIBUTES)}'
+            })
+
+        # Only read the attributes the requested resource properties are built from
+        attribute_names = {f'#{field}': RESOURCE_FIELD_ATTRIBUTES[field] for field in fields}
+        if 'size' in fields:
+            attribute_names['#legacySize'] = LEGACY_SIZE_ATTRIBUTE
+
+        query_kwargs = {
+            'KeyConditionExpression': Key('userId').eq(user_id),
+            'ProjectionExpression': ', '.join(attribute_names),
+            'ExpressionAttributeNames': attribute_names,
+            'Limit': RESOURCES_PAGE_SIZE
+        }
+
+        cursor = body.get('cursor')
+        if cursor:
+            start_key = _decode_cursor(user_id, cursor)
+            if start_key is None:
+                return _response(400, {
+                    'error': 'Invalid cursor',
+                    'message': 'cursor is malformed or was not issued for this user'
+                })
+            query_kwargs['ExclusiveStartKey'] = start_key
+
+        # Query only the caller's partition
+        response = table.query(**query_kwargs)
         
         # Format resources for MCP protocol
         resources = []
         for item in response.get('Items', []):
-            # Convert Decimal to int for JSON serialization
-            file_size = item.get('fileSize', 0)
-            from decimal import Decimal
-            if isinstance(file_size, Decimal):
-                file_size = int(file_size)
-            
-            resources.append({
-                'id': item.get('fileId'),
-                'name': item.get('fileName'),
-                'uri': f"s3://{FILE_BUCKET_NAME}/{item.get('s3Key')}",
-                'mimeType': item.get('contentType', 'application/octet-stream'),
-                'size': file_size
-            })
+            resource = {}
+            if 'id' in fields:
+                resource['id'] = item.get('fileId')
+            if 'name' in fields:
+                resource['name'] = item.get('fileName')
+            if 'uri' in fields:
+                resource['uri'] = f"s3://{FILE_BUCKET_NAME}/{item.get('s3Key')}"
+            if 'mimeType' in fields:
+                resource['mimeType'] = item.get('contentType', 'application/octet-stream')
+            if 'size' in fields:
+                # Convert Decimal to int for JSON serialization
+                resource['size'] = int(item.get('size', item.get(LEGACY_SIZE_ATTRIBUTE, 0)) or 0)
+            resources.append(resource)
         
         logger.info(f"Found {len(resources)} resources for user {user_id}")
+
+        result = {'resources': resources}
+        if 'LastEvaluatedKey' in response:
+            result['nextCursor'] = _encode_cursor(user_id, response['LastEvaluatedKey'])
         
         return {
             'statusCode': 200,
@@ -201,9 +253,7 @@ def handle_resources_list(user_id):
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
-                'resources': resources
-            })
+            'body': json.dumps(result)
         }
     
     except Exception as e:
@@ -211,6 +261,43 @@ def handle_resources_list(user_id):
         raise
 
 
+def _resolve_resource_fields(raw_fields):
+    """Return the resource properties to build, or None if the request is invalid."""
+    if raw_fields is None:
+        return list(RESOURCE_FIELD_ATTRIBUTES)
+    if not isinstance(raw_fields, list) or any(f not in RESOURCE_FIELD_ATTRIBUTES for f in raw_fields):
+        return None
+    return ['id'] + [f for f in RESOURCE_FIELD_ATTRIBUTES if f != 'id' and f in raw_fields]
+
+
+def _sign_cursor(user_id, payload):
+    message = f"{user_id}.mcp.{payload}".encode('utf-8')
+    digest = hmac.new(CURSOR_SIGNING_KEY.encode('utf-8'), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def _encode_cursor(user_id, last_evaluated_key):
+    """Wrap a LastEvaluatedKey in an opaque nextCursor bound to the caller's userId."""
+    key_json = json.dumps(last_evaluated_key, separators=(',', ':'), sort_keys=True)
+    payload = base64.urlsafe_b64encode(key_json.encode('utf-8')).rstrip(b'=').decode('ascii')
+    return f"{payload}.{_sign_cursor(user_id, payload)}"
+
+
+def _decode_cursor(user_id, cursor):
+    """Return the ExclusiveStartKey for a cursor, or None if it is invalid."""
+    try:
+        payload, signature = cursor.split('.', 1)
+        if not hmac.compare_digest(signature, _sign_cursor(user_id, payload)):
+            return None
+        start_key = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+    if not isinstance(start_key, dict) or start_key.get('userId') != user_id:
+        return None
+    return start_key
+
+
 def handle_resources_read(user_id, body):
     """
     Read file content from S3 and extract text if PDF
@@ -0,0 +1,320 @@
+import json
+import math
+import os
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+s3_client = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+
+FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
+FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'users-dev')
+files_table = dynamodb.Table(FILES_TABLE_NAME)
+users_table = dynamodb.Table(USERS_TABLE_NAME)
+
+# S3 multipart limits: parts are 5 MiB-5 GiB (except the last), at most
+# 10,000 parts and 5 TiB per object
+MIB = 1024 * 1024
+MIN_PART_SIZE = 8 * MIB
+MAX_PART_SIZE = 5 * 1024 * MIB
+MAX_PARTS = 10000
+MAX_OBJECT_SIZE = 5 * 1024 * 1024 * MIB
+
+# Presigned part URLs issued per sign-parts call
+MAX_SIGN_BATCH = 100
+PART_URL_EXPIRY_SECONDS = 3600
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Orchestrate S3 multipart uploads for large files.
+
+    Routes (all scoped to the caller's own files):
+    - POST   /files/multipart                     - create the upload and its FilesTable item
+    - POST   /files/{fileId}/multipart/parts      - presign a batch of part URLs
+    - POST   /files/{fileId}/multipart/complete   - assemble the uploaded parts
+    - DELETE /files/{fileId}/multipart            - abort and discard the upload
+
+    The uploadId, partSize and partCount live on the FilesTable item until the
+    upload completes, so any call can pick the upload back up by fileId.
+    """
+    try:
+        try:
+            user_id = event['requestContext']['authorizer']['claims']['sub']
+        except (KeyError, TypeError):
+            return _response(401, {'error': 'Unauthorized: Missing JWT claim'})
+
+        try:
+            body = json.loads(event.get('body') or '{}')
+        except json.JSONDecodeError:
+            return _response(400, {'error': 'Request body must be valid JSON'})
+        if not isinstance(body, dict):
+            return _response(400, {'error': 'Request body must be a JSON object'})
+
+        resource = event.get('resource')
+        method = event.get('httpMethod')
+
+        if resource == '/files/multipart' and method == 'POST':
+            return create_upload(user_id, body)
+
+        file_id = (event.get('pathParameters') or {}).get('fileId')
+        if not file_id:
+            return _response(400, {'error': 'fileId is required'})
+
+        if resource == '/files/{fileId}/multipart/parts' and method == 'POST':
+            return sign_parts(user_id, file_id, body)
+        if resource == '/files/{fileId}/multipart/complete' and method == 'POST':
+            return complete_upload(user_id, file_id, body)
+        if resource == '/files/{fileId}/multipart' and method == 'DELETE':
+            return abort_upload(user_id, file_id)
+
+        return _response(404, {'error': f'Unsupported route: {method} {resource}'})
+
+    except Exception as e:
+        print(f"Error handling multipart upload: {str(e)}")
+        return _response(500, {'error': str(e)})
+
+
+def create_upload(user_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Start a multipart upload and record it on a new pending FilesTable item."""
+    file_name = body.get('fileName')
+    content_type = body.get('contentType', 'application/octet-stream')
+    file_size = body.get('size')
+
+    if not file_name:
+        return _response(400, {'error': 'fileName is required'})
+    if not isinstance(file_size, int) or isinstance(file_size, bool) or not 0 < file_size <= MAX_OBJECT_SIZE:
+        return _response(400, {'error': f'size must be an integer between 1 and {MAX_OBJECT_SIZE} bytes'})
+
+    part_size = _choose_part_size(file_size, body.get('partSize'))
+    part_count = math.ceil(file_size / part_size)
+
+    file_id = str(uuid.uuid4())
+    s3_key = f"{user_id}/{file_id}/{file_name}"
+
+    upload = s3_client.create_multipart_upload(
+        Bucket=FILE_BUCKET_NAME,
+        Key=s3_key,
+        ContentType=content_type
+    )
+
+    upload_date = datetime.utcnow().isoformat()
+    item = {
+        'userId': user_id,
+        'fileId': file_id,
+        'fileName': file_name,
+        's3Key': s3_key,
+        'contentType': content_type,
+        'uploadDate': upload_date,
+        'status': 'pending',
+        'size': file_size,
+        # Sort keys for the filtered list_files indexes
+        'contentTypeDate': f"{content_type}#{upload_date}",
+        'statusDate': f"pending#{upload_date}",
+        # Sparse pending-upload index key (one of 16 shards); removed on completion
+        'pendingShard': file_id[0],
+        'uploadId': upload['UploadId'],
+        'partSize': part_size,
+        'partCount': part_count
+    }
+
+    try:
+        files_table.meta.client.transact_write_items(
+            TransactItems=[
+                {'Put': {'TableName': files_table.name, 'Item': item}},
+                _listing_version_bump(user_id)
+            ]
+        )
+    except Exception:
+        # Don't leave an orphaned upload accruing part storage
+        s3_client.abort_multipart_upload(Bucket=FILE_BUCKET_NAME, Key=s3_key, UploadId=upload['UploadId'])
+        raise
+
+    return _response(200, {
+        'fileId': file_id,
+        'uploadId': upload['UploadId'],
+        'partSize': part_size,
+        'partCount': part_count,
+        'message': 'Multipart upload created successfully'
+    })
+
+
+def sign_parts(user_id: str, file_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Presign upload URLs for up to MAX_SIGN_BATCH parts so they can be PUT in parallel."""
+    item, error = _get_open_upload(user_id, file_id)
+    if error:
+        return error
+
+    part_count = int(item['partCount'])
+    part_numbers = body.get('partNumbers')
+    if (not isinstance(part_numbers, list) or not part_numbers
+            or len(part_numbers) > MAX_SIGN_BATCH
+            or any(not isinstance(n, int) or isinstance(n, bool) or not 1 <= n <= part_count for n in part_numbers)):
+        return _response(400, {
+            'error': f'partNumbers must be a list of 1-{MAX_SIGN_BATCH} part numbers between 1 and {part_count}'
+        })
+
+    parts = [
+        {
+            'partNumber': part_number,
+            'url': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': FILE_BUCKET_NAME,
+                    'Key': item['s3Key'],
+                    'UploadId': item['uploadId'],
+                    'PartNumber': part_number
+                },
+                ExpiresIn=PART_URL_EXPIRY_SECONDS
+            )
+        }
+        for part_number in sorted(set(part_numbers))
+    ]
+
+    return _response(200, {'fileId': file_id, 'parts': parts, 'expiresIn': PART_URL_EXPIRY_SECONDS})
+
+
+def complete_upload(user_id: str, file_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Assemble the uploaded parts into the final object and close out the upload state."""
+    item, error = _get_open_upload(user_id, file_id)
+    if error:
+        return error
+
+    parts = _parse_completed_parts(body.get('parts'), int(item['partCount']))
+    if parts is None:
+        return _response(400, {
+            'error': 'parts must list every part once as {"partNumber": n, "etag": "..."}'
+        })
+
+    try:
+        s3_client.complete_multipart_upload(
+            Bucket=FILE_BUCKET_NAME,
+            Key=item['s3Key'],
+            UploadId=item['uploadId'],
+            MultipartUpload={'Parts': parts}
+        )
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code in ('InvalidPart', 'InvalidPartOrder', 'EntityTooSmall'):
+            return _response(400, {'error': f'Upload could not be completed: {code}'})
+        raise
+
+    # The upload is no longer resumable; status/size are finalized from the object itself
+    files_table.meta.client.transact_write_items(
+        TransactItems=[
+            {
+                'Update': {
+                    'TableName': files_table.name,
+                    'Key': {'userId': user_id, 'fileId': file_id},
+                    'UpdateExpression': 'REMOVE uploadId, partSize, partCount',
+                    'ConditionExpression': 'uploadId = :uploadId',
+                    'ExpressionAttributeValues': {':uploadId': item['uploadId']}
+                }
+            },
+            _listing_version_bump(user_id)
+        ]
+    )
+
+    return _response(200, {'fileId': file_id, 'message': 'Multipart upload completed successfully'})
+
+
+def abort_upload(user_id: str, file_id: str) -> Dict[str, Any]:
+    """Abort the upload, freeing its stored parts, and remove the pending item."""
+    item, error = _get_open_upload(user_id, file_id)
+    if error:
+        return error
+
+    try:
+        s3_client.abort_multipart_upload(
+            Bucket=FILE_BUCKET_NAME,
+            Key=item['s3Key'],
+            UploadId=item['uploadId']
+        )
+    except ClientError as e:
+        # Already aborted or expired by the bucket lifecycle; still drop the item
+        if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+            raise
+
+    files_table.meta.client.transact_write_items(
+        TransactItems=[
+            {
+                'Delete': {
+                    'TableName': files_table.name,
+                    'Key': {'userId': user_id, 'fileId': file_id},
+                    'ConditionExpression': 'uploadId = :uploadId',
+                    'ExpressionAttributeValues': {':uploadId': item['uploadId']}
+                }
+            },
+            _listing_version_bump(user_id)
+        ]
+    )
+
+    return _response(200, {'fileId': file_id, 'message': 'Multipart upload aborted'})
+
+
+def _choose_part_size(file_size: int, requested: Any) -> int:
+    """Honour a requested part size within S3's limits, growing it if needed to stay under MAX_PARTS."""
+    part_size = requested if isinstance(requested, int) and not isinstance(requested, bool) else MIN_PART_SIZE
+    part_size = max(MIN_PART_SIZE, min(part_size, MAX_PART_SIZE))
+    minimum_for_size = math.ceil(file_size / MAX_PARTS)
+    if part_size < minimum_for_size:
+        # Round up to a whole MiB so part boundaries stay easy to reason about
+        part_size = math.ceil(minimum_for_size / MIB) * MIB
+    return part_size
+
+
+def _parse_completed_parts(raw_parts: Any, part_count: int) -> Optional[List[Dict[str, Any]]]:
+    """Return the S3 Parts list for CompleteMultipartUpload, or None if any part is missing or malformed."""
+    if not isinstance(raw_parts, list) or len(raw_parts) != part_count:
+        return None
+
+    parts = {}
+    for part in raw_parts:
+        if not isinstance(part, dict):
+            return None
+        number, etag = part.get('partNumber'), part.get('etag')
+        if not isinstance(number, int) or not 1 <= number <= part_count or not isinstance(etag, str) or not etag:
+            return None
+        parts[number] = etag
+
+    if len(parts) != part_count:
+        return None
+    return [{'PartNumber': number, 'ETag': parts[number]} for number in sorted(parts)]
+
+
+def _get_open_upload(user_id: str, file_id: str):
+    """Return (item, None) for the caller's in-progress upload, or (None, error response)."""
+    response = files_table.get_item(Key={'userId': user_id, 'fileId': file_id})
+    item = response.get('Item')
+    if not item:
+        return None, _response(404, {'error': 'File not found'})
+    if 'uploadId' not in item:
+        return None, _response(409, {'error': 'File has no multipart upload in progress'})
+    return item, None
+
+
+def _listing_version_bump(user_id: str) -> dict:
+    return {
+        'Update': {
+            'TableName': users_table.name,
+            'Key': {'userId': user_id},
+            'UpdateExpression': 'ADD listingVersion :one',
+            'ExpressionAttributeValues': {':one': 1}
+        }
+    }
+
+
+def _response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
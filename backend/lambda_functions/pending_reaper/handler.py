@@ -0,0 +1,202 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+s3_client = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+
+FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
+FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'users-dev')
+TOMBSTONES_TABLE_NAME = os.environ.get('TOMBSTONES_TABLE_NAME', 'file-tombstones-dev')
+files_table = dynamodb.Table(FILES_TABLE_NAME)
+users_table = dynamodb.Table(USERS_TABLE_NAME)
+tombstones_table = dynamodb.Table(TOMBSTONES_TABLE_NAME)
+
+# Sparse index over pending items only: pendingShard (first hex digit of fileId) + uploadDate
+PENDING_INDEX = 'pendingShard-uploadDate-index'
+PENDING_SHARDS = '0123456789abcdef'
+
+# Pending uploads older than this are considered abandoned
+STALE_AFTER_HOURS = int(os.environ.get('STALE_AFTER_HOURS', '48'))
+
+# Throttle so the reaper never competes with user traffic for table capacity
+BATCH_SIZE = 25  # Candidates read per index page
+MAX_DELETES_PER_SECOND = int(os.environ.get('MAX_DELETES_PER_SECOND', '25'))
+MAX_ITEMS_PER_RUN = int(os.environ.get('MAX_ITEMS_PER_RUN', '2000'))
+# Stop early rather than be killed mid-batch by the Lambda timeout
+MIN_REMAINING_MS = 10000
+# A transaction cancelled by throttling or a conflicting write is retried
+RETRYABLE_CANCELLATIONS = {'TransactionConflict', 'ThrottlingError', 'ProvisionedThroughputExceeded'}
+THROTTLING_ERRORS = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Scheduled job: delete pending FilesTable items whose upload was abandoned.
+
+    Candidates come from the sparse pending index (only pending items carry
+    pendingShard), so the cost is proportional to the garbage, not the table.
+    Multipart uploads are aborted first so their parts stop accruing storage.
+    Each item is deleted only if it is still pending, in the same transaction
+    as a tombstone for its "<userId>/<fileId>/" prefix, so file_purger removes
+    any object a client PUT but never finalized. Deletes are paced to
+    MAX_DELETES_PER_SECOND, and a run stops after MAX_ITEMS_PER_RUN items;
+    whatever is left is picked up by the next run.
+    """
+    cutoff = (datetime.utcnow() - timedelta(hours=STALE_AFTER_HOURS)).isoformat()
+    reaped = 0
+    aborted = 0
+    touched_users = set()
+
+    for shard in PENDING_SHARDS:
+        start_key = None
+        while reaped < MAX_ITEMS_PER_RUN and _has_time_left(context):
+            query_kwargs = {
+                'IndexName': PENDING_INDEX,
+                'KeyConditionExpression': Key('pendingShard').eq(shard) & Key('uploadDate').lt(cutoff),
+                'Limit': min(BATCH_SIZE, MAX_ITEMS_PER_RUN - reaped),
+            }
+            if start_key:
+                query_kwargs['ExclusiveStartKey'] = start_key
+            response = files_table.query(**query_kwargs)
+            # The index is eventually consistent; recheck so a just-finished upload isn't reaped
+            items = _still_pending(response.get('Items', []))
+
+            if items:
+                batch_started = time.time()
+                aborted += _abort_multipart_uploads(items)
+                deleted = _delete_items(items)
+                reaped += len(deleted)
+                touched_users.update(item['userId'] for item in deleted)
+                _pace(len(items), batch_started)
+
+            start_key = response.get('LastEvaluatedKey')
+            if not start_key:
+                break
+
+        if reaped >= MAX_ITEMS_PER_RUN or not _has_time_left(context):
+            break
+
+    for user_id in touched_users:
+        users_table.update_item(
+            Key={'userId': user_id},
+            UpdateExpression='ADD listingVersion :one',
+            ExpressionAttributeValues={':one': 1}
+        )
+
+    print(f"Reaped {reaped} stale pending uploads ({aborted} multipart uploads aborted)")
+    return {'reaped': reaped, 'aborted': aborted}
+
+
+def _still_pending(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if not items:
+        return []
+    request = {
+        files_table.name: {
+            'Keys': [{'userId': item['userId'], 'fileId': item['fileId']} for item in items],
+            'ProjectionExpression': 'userId, fileId, pendingShard',
+            'ConsistentRead': True,
+        }
+    }
+    pending = set()
+    while request:
+        response = files_table.meta.client.batch_get_item(RequestItems=request)
+        for item in response.get('Responses', {}).get(files_table.name, []):
+            if 'pendingShard' in item:
+                pending.add((item['userId'], item['fileId']))
+        request = response.get('UnprocessedKeys') or None
+    return [item for item in items if (item['userId'], item['fileId']) in pending]
+
+
+def _abort_multipart_uploads(items: List[Dict[str, Any]]) -> int:
+    aborted = 0
+    for item in items:
+        if not item.get('uploadId'):
+            continue
+        try:
+            s3_client.abort_multipart_upload(
+                Bucket=FILE_BUCKET_NAME,
+                Key=item['s3Key'],
+                UploadId=item['uploadId']
+            )
+            aborted += 1
+        except ClientError as exc:
+            # Already aborted by the client or the bucket lifecycle rule
+            if exc.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+                raise
+    return aborted
+
+
+def _delete_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Delete and tombstone each item that is still pending; returns the ones deleted.
+
+    The consistent recheck can't stop the upload from completing before the
+    delete lands, so the delete is conditional on pendingShard (which
+    upload_finalizer removes) rather than a blind BatchWriteItem.
+    """
+    deleted = []
+    for item in items:
+        delay = 0.05
+        while True:
+            try:
+                files_table.meta.client.transact_write_items(
+                    TransactItems=[
+                        {
+                            'Delete': {
+                                'TableName': files_table.name,
+                                'Key': {'userId': item['userId'], 'fileId': item['fileId']},
+                                'ConditionExpression': 'attribute_exists(pendingShard)'
+                            }
+                        },
+                        _tombstone(item)
+                    ]
+                )
+                deleted.append(item)
+                break
+            except ClientError as exc:
+                codes = {reason.get('Code') for reason in exc.response.get('CancellationReasons') or []}
+                if 'ConditionalCheckFailed' in codes:
+                    # Completed (or deleted) since the recheck
+                    break
+                throttled = exc.response.get('Error', {}).get('Code') in THROTTLING_ERRORS
+                if not throttled and not (codes and codes - {'None'} <= RETRYABLE_CANCELLATIONS):
+                    raise
+                # Throttled or contended: back off harder instead of pushing against production traffic
+                time.sleep(delay)
+                delay = min(delay * 2, 5)
+    return deleted
+
+
+def _tombstone(item: Dict[str, Any]) -> dict:
+    """Put action queueing the item's "<userId>/<fileId>/" prefix for file_purger (see delete_file)."""
+    owner, object_dir = item['s3Key'].split('/', 2)[:2]
+    return {
+        'Put': {
+            'TableName': tombstones_table.name,
+            'Item': {
+                's3Prefix': f"{owner}/{object_dir}/",
+                'userId': item['userId'],
+                'fileId': item['fileId'],
+                'deletedAt': datetime.utcnow().isoformat()
+            }
+        }
+    }
+
+
+def _pace(count: int, started: float) -> None:
+    """Sleep so that deletes average at most MAX_DELETES_PER_SECOND."""
+    remaining = count / MAX_DELETES_PER_SECOND - (time.time() - started)
+    if remaining > 0:
+        time.sleep(remaining)
+
+
+def _has_time_left(context: Any) -> bool:
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return True
+    return context.get_remaining_time_in_millis() > MIN_REMAINING_MS
@@ -1,10 +1,16 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
 import secrets
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
 import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
 
 dynamodb = boto3.resource('dynamodb')
 
@@ -14,22 +20,105 @@ SHARED_LINKS_TABLE_NAME = os.environ.get('SHARED_LINKS_TABLE_NAME', 'SharedLinks
 files_table = dynamodb.Table(FILES_TABLE_NAME)
 shared_links_table = dynamodb.Table(SHARED_LINKS_TABLE_NAME)
 
+# Owner's links, optionally narrowed to one file: Query userId (+ fileId)
+OWNER_INDEX = 'userId-fileId-index'
+
+# "signed" mode: a link is a self-contained HMAC-signed token and is never
+# written to SharedLinksTable, so shared_link resolves it without a table read.
+# SHARE_SIGNING_KEYS is {"<keyId>": "<secret>"}; new links are signed with
+# SHARE_SIGNING_KEY_ID and any configured key still verifies (rotation).
+SHARE_TOKEN_MODE = os.environ.get('SHARE_TOKEN_MODE', 'stored')
+SHARE_SIGNING_KEYS = json.loads(os.environ.get('SHARE_SIGNING_KEYS') or '{}')
+SHARE_SIGNING_KEY_ID = os.environ.get('SHARE_SIGNING_KEY_ID', 'k1')
+SIGNED = 'signed'
+
+# Revoked signed links (token ID or fileId -> expiresAt) are spread over 16
+# items, "#revoked#<hex digit>" by hash of the ID, that shared_link caches;
+# entries are pruned once the links they cover would have expired. Only
+# _add_revocations writes them; delete_file and account_purger invoke this
+# function rather than writing the list themselves.
+REVOCATIONS_KEY = '#revoked'
+REVOCATIONS_PER_UPDATE = 50
+
+# Issuing a signed link upserts "#signed#<userId>#<fileId>" (with userId,
+# fileId and the latest link expiry, so it shows up in the owner index and
+# expires by TTL). Deleting the file revokes its fileId only if one exists.
+SIGNED_LINKS_MARKER = '#signed'
+
+MAX_DOWNLOADS_LIMIT = 1000000
+
+# "reuse": true returns an existing link instead of minting a new one when its
+# expiry is within a tenth of the requested lifetime (at most an hour) of the
+# requested expiry (repeat share clicks). Scaling with the lifetime means a
+# 1-hour link is never answered with one that dies in minutes.
+REUSE_TOLERANCE_SECONDS = 3600
+REUSE_TOLERANCE_FRACTION = 0.1
+# BatchGetItem reads at most 100 keys per call
+BATCH_GET_SIZE = 100
+
 
 def lambda_handler(event, context):
     """
     Creates a shareable link for a file owned by the authenticated user.
+
+    Also manages the caller's existing links:
+    - GET    /files/{fileId}/shares - active links to one file
+    - DELETE /shares/{token}        - revoke a link
+
+    With "reuse": true in the body, an existing live link to the file with
+    about the requested lifetime is returned instead of writing a new one.
+
+    With SHARE_TOKEN_MODE=signed the link is a signed token carrying the
+    object key, file name and expiry instead of a SharedLinksTable row;
+    revoking one adds it to the revocation list shared_link checks.
+
+    This is the revocation list's only writer: delete_file and account_purger
+    invoke it directly with {"revocations": {fileId: expiresAt}} for deleted
+    files that have signed links. API Gateway events never carry that key.
     """
+    if 'revocations' in event:
+        entries = {rid: int(until) for rid, until in event['revocations'].items()}
+        _add_revocations(entries)
+        return {'revoked': len(entries)}
+
     try:
         user_id = _get_user_id(event)
         if not user_id:
             return _response(401, {'error': 'Unauthorized: Missing or invalid authentication token'})
 
-        file_id = (event.get('pathParameters') or {}).get('fileId')
+        path_params = event.get('pathParameters') or {}
+        resource = event.get('resource')
+        if resource == '/shares/{token}' and event.get('httpMethod') == 'DELETE':
+            return revoke_share(user_id, path_params.get('token'))
+
+        file_id = path_params.get('fileId')
         if not file_id:
             return _response(400, {'error': 'fileId is required'})
 
+        if resource == '/files/{fileId}/shares' and event.get('httpMethod') == 'GET':
+            return list_shares(user_id, file_id)
+
         body = json.loads(event.get('body') or '{}')
         expiration_hours = _parse_expiration_hours(body.get('expirationHours'))
+        max_downloads = body.get('maxDownloads')
+        if max_downloads is not None and (
+                isinstance(max_downloads, bool) or not isinstance(max_downloads, int)
+                or not 1 <= max_downloads <= MAX_DOWNLOADS_LIMIT):
+            return _response(400, {'error': f'maxDownloads must be an integer from 1 to {MAX_DOWNLOADS_LIMIT}'})
+
+        expiration_time = datetime.utcnow() + timedelta(hours=expiration_hours)
+        expires_at = int(expiration_time.timestamp())
+
+        # Capped links are separate grants and signed links cost no write, so
+        # only plain uncapped links are reused
+        if body.get('reuse') is True and max_downloads is None and SHARE_TOKEN_MODE != SIGNED:
+            existing = _find_reusable_link(user_id, file_id, expires_at)
+            if existing:
+                return _response(200, {
+                    'shareUrl': f"{_share_base_url()}/shared/{existing['shareToken']}",
+                    'expiresAt': datetime.utcfromtimestamp(int(existing['expiresAt'])).isoformat() + 'Z',
+                    'reused': True,
+                })
 
         file_item = files_table.get_item(
             Key={'userId': user_id, 'fileId': file_id}
@@ -38,12 +127,20 @@ def lambda_handler(event, context):
         if not file_item:
             return _response(404, {'error': 'File not found'})
 
-        link_id = secrets.token_urlsafe(18)
-        expiration_time = datetime.utcnow() + timedelta(hours=expiration_hours)
-        expires_at = int(expiration_time.timestamp())
-
-        shared_links_table.put_item(
-            Item={
+        # A download cap is counted on the stored record, so capped links are always stored
+        if SHARE_TOKEN_MODE == SIGNED and max_downloads is None:
+            _mark_signed_links(user_id, file_id, expires_at)
+            link_id = _sign_share_token({
+                'u': user_id,
+                'f': file_id,
+                'k': file_item['s3Key'],
+                'n': file_item['fileName'],
+                'e': expires_at,
+                'i': secrets.token_urlsafe(9),
+            })
+        else:
+            link_id = secrets.token_urlsafe(18)
+            link_item = {
                 'shareToken': link_id,
                 'linkId': link_id,
                 'fileId': file_id,
@@ -53,24 +150,252 @@ def lambda_handler(event, context):
                 'createdAt': datetime.utcnow().isoformat(),
                 'expiresAt': expires_at,
             }
+            if max_downloads is not None:
+                link_item['maxDownloads'] = max_downloads
+            shared_links_table.put_item(Item=link_item)
+
+        share_url = f"{_share_base_url()}/shared/{link_id}"
+        response_body = {
+            'shareUrl': share_url,
+            'expiresAt': expiration_time.isoformat() + 'Z',
+        }
+        if max_downloads is not None:
+            response_body['maxDownloads'] = max_downloads
+        return _response(200, response_body)
+
+    except Exception as exc:
+        print(f"Error creating share link: {exc}")
+        return _response(500, {'error': 'Internal server error'})
+
+
+def _find_reusable_link(user_id: str, file_id: str, expires_at: int) -> Optional[dict]:
+    """
+    The caller's uncapped link to the file whose expiry is within the reuse
+    tolerance of the one requested, if any.
+
+    One index query finds the candidates; only the chosen one is read back
+    to rule out a download cap, which the index doesn't project.
+    """
+    now = int(time.time())
+    tolerance = min(REUSE_TOLERANCE_SECONDS, int((expires_at - now) * REUSE_TOLERANCE_FRACTION))
+    query_kwargs = {
+        'IndexName': OWNER_INDEX,
+        'KeyConditionExpression': Key('userId').eq(user_id) & Key('fileId').eq(file_id),
+    }
+    candidates = []
+    while True:
+        response = shared_links_table.query(**query_kwargs)
+        candidates.extend(
+            link for link in response.get('Items', [])
+            if not link['shareToken'].startswith('#')
+            and expires_at - tolerance <= int(link.get('expiresAt', 0)) <= expires_at + tolerance
         )
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
-        share_base_url = os.environ.get('SHARE_BASE_URL')
-        if not share_base_url:
-            raise RuntimeError('SHARE_BASE_URL environment variable not set')
+    # Latest expiry first: the longest-lived of the acceptable links
+    for link in sorted(candidates, key=lambda link: int(link['expiresAt']), reverse=True):
+        record = shared_links_table.get_item(
+            Key={'shareToken': link['shareToken']},
+            ProjectionExpression='shareToken, expiresAt, maxDownloads'
+        ).get('Item')
+        if record and 'maxDownloads' not in record:
+            return record
+    return None
 
-        share_url = f"{share_base_url}/shared/{link_id}"
-        return _response(
-            200,
-            {
-                'shareUrl': share_url,
-                'expiresAt': expiration_time.isoformat() + 'Z',
+
+def list_shares(user_id: str, file_id: str) -> dict:
+    """
+    List the caller's unexpired links to a file with one index query.
+
+    Signed links aren't stored, so they don't appear here. Download counts
+    come from shared_link's batched counters, so they can lag by a few seconds.
+    """
+    now = int(time.time())
+    share_base_url = os.environ.get('SHARE_BASE_URL', '')
+    shares = []
+    query_kwargs = {
+        'IndexName': OWNER_INDEX,
+        'KeyConditionExpression': Key('userId').eq(user_id) & Key('fileId').eq(file_id),
+    }
+    while True:
+        response = shared_links_table.query(**query_kwargs)
+        for link in response.get('Items', []):
+            # TTL deletion lags expiry by up to a couple of days; '#' items are bookkeeping
+            if int(link.get('expiresAt', 0)) <= now or link['shareToken'].startswith('#'):
+                continue
+            shares.append({
+                'shareToken': link['shareToken'],
+                'shareUrl': f"{share_base_url}/shared/{link['shareToken']}",
+                'createdAt': link.get('createdAt'),
+                'expiresAt': datetime.utcfromtimestamp(int(link['expiresAt'])).isoformat() + 'Z',
+            })
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # Access counters aren't projected into the index; read them from the links
+    usage = _link_usage([share['shareToken'] for share in shares])
+    for share in shares:
+        link = usage.get(share['shareToken'], {})
+        share['downloadCount'] = int(link.get('downloadCount', 0))
+        share['lastAccessedAt'] = (
+            datetime.utcfromtimestamp(int(link['lastAccessedAt'])).isoformat() + 'Z'
+            if 'lastAccessedAt' in link else None
+        )
+        share['maxDownloads'] = int(link['maxDownloads']) if 'maxDownloads' in link else None
+
+    shares.sort(key=lambda share: share['createdAt'] or '')
+    return _response(200, {'fileId': file_id, 'shares': shares, 'count': len(shares)})
+
+
+def _link_usage(tokens: list) -> dict:
+    """shareToken -> download counters, via BatchGetItem."""
+    usage = {}
+    client = shared_links_table.meta.client
+    for start in range(0, len(tokens), BATCH_GET_SIZE):
+        request = {
+            shared_links_table.name: {
+                'Keys': [{'shareToken': token} for token in tokens[start:start + BATCH_GET_SIZE]],
+                'ProjectionExpression': 'shareToken, downloadCount, lastAccessedAt, maxDownloads',
             }
+        }
+        delay = 0.05
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            for link in response.get('Responses', {}).get(shared_links_table.name, []):
+                usage[link['shareToken']] = link
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                time.sleep(delay)
+                delay = min(delay * 2, 1)
+    return usage
+
+
+def revoke_share(user_id: str, token: Optional[str]) -> dict:
+    """Delete one of the caller's links; someone else's token looks the same as a missing one."""
+    if not token:
+        return _response(400, {'error': 'token is required'})
+    if token.startswith('#'):
+        return _response(404, {'error': 'Share link not found'})
+    if '.' in token:
+        return _revoke_signed_share(user_id, token)
+    try:
+        shared_links_table.delete_item(
+            Key={'shareToken': token},
+            ConditionExpression='userId = :userId',
+            ExpressionAttributeValues={':userId': user_id}
         )
+    except ClientError as exc:
+        if exc.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return _response(404, {'error': 'Share link not found'})
+        raise
+    return _response(200, {'shareToken': token, 'message': 'Share link revoked'})
 
-    except Exception as exc:
-        print(f"Error creating share link: {exc}")
-        return _response(500, {'error': 'Internal server error'})
+
+def _revoke_signed_share(user_id: str, token: str) -> dict:
+    claims = _verify_share_token(token)
+    if not claims or claims.get('u') != user_id:
+        return _response(404, {'error': 'Share link not found'})
+    if int(claims['e']) > int(time.time()):
+        _add_revocations({claims['i']: int(claims['e'])})
+    return _response(200, {'shareToken': token, 'message': 'Share link revoked'})
+
+
+def _mark_signed_links(user_id: str, file_id: str, expires_at: int) -> None:
+    """Record that file_id has signed links until at least expires_at."""
+    try:
+        shared_links_table.update_item(
+            Key={'shareToken': f'{SIGNED_LINKS_MARKER}#{user_id}#{file_id}'},
+            UpdateExpression='SET userId = :userId, fileId = :fileId, expiresAt = :expiresAt',
+            ConditionExpression='attribute_not_exists(expiresAt) OR expiresAt < :expiresAt',
+            ExpressionAttributeValues={':userId': user_id, ':fileId': file_id, ':expiresAt': expires_at}
+        )
+    except ClientError as exc:
+        # An earlier link already outlives this one
+        if exc.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+
+
+def _add_revocations(entries: dict) -> None:
+    """Add {tokenId or fileId: expiresAt} to the revocation list, pruning entries past their expiry."""
+    now = int(time.time())
+    by_shard = {}
+    for rid, expires_at in entries.items():
+        shard = hashlib.sha256(rid.encode('utf-8')).hexdigest()[0]
+        by_shard.setdefault(f'{REVOCATIONS_KEY}#{shard}', {})[rid] = expires_at
+
+    for shard_key, shard_entries in sorted(by_shard.items()):
+        current = shared_links_table.get_item(
+            Key={'shareToken': shard_key}, ConsistentRead=True
+        ).get('Item', {}).get('revoked', {})
+        expired = [rid for rid, expires_at in current.items() if int(expires_at) <= now and rid not in shard_entries]
+
+        # Nested paths can only be SET once the map exists
+        shared_links_table.update_item(
+            Key={'shareToken': shard_key},
+            UpdateExpression='SET revoked = if_not_exists(revoked, :empty)',
+            ExpressionAttributeValues={':empty': {}}
+        )
+        pending = sorted(shard_entries.items())
+        while pending or expired:
+            chunk, pending = pending[:REVOCATIONS_PER_UPDATE], pending[REVOCATIONS_PER_UPDATE:]
+            pruned, expired = expired[:REVOCATIONS_PER_UPDATE], expired[REVOCATIONS_PER_UPDATE:]
+            names = {f'#r{i}': rid for i, (rid, _) in enumerate(chunk)}
+            names.update({f'#x{i}': rid for i, rid in enumerate(pruned)})
+            update_expression = ''
+            kwargs = {}
+            if chunk:
+                update_expression += 'SET ' + ', '.join(f'revoked.#r{i} = :r{i}' for i in range(len(chunk)))
+                kwargs['ExpressionAttributeValues'] = {f':r{i}': int(until) for i, (_, until) in enumerate(chunk)}
+            if pruned:
+                update_expression += ' REMOVE ' + ', '.join(f'revoked.#x{i}' for i in range(len(pruned)))
+            shared_links_table.update_item(
+                Key={'shareToken': shard_key},
+                UpdateExpression=update_expression.strip(),
+                ExpressionAttributeNames=names,
+                **kwargs
+            )
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(key_id: str, payload: str) -> str:
+    key = SHARE_SIGNING_KEYS[key_id]
+    digest = hmac.new(key.encode('utf-8'), f"{key_id}.{payload}".encode('utf-8'), hashlib.sha256).digest()
+    return _b64encode(digest)
+
+
+def _sign_share_token(claims: dict) -> str:
+    """Encode claims as "<keyId>.<payload>.<signature>"; plain tokens never contain a dot."""
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f"{SHARE_SIGNING_KEY_ID}.{payload}.{_sign(SHARE_SIGNING_KEY_ID, payload)}"
+
+
+def _verify_share_token(token: str) -> Optional[dict]:
+    """Return a signed token's claims, or None if it is malformed, tampered with or its key is retired."""
+    try:
+        key_id, payload, signature = token.split('.')
+        if key_id not in SHARE_SIGNING_KEYS or not hmac.compare_digest(signature, _sign(key_id, payload)):
+            return None
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, TypeError):
+        return None
+    return claims if isinstance(claims, dict) else None
+
+
+def _share_base_url() -> str:
+    share_base_url = os.environ.get('SHARE_BASE_URL')
+    if not share_base_url:
+        raise RuntimeError('SHARE_BASE_URL environment variable not set')
+    return share_base_url
 
 
 def _get_user_id(event: dict) -> Optional[str]:
@@ -1,7 +1,11 @@
+import base64
+import hashlib
+import hmac
 import json
 import os
 import time
-from typing import Any, Dict
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
 import boto3
 from botocore.exceptions import ClientError
@@ -18,73 +22,400 @@ if not SHARED_LINKS_TABLE or not FILE_BUCKET:
 
 shared_links_table = dynamodb.Table(SHARED_LINKS_TABLE)
 
+# Signed links ("<keyId>.<payload>.<signature>", see share_file) are verified
+# here without reading SharedLinksTable. Any configured key verifies, so a key
+# stays listed until the links it signed have expired. Turning signed mode off
+# invalidates every outstanding signed link.
+SHARE_TOKEN_MODE = os.environ.get('SHARE_TOKEN_MODE', 'stored')
+SHARE_SIGNING_KEYS = json.loads(os.environ.get('SHARE_SIGNING_KEYS') or '{}')
+SIGNED = 'signed'
+
+# The revocation list is 16 items ("#revoked#<hex digit>", see share_file),
+# re-read together at most every 30 seconds per container
+REVOCATIONS_KEY = '#revoked'
+REVOCATION_SHARDS = '0123456789abcdef'
+REVOCATION_CACHE_SECONDS = 30
+_revocation_cache = {'revoked': {}, 'loadedAt': 0.0}
+
+# Per-container LRU of resolved links: linkId -> ((status, body, meter), cache-until).
+# Found links are cached for LINK_CACHE_SECONDS (never past their expiresAt)
+# together with their presigned URL; unknown and expired tokens are cached
+# too, so probing random tokens doesn't reach DynamoDB. A revoked or deleted
+# plain link can keep resolving in a warm container for up to that long.
+LINK_CACHE_SIZE = 2048
+LINK_CACHE_SECONDS = 30
+NOT_FOUND_CACHE_SECONDS = 30
+DOWNLOAD_URL_EXPIRY_SECONDS = 300
+# Redirects are cached by browsers and CDNs until this long before the URL expires
+REDIRECT_CACHE_MARGIN_SECONDS = 30
+_link_cache: 'OrderedDict[str, Tuple[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]], float]]' = OrderedDict()
+
+# Exposed through the X-Cache response header and a periodic embedded-metrics log line
+STATS_LOG_INTERVAL = 100
+cache_stats = {'hits': 0, 'negativeHits': 0, 'misses': 0, 'evictions': 0}
+_logged_stats = dict(cache_stats)
+
+# Stored links count their downloads (downloadCount, lastAccessedAt). A hit on
+# a link this container hasn't written in the last METER_FLUSH_SECONDS is
+# written straight away; later hits are buffered and added with one
+# UpdateItem per link once that interval has passed or METER_FLUSH_HITS are
+# buffered, whichever comes first. Hits buffered in a container that is
+# reclaimed before its next flush are lost: at most METER_FLUSH_HITS, all
+# from the last METER_FLUSH_SECONDS of links it had just written.
+METER_FLUSH_SECONDS = 10
+METER_FLUSH_HITS = 100
+_pending_downloads: Dict[str, List[int]] = {}
+_flushed_at: Dict[str, float] = {}
+
+# A capped link never passes maxDownloads: downloads are claimed with a
+# conditional increment against the table, which other containers share.
+# While at least METER_LEASE_HEADROOM downloads are left, a container claims
+# METER_LEASE_SIZE at once and serves them without further writes (only
+# lastAccessedAt is buffered); closer to the cap each download is claimed on
+# its own. Leased downloads a reclaimed container never served stay counted,
+# so such a link can run out up to METER_LEASE_SIZE - 1 downloads early per
+# reclaimed container.
+METER_LEASE_SIZE = 10
+METER_LEASE_HEADROOM = 100
+_download_leases: Dict[str, int] = {}
+
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Handle GET /shared/{linkId} - resolve shared link and return download URL.
+
+    Signed links are checked against their signature and the cached
+    revocation list only; plain links are looked up in SharedLinksTable.
+
+    With ?redirect=true, or an Accept header asking for HTML rather than
+    JSON (a browser following the link), the answer is a 302 straight to
+    the presigned URL instead of JSON, cacheable for as long as the URL
+    stays valid.
+
+    Resolutions (including "not found") are kept in a small per-container
+    LRU cache, so a popular link or a run of probes for made-up tokens costs
+    one table read per container every LINK_CACHE_SECONDS at most.
+
+    Downloads of stored links are counted in write-batched counters, and a
+    link's optional maxDownloads cap is enforced. Buffered counts can be lost
+    when a container is reclaimed; see METER_FLUSH_SECONDS.
     """
     try:
         link_id = (event.get('pathParameters') or {}).get('linkId')
         if not link_id:
             return _response(400, {'error': 'Missing linkId parameter'})
 
-        try:
-            response = shared_links_table.get_item(Key={'shareToken': link_id})
-        except ClientError as err:
-            print(f"DynamoDB error retrieving link {link_id}: {err}")
-            return _response(500, {'error': 'Database error'})
+        now = time.time()
+        cached = _cache_get(link_id, now)
+        if cached is not None:
+            (status_code, body, meter), cache = cached, 'Hit'
+        else:
+            status_code, body, meter, ttl = _resolve(link_id, now)
+            if ttl > 0:
+                _cache_put(link_id, (status_code, body, meter), now + ttl)
+            cache = 'Miss'
 
-        share_record = response.get('Item')
-        if not share_record:
-            return _response(404, {'error': 'Share link not found'})
+        if status_code == 200 and meter is not None and not _count_download(link_id, meter, now):
+            status_code, body = 404, {'error': 'Share link download limit reached'}
+            _cache_put(link_id, (status_code, body, None), now + NOT_FOUND_CACHE_SECONDS)
+        _flush_downloads(now)
 
-        current_time = int(time.time())
-        expires_at = share_record.get('expiresAt')
-        if expires_at and expires_at <= current_time:
-            return _response(404, {'error': 'Share link has expired'})
+        if status_code == 200 and _wants_redirect(event):
+            # A capped link's redirect can't be replayed from a cache without being counted
+            return _redirect(body, now, cache, cacheable=meter is None or meter.get('maxDownloads') is None)
+        return _response(status_code, body, cache=cache)
 
-        s3_key = share_record.get('s3Key')
-        file_name = share_record.get('fileName', 'download')
-        if not s3_key:
-            return _response(500, {'error': 'Invalid share record'})
+    except Exception as exc:
+        print(f"Unexpected error resolving shared link: {exc}")
+        return _response(500, {'error': 'Internal server error'})
 
+
+def _resolve(link_id: str, now: float) -> Tuple[int, Dict[str, Any], Optional[Dict[str, Any]], float]:
+    """
+    (status, body, meter, seconds the result may be cached); errors are never cached.
+
+    meter is the stored link's download accounting (None for signed links).
+    """
+    try:
+        if '.' in link_id:
+            share_record = _resolve_signed_token(link_id)
+        elif link_id.startswith('#'):
+            # Revocation list and signed-link markers, not share links
+            share_record = None
+        else:
+            share_record = shared_links_table.get_item(Key={'shareToken': link_id}).get('Item')
+    except ClientError as err:
+        print(f"DynamoDB error retrieving link {link_id}: {err}")
+        return 500, {'error': 'Database error'}, None, 0
+
+    if not share_record:
+        return 404, {'error': 'Share link not found'}, None, NOT_FOUND_CACHE_SECONDS
+
+    expires_at = share_record.get('expiresAt')
+    if expires_at and expires_at <= int(now):
+        return 404, {'error': 'Share link has expired'}, None, NOT_FOUND_CACHE_SECONDS
+
+    s3_key = share_record.get('s3Key')
+    file_name = share_record.get('fileName', 'download')
+    if not s3_key:
+        return 500, {'error': 'Invalid share record'}, None, 0
+
+    try:
+        download_url = s3_client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': FILE_BUCKET,
+                'Key': s3_key,
+                'ResponseContentDisposition': f'attachment; filename="{file_name}"',
+            },
+            ExpiresIn=DOWNLOAD_URL_EXPIRY_SECONDS,
+        )
+    except ClientError as err:
+        print(f"S3 presigned URL generation failed for {s3_key}: {err}")
+        return 500, {'error': 'Failed to generate download URL'}, None, 0
+
+    # The cached body reuses this URL, so it must outlive the cache entry with
+    # room to spare, and the link must not be served past its own expiry
+    ttl = LINK_CACHE_SECONDS
+    if expires_at:
+        ttl = min(ttl, int(expires_at) - now)
+    body = {
+        'fileName': file_name,
+        'downloadUrl': download_url,
+        'downloadUrlExpiresAt': int(now) + DOWNLOAD_URL_EXPIRY_SECONDS,
+        'expiresAt': int(expires_at) if expires_at is not None else None,
+    }
+    meter = None
+    if 'shareToken' in share_record:
+        max_downloads = share_record.get('maxDownloads')
+        meter = {
+            'maxDownloads': int(max_downloads) if max_downloads is not None else None,
+            # Only picks leasing or single claims; the table's count decides
+            'downloadCount': int(share_record.get('downloadCount', 0)),
+        }
+    return 200, body, meter, ttl
+
+
+def _count_download(link_id: str, meter: Dict[str, Any], now: float) -> bool:
+    """Count one download; False if the link has reached its maxDownloads."""
+    max_downloads = meter['maxDownloads']
+    if max_downloads is None:
+        _buffer_download(link_id, 1, now)
+        return True
+
+    leased = _download_leases.pop(link_id, 0)
+    if leased:
+        if leased > 1:
+            _download_leases[link_id] = leased - 1
+        _buffer_download(link_id, 0, now)
+        return True
+
+    # The cached meter can't be trusted for the cap itself, since other
+    # containers count the same link; the conditional claim is what decides
+    if max_downloads - meter.get('downloadCount', 0) >= METER_LEASE_HEADROOM and \
+            _claim_downloads(link_id, METER_LEASE_SIZE, max_downloads - METER_LEASE_HEADROOM + 1, now):
+        _download_leases[link_id] = METER_LEASE_SIZE - 1
+        return True
+    return _claim_downloads(link_id, 1, max_downloads, now)
+
+
+def _claim_downloads(link_id: str, count: int, below: int, now: float) -> bool:
+    """Add count to downloadCount if it is still under below; False if it isn't."""
+    try:
+        shared_links_table.update_item(
+            Key={'shareToken': link_id},
+            UpdateExpression='ADD downloadCount :count SET lastAccessedAt = :now',
+            ConditionExpression='attribute_exists(shareToken) AND '
+                                '(attribute_not_exists(downloadCount) OR downloadCount < :below)',
+            ExpressionAttributeValues={':count': count, ':now': int(now), ':below': below}
+        )
+    except ClientError as err:
+        if err.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+            return False
+        raise
+    # lastAccessedAt was just written too
+    _flushed_at[link_id] = now
+    return True
+
+
+def _buffer_download(link_id: str, count: int, now: float) -> None:
+    counter = _pending_downloads.setdefault(link_id, [0, 0])
+    counter[0] += count
+    counter[1] = max(counter[1], int(now))
+
+
+def _flush_downloads(now: float, force: bool = False) -> None:
+    """
+    Write the buffered download counts, one UpdateItem per link, once a
+    buffered link is due (not written for METER_FLUSH_SECONDS) or
+    METER_FLUSH_HITS hits are buffered.
+    """
+    if not _pending_downloads:
+        return
+    due = (force
+           or sum(count for count, _ in _pending_downloads.values()) >= METER_FLUSH_HITS
+           or any(now - _flushed_at.get(link_id, 0) >= METER_FLUSH_SECONDS for link_id in _pending_downloads))
+    if not due:
+        return
+    for link_id in list(_pending_downloads):
+        count, last_accessed_at = _pending_downloads.pop(link_id)
+        # Set even on failure, so a failing link is retried once per interval
+        _flushed_at[link_id] = now
         try:
-            download_url = s3_client.generate_presigned_url(
-                'get_object',
-                Params={
-                    'Bucket': FILE_BUCKET,
-                    'Key': s3_key,
-                    'ResponseContentDisposition': f'attachment; filename="{file_name}"',
-                },
-                ExpiresIn=300,
-            )
+            _apply_downloads(link_id, count, last_accessed_at)
         except ClientError as err:
-            print(f"S3 presigned URL generation failed for {s3_key}: {err}")
-            return _response(500, {'error': 'Failed to generate download URL'})
-
-        return _response(
-            200,
-            {
-                'fileName': file_name,
-                'downloadUrl': download_url,
-                'expiresAt': int(expires_at) if expires_at is not None else None,
-            },
+            # Keep the counts for the next flush rather than fail the request
+            print(f"Failed to record downloads for link {link_id}: {err}")
+            _buffer_download(link_id, count, last_accessed_at)
+    # Links quiet for a whole interval are written straight away on their next hit
+    for link_id in [link_id for link_id, at in _flushed_at.items() if now - at >= METER_FLUSH_SECONDS]:
+        del _flushed_at[link_id]
+
+
+def _apply_downloads(link_id: str, count: int, last_accessed_at: int) -> None:
+    try:
+        shared_links_table.update_item(
+            Key={'shareToken': link_id},
+            UpdateExpression='ADD downloadCount :count SET lastAccessedAt = :at',
+            # Don't recreate a link revoked since
+            ConditionExpression='attribute_exists(shareToken)',
+            ExpressionAttributeValues={':count': count, ':at': last_accessed_at}
         )
+    except ClientError as err:
+        if err.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
 
-    except Exception as exc:
-        print(f"Unexpected error resolving shared link: {exc}")
-        return _response(500, {'error': 'Internal server error'})
+
+def _wants_redirect(event: Dict[str, Any]) -> bool:
+    query = event.get('queryStringParameters') or {}
+    if 'redirect' in query:
+        return str(query['redirect']).lower() in ('1', 'true', 'yes')
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    accept = (headers.get('accept') or '').lower()
+    return 'text/html' in accept and 'application/json' not in accept
 
 
-def _response(status_code: int, body: Dict[str, Any]) -> Dict[str, Any]:
+def _redirect(body: Dict[str, Any], now: float, cache: str, cacheable: bool = True) -> Dict[str, Any]:
+    """302 to the presigned URL, cacheable until shortly before the URL stops working."""
+    max_age = max(0, body['downloadUrlExpiresAt'] - int(now) - REDIRECT_CACHE_MARGIN_SECONDS) if cacheable else 0
     return {
-        'statusCode': status_code,
+        'statusCode': 302,
         'headers': {
-            'Content-Type': 'application/json',
+            'Location': body['downloadUrl'],
+            'Cache-Control': f'public, max-age={max_age}' if max_age else 'no-store',
             'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type',
-            'Access-Control-Allow-Methods': 'GET,OPTIONS',
+            'X-Cache': cache,
+        },
+        'body': '',
+    }
+
+
+def _cache_get(link_id: str, now: float) -> Optional[Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]]]:
+    entry = _link_cache.get(link_id)
+    if entry is not None and entry[1] > now:
+        _link_cache.move_to_end(link_id)
+        cache_stats['hits'] += 1
+        if entry[0][0] != 200:
+            cache_stats['negativeHits'] += 1
+        _maybe_log_stats()
+        return entry[0]
+    if entry is not None:
+        del _link_cache[link_id]
+    cache_stats['misses'] += 1
+    _maybe_log_stats()
+    return None
+
+
+def _cache_put(link_id: str, result: Tuple[int, Dict[str, Any], Optional[Dict[str, Any]]], expires: float) -> None:
+    _link_cache[link_id] = (result, expires)
+    _link_cache.move_to_end(link_id)
+    while len(_link_cache) > LINK_CACHE_SIZE:
+        _link_cache.popitem(last=False)
+        cache_stats['evictions'] += 1
+
+
+def _maybe_log_stats() -> None:
+    """Every STATS_LOG_INTERVAL lookups, log the counters as CloudWatch embedded metrics."""
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    if lookups % STATS_LOG_INTERVAL:
+        return
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': 'FileStorage/SharedLinks',
+                'Dimensions': [[]],
+                'Metrics': [{'Name': name, 'Unit': 'Count'} for name in ('CacheHits', 'CacheMisses')],
+            }],
         },
+        'CacheHits': cache_stats['hits'] - _logged_stats['hits'],
+        'CacheMisses': cache_stats['misses'] - _logged_stats['misses'],
+        'cacheStats': dict(cache_stats, size=len(_link_cache)),
+    }))
+    _logged_stats.update(cache_stats)
+
+
+def _resolve_signed_token(token: str) -> Optional[Dict[str, Any]]:
+    """The share record a signed token stands for, or None if it is invalid or revoked."""
+    if SHARE_TOKEN_MODE != SIGNED:
+        return None
+    try:
+        key_id, payload, signature = token.split('.')
+        if key_id not in SHARE_SIGNING_KEYS or not hmac.compare_digest(signature, _sign(key_id, payload)):
+            return None
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(claims, dict):
+        return None
+
+    # Revoked one link at a time (token ID) or all links to a deleted file (fileId)
+    revoked = _revoked_ids()
+    if claims.get('i') in revoked or claims.get('f') in revoked:
+        return None
+    return {'s3Key': claims.get('k'), 'fileName': claims.get('n', 'download'), 'expiresAt': claims.get('e')}
+
+
+def _revoked_ids() -> Dict[str, Any]:
+    now = time.time()
+    if now - _revocation_cache['loadedAt'] >= REVOCATION_CACHE_SECONDS:
+        revoked = {}
+        client = shared_links_table.meta.client
+        request = {shared_links_table.name: {
+            'Keys': [{'shareToken': f'{REVOCATIONS_KEY}#{shard}'} for shard in REVOCATION_SHARDS]
+        }}
+        delay = 0.05
+        while request:
+            response = client.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(shared_links_table.name, []):
+                revoked.update(item.get('revoked', {}))
+            request = response.get('UnprocessedKeys') or None
+            if request:
+                time.sleep(delay)
+                delay = min(delay * 2, 1)
+        _revocation_cache['revoked'] = revoked
+        _revocation_cache['loadedAt'] = now
+    return _revocation_cache['revoked']
+
+
+def _sign(key_id: str, payload: str) -> str:
+    key = SHARE_SIGNING_KEYS[key_id]
+    digest = hmac.new(key.encode('utf-8'), f"{key_id}.{payload}".encode('utf-8'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def _response(status_code: int, body: Dict[str, Any], cache: Optional[str] = None) -> Dict[str, Any]:
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type',
+        'Access-Control-Allow-Methods': 'GET,OPTIONS',
+    }
+    if cache:
+        headers['X-Cache'] = cache
+    return {
+        'statusCode': status_code,
+        'headers': headers,
         'body': json.dumps(body),
     }
 
@@ -1,7 +1,11 @@
+import base64
 import json
 import os
+import re
+import time
 import boto3
 import uuid
+from botocore.exceptions import ClientError
 from datetime import datetime
 
 s3_client = boto3.client('s3')
@@ -9,12 +13,28 @@ dynamodb = boto3.resource('dynamodb')
 
 FILE_BUCKET_NAME = os.environ.get('FILE_BUCKET_NAME', 'file-storage-dev')
 FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'users-dev')
+BLOBS_TABLE_NAME = os.environ.get('BLOBS_TABLE_NAME', 'file-blobs-dev')
 files_table = dynamodb.Table(FILES_TABLE_NAME)
+users_table = dynamodb.Table(USERS_TABLE_NAME)
+blobs_table = dynamodb.Table(BLOBS_TABLE_NAME)
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# POST /files/batch limits; BatchWriteItem takes at most 25 puts per call
+MAX_BATCH_FILES = 500
+BATCH_WRITE_SIZE = 25
+MAX_BATCH_WRITE_ATTEMPTS = 5
 
 
 def lambda_handler(event, context):
     """
     Generates a presigned URL for file upload and creates DynamoDB entry.
+    POST /files/batch does the same for many files at once.
+
+    With an optional "sha256" (hex digest of the content), content the user
+    has already stored is deduplicated: the new item references the existing
+    object and no upload URL is returned.
     """
     try:
         # 🔒 SECURE FIX: Get userId from JWT token (Cognito authorizer)
@@ -31,9 +51,11 @@ def lambda_handler(event, context):
 
         # Parse request body (now that we have the secured user_id)
         body = json.loads(event.get('body', '{}'))
+
+        if event.get('resource') == '/files/batch':
+            return handle_batch_upload(user_id, body)
+
         file_name = body.get('fileName')
-        content_type = body.get('contentType', 'application/octet-stream')
-        file_size = body.get('size')
         
         if not file_name:
             return {
@@ -42,37 +64,40 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'fileName is required'})
             }
         
-        # Generate unique file ID
-        file_id = str(uuid.uuid4())
-        s3_key = f"{user_id}/{file_id}/{file_name}"
-        
-        # Generate presigned URL for upload
-        presigned_url = s3_client.generate_presigned_url(
-            'put_object',
-            Params={
-                'Bucket': FILE_BUCKET_NAME,
-                'Key': s3_key,
-                'ContentType': content_type
-            },
-            ExpiresIn=3600  # 1 hour
-        )
-        
-        # Create DynamoDB entry
-        item = {
-            'userId': user_id,
-            'fileId': file_id,
-            'fileName': file_name,
-            's3Key': s3_key,
-            'contentType': content_type,
-            'uploadDate': datetime.utcnow().isoformat(),
-            'status': 'pending'
-        }
+        if not _valid_size(body.get('size')):
+            return _response(400, {'error': 'size must be a non-negative integer'})
 
-        # Add size if provided
-        if file_size is not None:
-            item['size'] = file_size
+        sha256 = body.get('sha256')
+        if sha256 is not None:
+            sha256 = str(sha256).lower()
+            if not SHA256_PATTERN.match(sha256):
+                return _response(400, {'error': 'sha256 must be a hex-encoded SHA-256 digest'})
 
-        files_table.put_item(Item=item)
+            # Already stored this content? Then just point a new item at it
+            deduplicated = _create_deduplicated_item(user_id, body, sha256)
+            if deduplicated:
+                return _response(200, {
+                    'uploadUrl': None,
+                    'fileId': deduplicated['fileId'],
+                    'deduplicated': True,
+                    'message': 'Identical content already stored; no upload needed'
+                })
+
+        item = _build_item(user_id, body)
+        if sha256:
+            item['sha256'] = sha256
+        file_id = item['fileId']
+        presigned_url = _presign_upload(item)
+
+        # Write the item and bump the user's listing version in one transaction
+        # so list_files can never serve a 304 for a listing that changed.
+        # The resource's client serializes plain Python values for us.
+        files_table.meta.client.transact_write_items(
+            TransactItems=[
+                {'Put': {'TableName': files_table.name, 'Item': item}},
+                _listing_version_bump(user_id)
+            ]
+        )
         
         return {
             'statusCode': 200,
@@ -93,4 +118,188 @@ def lambda_handler(event, context):
             'statusCode': 500,
             'headers': {'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)})
-        }
\ No newline at end of file
+        }
+
+
+def handle_batch_upload(user_id: str, body: dict) -> dict:
+    """
+    POST /files/batch - issue upload URLs for many files in one request.
+
+    Expected body: {"files": [{"fileName": "...", "contentType": "...", "size": 123}, ...]}
+    Returns: {"files": [{"fileName", "fileId", "uploadUrl"}, ...], "failed": [{"fileName", "error"}, ...]}
+
+    Metadata is written with BatchWriteItem. Items still unprocessed after
+    retrying are reported in "failed" so the client can resubmit just those.
+    """
+    descriptors = body.get('files')
+    if not isinstance(descriptors, list) or not 0 < len(descriptors) <= MAX_BATCH_FILES:
+        return _response(400, {'error': f'files must be a list of 1-{MAX_BATCH_FILES} file descriptors'})
+    if any(not isinstance(d, dict) or not d.get('fileName') for d in descriptors):
+        return _response(400, {'error': 'fileName is required for every file'})
+    if any(not _valid_size(d.get('size')) for d in descriptors):
+        return _response(400, {'error': 'size must be a non-negative integer for every file'})
+
+    items = [_build_item(user_id, descriptor) for descriptor in descriptors]
+    unprocessed_ids = _batch_put_items(items)
+
+    files = []
+    failed = []
+    for item in items:
+        if item['fileId'] in unprocessed_ids:
+            failed.append({'fileName': item['fileName'], 'error': 'Metadata write throttled; retry this file'})
+        else:
+            files.append({
+                'fileName': item['fileName'],
+                'fileId': item['fileId'],
+                'uploadUrl': _presign_upload(item)
+            })
+
+    if files:
+        # BatchWriteItem can't join a transaction, so bump once after the writes
+        users_table.update_item(
+            Key={'userId': user_id},
+            UpdateExpression='ADD listingVersion :one',
+            ExpressionAttributeValues={':one': 1}
+        )
+
+    return _response(200, {
+        'files': files,
+        'failed': failed,
+        'message': f'{len(files)} upload URLs generated successfully'
+    })
+
+
+def _batch_put_items(items: list) -> set:
+    """Write items in BatchWriteItem chunks, retrying unprocessed puts with backoff.
+
+    Returns the fileIds that still could not be written.
+    """
+    client = files_table.meta.client
+    unprocessed = set()
+    for start in range(0, len(items), BATCH_WRITE_SIZE):
+        requests = [{'PutRequest': {'Item': item}} for item in items[start:start + BATCH_WRITE_SIZE]]
+        for attempt in range(MAX_BATCH_WRITE_ATTEMPTS):
+            response = client.batch_write_item(RequestItems={files_table.name: requests})
+            requests = response.get('UnprocessedItems', {}).get(files_table.name, [])
+            if not requests:
+                break
+            if attempt < MAX_BATCH_WRITE_ATTEMPTS - 1:
+                time.sleep(0.05 * (2 ** attempt))
+        unprocessed.update(r['PutRequest']['Item']['fileId'] for r in requests)
+    return unprocessed
+
+
+def _valid_size(size) -> bool:
+    """size is optional, but usage accounting needs it to be a byte count when given."""
+    return size is None or (isinstance(size, int) and not isinstance(size, bool) and size >= 0)
+
+
+def _build_item(user_id: str, descriptor: dict) -> dict:
+    """Build the pending FilesTable item for a new upload."""
+    file_name = descriptor['fileName']
+    content_type = descriptor.get('contentType', 'application/octet-stream')
+    file_size = descriptor.get('size')
+
+    # Generate unique file ID
+    file_id = str(uuid.uuid4())
+    upload_date = datetime.utcnow().isoformat()
+    item = {
+        'userId': user_id,
+        'fileId': file_id,
+        'fileName': file_name,
+        's3Key': f"{user_id}/{file_id}/{file_name}",
+        'contentType': content_type,
+        'uploadDate': upload_date,
+        'status': 'pending',
+        # Sort keys for the filtered list_files indexes
+        'contentTypeDate': f"{content_type}#{upload_date}",
+        'statusDate': f"pending#{upload_date}",
+        # Sparse pending-upload index key (one of 16 shards); removed on completion
+        'pendingShard': file_id[0]
+    }
+
+    # Add size if provided
+    if file_size is not None:
+        item['size'] = file_size
+    return item
+
+
+def _create_deduplicated_item(user_id: str, body: dict, sha256: str):
+    """Add a completed item referencing the user's stored blob for sha256; None on a miss."""
+    blob = blobs_table.get_item(Key={'userId': user_id, 'sha256': sha256}).get('Item')
+    if not blob:
+        return None
+
+    item = _build_item(user_id, body)
+    completed_at = datetime.utcnow().isoformat()
+    item.pop('pendingShard')
+    item.update({
+        's3Key': blob['s3Key'],
+        'sha256': sha256,
+        'size': blob['size'],
+        'status': 'completed',
+        'statusDate': f"completed#{item['uploadDate']}",
+        'completedAt': completed_at
+    })
+
+    try:
+        files_table.meta.client.transact_write_items(
+            TransactItems=[
+                {'Put': {'TableName': files_table.name, 'Item': item}},
+                {
+                    # Take a reference, unless the last one was just dropped
+                    'Update': {
+                        'TableName': blobs_table.name,
+                        'Key': {'userId': user_id, 'sha256': sha256},
+                        'UpdateExpression': 'ADD refCount :one',
+                        'ConditionExpression': 's3Key = :s3Key AND refCount > :zero',
+                        'ExpressionAttributeValues': {':one': 1, ':zero': 0, ':s3Key': blob['s3Key']}
+                    }
+                },
+                _listing_version_bump(user_id)
+            ]
+        )
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') == 'TransactionCanceledException':
+            # The blob is being deleted; fall back to a normal upload
+            return None
+        raise
+    return item
+
+
+def _presign_upload(item: dict) -> str:
+    params = {
+        'Bucket': FILE_BUCKET_NAME,
+        'Key': item['s3Key'],
+        'ContentType': item['contentType']
+    }
+    if 'sha256' in item:
+        # S3 rejects the PUT unless the body matches the digest the client claimed
+        params['ChecksumSHA256'] = base64.b64encode(bytes.fromhex(item['sha256'])).decode('ascii')
+    return s3_client.generate_presigned_url(
+        'put_object',
+        Params=params,
+        ExpiresIn=3600  # 1 hour
+    )
+
+
+def _response(status_code: int, body: dict) -> dict:
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/json'
+        },
+        'body': json.dumps(body)
+    }
+
+
+def _listing_version_bump(user_id: str) -> dict:
+    return {
+        'Update': {
+            'TableName': users_table.name,
+            'Key': {'userId': user_id},
+            'UpdateExpression': 'ADD listingVersion :one',
+            'ExpressionAttributeValues': {':one': 1}
+        }
+    }
@@ -0,0 +1,215 @@
+import base64
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+
+dynamodb = boto3.resource('dynamodb')
+s3_client = boto3.client('s3')
+
+FILES_TABLE_NAME = os.environ.get('FILES_TABLE_NAME', 'files-dev')
+USERS_TABLE_NAME = os.environ.get('USERS_TABLE_NAME', 'users-dev')
+BLOBS_TABLE_NAME = os.environ.get('BLOBS_TABLE_NAME', 'file-blobs-dev')
+files_table = dynamodb.Table(FILES_TABLE_NAME)
+users_table = dynamodb.Table(USERS_TABLE_NAME)
+blobs_table = dynamodb.Table(BLOBS_TABLE_NAME)
+
+COMPLETED_STATUS = 'completed'
+
+# BatchGetItem reads at most 100 keys per call
+BATCH_GET_SIZE = 100
+
+
+def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Finalize uploads when their object lands in FileStorageBucket.
+
+    Accepts S3 event notifications ({"Records": [...]}) and EventBridge
+    "Object Created" events. Each object's FilesTable item is set to
+    status "completed" with the object's real size, ETag, version and
+    completedAt, and the owner's listing version is bumped.
+
+    Object keys are "<userId>/<fileId>/<fileName>"; only the first two
+    segments are used, so key encoding never matters.
+
+    Items uploaded with a claimed sha256 register the object as the user's
+    blob for that digest (refCount 1) once S3's stored checksum confirms it,
+    so later uploads of the same content are deduplicated.
+    """
+    objects = [obj for obj in _created_objects(event) if obj]
+    items = _get_items({(obj['userId'], obj['fileId']) for obj in objects})
+
+    finalized = 0
+    skipped = 0
+    for obj in objects:
+        item = items.get((obj['userId'], obj['fileId']))
+        if item is None:
+            # Not one of ours, or deleted before the upload finished
+            skipped += 1
+        elif _finalize(obj, item.get('uploadDate', '')):
+            finalized += 1
+            if item.get('sha256'):
+                _register_blob(obj, item)
+        else:
+            skipped += 1
+
+    print(f"Finalized {finalized} uploads ({skipped} skipped)")
+    return {'finalized': finalized, 'skipped': skipped}
+
+
+def _created_objects(event: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+    """Normalize either event shape into {userId, fileId, size, etag, versionId, createdAt} dicts."""
+    if 'Records' in event:
+        return [
+            _parse_object(
+                record['s3'].get('bucket', {}).get('name'),
+                record['s3']['object'].get('key', ''),
+                record['s3']['object'].get('size', 0),
+                record['s3']['object'].get('eTag'),
+                record['s3']['object'].get('versionId'),
+                record.get('eventTime'),
+            )
+            for record in event['Records']
+            if record.get('eventName', '').startswith('ObjectCreated:')
+        ]
+
+    if event.get('detail-type') == 'Object Created':
+        obj = event.get('detail', {}).get('object', {})
+        bucket = event.get('detail', {}).get('bucket', {}).get('name')
+        return [_parse_object(bucket, obj.get('key', ''), obj.get('size', 0), obj.get('etag'),
+                              obj.get('version-id'), event.get('time'))]
+
+    return []
+
+
+def _parse_object(bucket: Optional[str], key: str, size: Any, etag: Optional[str],
+                  version_id: Optional[str], event_time: Optional[str]) -> Optional[Dict[str, Any]]:
+    parts = key.split('/', 2)
+    if len(parts) < 3 or not parts[0] or not parts[1]:
+        return None
+    return {
+        'bucket': bucket,
+        'userId': parts[0],
+        'fileId': parts[1],
+        'size': int(size or 0),
+        'etag': (etag or '').strip('"'),
+        'versionId': version_id,
+        'completedAt': _iso_timestamp(event_time),
+    }
+
+
+def _get_items(keys: set) -> Dict[tuple, Dict[str, Any]]:
+    """Read what finalizing needs (uploadDate for statusDate, dedup fields) in one BatchGetItem per 100 keys."""
+    keys = list(keys)
+    items = {}
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        request = {
+            files_table.name: {
+                'Keys': [{'userId': user_id, 'fileId': file_id} for user_id, file_id in keys[start:start + BATCH_GET_SIZE]],
+                'ProjectionExpression': 'userId, fileId, uploadDate, s3Key, sha256',
+            }
+        }
+        while request:
+            response = files_table.meta.client.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(files_table.name, []):
+                items[(item['userId'], item['fileId'])] = item
+            request = response.get('UnprocessedKeys') or None
+    return items
+
+
+def _finalize(obj: Dict[str, Any], upload_date: str) -> bool:
+    """Mark the item completed; False if it is gone or this object version was already applied."""
+    update_expression = ('SET #status = :completed, statusDate = :statusDate, #size = :size, '
+                         'etag = :etag, completedAt = :completedAt')
+    removals = ' REMOVE pendingShard'  # drops the item out of the sparse pending index
+    values = {
+        ':completed': COMPLETED_STATUS,
+        ':statusDate': f"{COMPLETED_STATUS}#{upload_date}",
+        ':size': obj['size'],
+        ':etag': obj['etag'],
+        ':completedAt': obj['completedAt'],
+    }
+    if obj['versionId']:
+        update_expression += ', versionId = :versionId'
+        values[':versionId'] = obj['versionId']
+    update_expression += removals
+
+    try:
+        # The resource's client serializes plain Python values
+        files_table.meta.client.transact_write_items(
+            TransactItems=[
+                {
+                    'Update': {
+                        'TableName': files_table.name,
+                        'Key': {'userId': obj['userId'], 'fileId': obj['fileId']},
+                        'UpdateExpression': update_expression,
+                        # Redelivered events carry the same ETag and are skipped
+                        'ConditionExpression': 'attribute_exists(fileId) AND '
+                                               '(attribute_not_exists(etag) OR etag <> :etag)',
+                        'ExpressionAttributeNames': {'#status': 'status', '#size': 'size'},
+                        'ExpressionAttributeValues': values,
+                    }
+                },
+                {
+                    'Update': {
+                        'TableName': users_table.name,
+                        'Key': {'userId': obj['userId']},
+                        'UpdateExpression': 'ADD listingVersion :one',
+                        'ExpressionAttributeValues': {':one': 1},
+                    }
+                },
+            ]
+        )
+        return True
+    except ClientError as exc:
+        if exc.response.get('Error', {}).get('Code') == 'TransactionCanceledException':
+            reasons = exc.response.get('CancellationReasons') or [{}]
+            if reasons[0].get('Code') == 'ConditionalCheckFailed':
+                return False
+        raise
+
+
+def _register_blob(obj: Dict[str, Any], item: Dict[str, Any]) -> None:
+    """Record the object as the user's blob for its sha256 if S3 confirms the digest and none exists yet."""
+    try:
+        head = s3_client.head_object(Bucket=obj['bucket'], Key=item['s3Key'], ChecksumMode='ENABLED')
+    except ClientError as exc:
+        print(f"Could not verify checksum for {item['s3Key']}: {exc}")
+        return
+
+    expected = base64.b64encode(bytes.fromhex(item['sha256'])).decode('ascii')
+    if head.get('ChecksumSHA256') != expected:
+        # Not uploaded with a verified full-object checksum; don't trust the claimed digest
+        return
+
+    try:
+        blobs_table.put_item(
+            Item={
+                'userId': obj['userId'],
+                'sha256': item['sha256'],
+                's3Key': item['s3Key'],
+                'size': obj['size'],
+                'refCount': 1,
+                'createdAt': obj['completedAt'],
+            },
+            ConditionExpression='attribute_not_exists(sha256)'
+        )
+    except ClientError as exc:
+        # Another upload of the same content won the race; this file keeps its own object
+        if exc.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+            raise
+
+
+def _iso_timestamp(event_time: Optional[str]) -> str:
+    """S3 event times look like 2024-01-01T00:00:00.000Z; store them the way uploadDate is stored."""
+    if event_time:
+        try:
+            return datetime.strptime(event_time.rstrip('Z'), '%Y-%m-%dT%H:%M:%S.%f').isoformat()
+        except ValueError:
+            try:
+                return datetime.strptime(event_time.rstrip('Z'), '%Y-%m-%dT%H:%M:%S').isoformat()
+            except ValueError:
+                pass
+    return datetime.utcnow().isoformat()
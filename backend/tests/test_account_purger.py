@@ -0,0 +1,301 @@
+import io
+import pytest
+import json
+import os
+import sys
+import threading
+import time
+import boto3
+from moto import mock_aws
+
+TEST_USER_ID = "test-user-123"
+OTHER_USER_ID = "other-user-456"
+TEST_TABLE = "files-test"
+TEST_USERS_TABLE = "users-test"
+TEST_SHARED_LINKS_TABLE = "shared-links-test"
+TEST_BLOBS_TABLE = "file-blobs-test"
+TEST_ARCHIVES_TABLE = "file-archives-test"
+TEST_CHANGES_TABLE = "file-changes-test"
+TEST_USAGE_TABLE = "usage-test"
+TEST_PURGES_TABLE = "account-purges-test"
+TEST_BUCKET = "test-bucket"
+
+os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['USERS_TABLE_NAME'] = TEST_USERS_TABLE
+os.environ['SHARED_LINKS_TABLE_NAME'] = TEST_SHARED_LINKS_TABLE
+os.environ['BLOBS_TABLE_NAME'] = TEST_BLOBS_TABLE
+os.environ['ARCHIVES_TABLE_NAME'] = TEST_ARCHIVES_TABLE
+os.environ['FILE_CHANGES_TABLE_NAME'] = TEST_CHANGES_TABLE
+os.environ['USAGE_TABLE_NAME'] = TEST_USAGE_TABLE
+os.environ['PURGES_TABLE_NAME'] = TEST_PURGES_TABLE
+os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
+
+
+class FakeContext:
+    """Reports plenty of remaining time for the first `budget` checks, then almost none."""
+    function_name = 'account-purger-test'
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.lock = threading.Lock()
+
+    def get_remaining_time_in_millis(self):
+        with self.lock:
+            if self.budget is None:
+                return 900000
+            self.budget -= 1
+            return 900000 if self.budget >= 0 else 1000
+
+
+class FakeLambdaClient:
+    """Records asynchronous self-invocations instead of running them; runs share_file's revocations in-process."""
+
+    def __init__(self, share_file):
+        self.share_file = share_file
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        if InvocationType == 'RequestResponse':
+            result = self.share_file.lambda_handler(json.loads(Payload), None)
+            return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result).encode('utf-8'))}
+        self.invocations.append(json.loads(Payload))
+        return {'StatusCode': 202}
+
+
+def create_table(dynamodb, name, hash_key, range_key=None, indexes=None, extra_attributes=()):
+    key_schema = [{'AttributeName': hash_key, 'KeyType': 'HASH'}]
+    attributes = [{'AttributeName': hash_key, 'AttributeType': 'S'}]
+    if range_key:
+        key_schema.append({'AttributeName': range_key, 'KeyType': 'RANGE'})
+        attributes.append({'AttributeName': range_key, 'AttributeType': 'S'})
+    attributes += [{'AttributeName': name, 'AttributeType': 'S'} for name in extra_attributes]
+    kwargs = {}
+    if indexes:
+        kwargs['GlobalSecondaryIndexes'] = indexes
+    return dynamodb.create_table(TableName=name, KeySchema=key_schema, AttributeDefinitions=attributes,
+                                 BillingMode='PAY_PER_REQUEST', **kwargs)
+
+
+@pytest.fixture
+def setup_aws_resources(monkeypatch):
+    """Create every per-user table, the purges table and a versioned bucket."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        tables = {
+            'files': create_table(dynamodb, TEST_TABLE, 'userId', 'fileId'),
+            'users': create_table(dynamodb, TEST_USERS_TABLE, 'userId'),
+            'shares': create_table(
+                dynamodb, TEST_SHARED_LINKS_TABLE, 'shareToken',
+                extra_attributes=('userId', 'fileId'),
+                indexes=[{
+                    'IndexName': 'userId-fileId-index',
+                    'KeySchema': [
+                        {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                        {'AttributeName': 'fileId', 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['createdAt', 'expiresAt']}
+                }]
+            ),
+            'blobs': create_table(dynamodb, TEST_BLOBS_TABLE, 'userId', 'sha256'),
+            'archives': create_table(dynamodb, TEST_ARCHIVES_TABLE, 'userId', 'archiveId'),
+            'changes': create_table(dynamodb, TEST_CHANGES_TABLE, 'userId', 'changeId'),
+            'usage': create_table(dynamodb, TEST_USAGE_TABLE, 'userId', 'contentType'),
+            'purges': create_table(dynamodb, TEST_PURGES_TABLE, 'userId'),
+        }
+
+        s3 = boto3.client('s3', region_name='us-west-2')
+        s3.create_bucket(
+            Bucket=TEST_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'us-west-2'}
+        )
+        s3.put_bucket_versioning(Bucket=TEST_BUCKET, VersioningConfiguration={'Status': 'Enabled'})
+
+        import importlib
+        handler_module_name = 'lambda_functions.account_purger.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.files_table = tables['files']
+        handler.users_table = tables['users']
+        handler.shared_links_table = tables['shares']
+        handler.blobs_table = tables['blobs']
+        handler.archives_table = tables['archives']
+        handler.file_changes_table = tables['changes']
+        handler.usage_table = tables['usage']
+        handler.purges_table = tables['purges']
+        handler.s3_client = s3
+        import lambda_functions.share_file.handler as share_file
+        monkeypatch.setattr(share_file, 'shared_links_table', tables['shares'])
+        handler.lambda_client = FakeLambdaClient(share_file)
+        # No FilesTable stream here to wait for
+        handler.STREAM_SETTLE_SECONDS = 0
+
+        yield tables, s3, handler
+
+
+def seed_account(tables, s3, user_id, file_ids):
+    for file_id in file_ids:
+        s3_key = f'{user_id}/{file_id}/notes.txt'
+        for body in (b'v1', b'v2'):
+            s3.put_object(Bucket=TEST_BUCKET, Key=s3_key, Body=body)
+        tables['files'].put_item(Item={'userId': user_id, 'fileId': file_id, 's3Key': s3_key})
+        tables['shares'].put_item(Item={'shareToken': f'{user_id}-{file_id}', 'userId': user_id, 'fileId': file_id})
+        tables['blobs'].put_item(Item={'userId': user_id, 'sha256': f'{file_id}00', 's3Key': s3_key})
+        tables['changes'].put_item(Item={'userId': user_id, 'changeId': f'{len(file_id):040d}{file_id}',
+                                         'fileId': file_id, 'file': {'fileName': 'notes.txt'}})
+    for content_type in ('*', 'text/plain'):
+        tables['usage'].put_item(Item={'userId': user_id, 'contentType': content_type, 'fileCount': len(file_ids)})
+    tables['archives'].put_item(Item={'userId': user_id, 'archiveId': 'abc123', 'status': 'ready'})
+    s3.put_object(Bucket=TEST_BUCKET, Key=f'archives/{user_id}/abc123.zip', Body=b'zip')
+
+
+def account_event(method, resource, body=None):
+    return {
+        'resource': resource,
+        'httpMethod': method,
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}},
+        'body': json.dumps(body) if body is not None else None
+    }
+
+
+def run_jobs(handler, context=None):
+    """Run the queued purge invocations."""
+    invocations = handler.lambda_client.invocations
+    while invocations:
+        handler.lambda_handler(invocations.pop(0), context or FakeContext())
+
+
+def user_versions(s3, user_id):
+    response = s3.list_object_versions(Bucket=TEST_BUCKET)
+    return [
+        version for version in response.get('Versions', []) + response.get('DeleteMarkers', [])
+        if version['Key'].startswith(f'{user_id}/') or version['Key'].startswith(f'archives/{user_id}/')
+    ]
+
+
+# fileIds spread over several hex ranges, plus one the sweep has to catch
+FILE_IDS = ['0a1', '3b2', '7c3', 'a4d', 'f5e', 'legacy-file']
+
+
+def test_purge_removes_all_account_data(setup_aws_resources):
+    """Every item, link, blob, archive and S3 version of the account goes; other users keep theirs."""
+    tables, s3, handler = setup_aws_resources
+    seed_account(tables, s3, TEST_USER_ID, FILE_IDS)
+    seed_account(tables, s3, OTHER_USER_ID, ['0a1'])
+    s3.delete_object(Bucket=TEST_BUCKET, Key=f'{TEST_USER_ID}/0a1/notes.txt')  # a delete marker
+    s3.create_multipart_upload(Bucket=TEST_BUCKET, Key=f'{TEST_USER_ID}/b6f/big.bin')
+
+    response = handler.lambda_handler(account_event('DELETE', '/account', {'confirm': True}), FakeContext())
+    assert response['statusCode'] == 202
+    assert json.loads(response['body'])['status'] == 'running'
+
+    run_jobs(handler)
+
+    for name in ('files', 'blobs', 'archives', 'changes', 'usage'):
+        items = tables[name].scan()['Items']
+        assert {item['userId'] for item in items} == {OTHER_USER_ID}
+    assert {link['userId'] for link in tables['shares'].scan()['Items']} == {OTHER_USER_ID}
+    assert user_versions(s3, TEST_USER_ID) == []
+    assert len(user_versions(s3, OTHER_USER_ID)) == 3
+    assert 'Uploads' not in s3.list_multipart_uploads(Bucket=TEST_BUCKET)
+
+    body = json.loads(handler.lambda_handler(account_event('GET', '/account/purge'), None)['body'])
+    assert body['status'] == 'complete'
+    assert body['deleted'] == {
+        'sharesDeleted': 6, 'filesDeleted': 6, 'blobsDeleted': 6,
+        'archivesDeleted': 1, 'versionsDeleted': 14, 'changesDeleted': 6, 'usageDeleted': 2,
+    }
+    assert body['invocations'] == 1
+    # Kept so ETags issued before the purge can't match a later listing
+    assert tables['users'].get_item(Key={'userId': TEST_USER_ID})['Item']['listingVersion'] == 1
+
+
+def test_purge_revokes_signed_share_links(setup_aws_resources):
+    """Files the user holds signed links to go on the revocation list before their markers are deleted."""
+    tables, s3, handler = setup_aws_resources
+    seed_account(tables, s3, TEST_USER_ID, ['0a1', '3b2'])
+    until = int(time.time()) + 3600
+    for file_id, expires_at in (('0a1', until), ('3b2', 1)):
+        tables['shares'].put_item(Item={'shareToken': f'#signed#{TEST_USER_ID}#{file_id}', 'userId': TEST_USER_ID,
+                                        'fileId': file_id, 'expiresAt': expires_at})
+
+    handler.lambda_handler(account_event('DELETE', '/account', {'confirm': True}), FakeContext())
+    run_jobs(handler)
+
+    items = tables['shares'].scan()['Items']
+    revocations = [item for item in items if item['shareToken'].startswith('#revoked#')]
+    # The expired marker's links are dead already, so only 0a1 needs an entry
+    assert [item['revoked'] for item in revocations] == [{'0a1': until}]
+    assert [item for item in items if 'userId' in item] == []
+
+
+def test_purge_resumes_from_checkpoint(setup_aws_resources):
+    """An invocation that runs low on time checkpoints and a fresh one finishes without redoing work."""
+    tables, s3, handler = setup_aws_resources
+    seed_account(tables, s3, TEST_USER_ID, FILE_IDS)
+
+    handler.lambda_handler(account_event('DELETE', '/account', {'confirm': True}), FakeContext())
+    job = handler.lambda_client.invocations.pop(0)
+
+    result = handler.lambda_handler(job, FakeContext(budget=20))
+    assert result['status'] == 'running'
+    checkpoint = tables['purges'].get_item(Key={'userId': TEST_USER_ID})['Item']
+    assert checkpoint['status'] == 'running'
+    assert handler.lambda_client.invocations == [job]
+
+    run_jobs(handler)
+
+    body = json.loads(handler.lambda_handler(account_event('GET', '/account/purge'), None)['body'])
+    assert body['status'] == 'complete'
+    assert body['invocations'] == 2
+    assert body['deleted']['filesDeleted'] == len(FILE_IDS)
+    assert body['deleted']['versionsDeleted'] == 2 * len(FILE_IDS) + 1
+    assert tables['files'].scan()['Count'] == 0
+
+    # A late duplicate delivery of the same job does nothing
+    assert handler.lambda_handler(job, FakeContext()) == {'status': 'complete'}
+
+
+def test_running_purge_is_not_restarted(setup_aws_resources):
+    """A second DELETE /account while a purge is running reports it instead of starting another."""
+    tables, s3, handler = setup_aws_resources
+
+    handler.lambda_handler(account_event('DELETE', '/account', {'confirm': True}), FakeContext())
+    response = handler.lambda_handler(account_event('DELETE', '/account', {'confirm': True}), FakeContext())
+
+    assert response['statusCode'] == 202
+    assert len(handler.lambda_client.invocations) == 1
+
+
+def test_delete_account_requires_confirmation(setup_aws_resources):
+    """Without "confirm": true nothing starts; status is 404 until a purge exists."""
+    _, _, handler = setup_aws_resources
+
+    assert handler.lambda_handler(account_event('DELETE', '/account', {}), FakeContext())['statusCode'] == 400
+    assert handler.lambda_handler(account_event('GET', '/account/purge'), None)['statusCode'] == 404
+    assert handler.lambda_client.invocations == []
+
+
+class MainThreadOnly:
+    """Table wrapper failing any use off the main thread (boto3 resources aren't thread-safe)."""
+
+    def __init__(self, table):
+        self._table = table
+
+    def __getattr__(self, name):
+        assert threading.current_thread() is threading.main_thread(), f'{name} used from a worker thread'
+        return getattr(self._table, name)
+
+
+def test_workers_do_not_share_table_resources(setup_aws_resources):
+    """Parallel range workers only use the low-level client, never the shared Table resources."""
+    tables, s3, handler = setup_aws_resources
+    seed_account(tables, s3, TEST_USER_ID, FILE_IDS)
+    for name in ('files_table', 'shared_links_table', 'blobs_table', 'archives_table', 'users_table', 'purges_table'):
+        setattr(handler, name, MainThreadOnly(getattr(handler, name)))
+
+    handler.lambda_handler(account_event('DELETE', '/account', {'confirm': True}), FakeContext())
+    run_jobs(handler)
+
+    assert tables['files'].scan()['Count'] == 0
+    assert tables['purges'].get_item(Key={'userId': TEST_USER_ID})['Item']['status'] == 'complete'
@@ -0,0 +1,269 @@
+import pytest
+import io
+import json
+import os
+import time
+import sys
+import zipfile
+import boto3
+from moto import mock_aws
+
+TEST_USER_ID = "test-user-123"
+TEST_TABLE = "files-test"
+TEST_ARCHIVES_TABLE = "file-archives-test"
+TEST_BUCKET = "test-bucket"
+
+os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['ARCHIVES_TABLE_NAME'] = TEST_ARCHIVES_TABLE
+os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
+
+
+class FakeContext:
+    function_name = 'create-archive-test'
+
+
+class FakeLambdaClient:
+    """Records asynchronous self-invocations instead of running them."""
+
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.invocations.append(json.loads(Payload))
+        return {'StatusCode': 202}
+
+
+@pytest.fixture
+def setup_aws_resources():
+    """Create mock files and archives tables and the file bucket."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        table = dynamodb.create_table(
+            TableName=TEST_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'fileId', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'fileId', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        archives_table = dynamodb.create_table(
+            TableName=TEST_ARCHIVES_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'archiveId', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'archiveId', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        s3 = boto3.client('s3', region_name='us-west-2')
+        s3.create_bucket(
+            Bucket=TEST_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'us-west-2'}
+        )
+
+        import importlib
+        handler_module_name = 'lambda_functions.create_archive.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.files_table = table
+        handler.archives_table = archives_table
+        handler.s3_client = s3
+        handler.lambda_client = FakeLambdaClient()
+
+        yield table, s3, handler
+
+
+def put_file(table, s3, file_id, body, file_name=None, content_type='text/plain', user_id=TEST_USER_ID):
+    file_name = file_name or f'{file_id}.txt'
+    s3_key = f'{user_id}/{file_id}/{file_name}'
+    etag = s3.put_object(Bucket=TEST_BUCKET, Key=s3_key, Body=body)['ETag'].strip('"')
+    table.put_item(Item={
+        'userId': user_id,
+        'fileId': file_id,
+        'fileName': file_name,
+        's3Key': s3_key,
+        'contentType': content_type,
+        'uploadDate': '2024-05-01T12:00:00',
+        'status': 'completed',
+        'size': len(body),
+        'etag': etag
+    })
+
+
+def archive_event(file_ids):
+    return {
+        'resource': '/files/archive',
+        'httpMethod': 'POST',
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}},
+        'body': json.dumps({'fileIds': file_ids})
+    }
+
+
+def status_event(archive_id):
+    return {
+        'resource': '/files/archive/{archiveId}',
+        'httpMethod': 'GET',
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}},
+        'pathParameters': {'archiveId': archive_id}
+    }
+
+
+def run_jobs(handler):
+    """Run the queued asynchronous builds."""
+    invocations = handler.lambda_client.invocations
+    while invocations:
+        handler.lambda_handler(invocations.pop(0), None)
+
+
+def read_archive(s3, archive_id):
+    obj = s3.get_object(Bucket=TEST_BUCKET, Key=f'archives/{TEST_USER_ID}/{archive_id}.zip')
+    return zipfile.ZipFile(io.BytesIO(obj['Body'].read()))
+
+
+def test_archive_is_built_then_served_from_cache(setup_aws_resources):
+    """The first request starts a build; once ready, the same selection is served from cache."""
+    table, s3, handler = setup_aws_resources
+    put_file(table, s3, 'a', b'alpha ' * 1000)
+    put_file(table, s3, 'b', b'\x89PNG' + os.urandom(100), file_name='photo.png', content_type='image/png')
+
+    response = handler.lambda_handler(archive_event(['a', 'b']), FakeContext())
+    assert response['statusCode'] == 202
+    archive_id = json.loads(response['body'])['archiveId']
+    assert json.loads(handler.lambda_handler(status_event(archive_id), None)['body'])['status'] == 'building'
+
+    run_jobs(handler)
+
+    response = handler.lambda_handler(status_event(archive_id), None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200
+    assert body['status'] == 'ready'
+    assert body['fileCount'] == 2
+    assert 'archives' in body['downloadUrl']
+
+    archive = read_archive(s3, archive_id)
+    assert archive.testzip() is None
+    assert archive.read('a.txt') == b'alpha ' * 1000
+    assert archive.getinfo('a.txt').compress_type == zipfile.ZIP_DEFLATED
+    assert archive.getinfo('photo.png').compress_type == zipfile.ZIP_STORED
+
+    # Same selection, in any order: cached, no new build
+    response = handler.lambda_handler(archive_event(['b', 'a', 'a']), FakeContext())
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['archiveId'] == archive_id
+    assert handler.lambda_client.invocations == []
+
+
+def test_archive_spans_multiple_parts(setup_aws_resources):
+    """Archives larger than one part are uploaded as several multipart parts."""
+    table, s3, handler = setup_aws_resources
+    first, second = os.urandom(6 * 1024 * 1024), os.urandom(6 * 1024 * 1024)
+    put_file(table, s3, 'big-1', first, file_name='one.bin', content_type='application/octet-stream')
+    put_file(table, s3, 'big-2', second, file_name='two.bin', content_type='application/octet-stream')
+
+    response = handler.lambda_handler(archive_event(['big-1', 'big-2']), FakeContext())
+    archive_id = json.loads(response['body'])['archiveId']
+    run_jobs(handler)
+
+    body = json.loads(handler.lambda_handler(status_event(archive_id), None)['body'])
+    assert body['status'] == 'ready'
+    assert body['size'] > 12 * 1024 * 1024
+    archive = read_archive(s3, archive_id)
+    assert archive.read('one.bin') == first
+    assert archive.read('two.bin') == second
+
+
+def test_changed_file_gets_a_new_archive(setup_aws_resources):
+    """Re-uploading a selected file changes its ETag, so the cached archive isn't reused."""
+    table, s3, handler = setup_aws_resources
+    put_file(table, s3, 'a', b'version one')
+    first_id = json.loads(handler.lambda_handler(archive_event(['a']), FakeContext())['body'])['archiveId']
+    run_jobs(handler)
+
+    put_file(table, s3, 'a', b'version two')
+    response = handler.lambda_handler(archive_event(['a']), FakeContext())
+
+    assert response['statusCode'] == 202
+    assert json.loads(response['body'])['archiveId'] != first_id
+
+
+def test_duplicate_names_and_unavailable_files(setup_aws_resources):
+    """Same-named files get distinct entries; other users' and pending files are skipped."""
+    table, s3, handler = setup_aws_resources
+    put_file(table, s3, 'a', b'one', file_name='notes.txt')
+    put_file(table, s3, 'b', b'two', file_name='notes.txt')
+    put_file(table, s3, 'theirs', b'secret', user_id='other-user')
+    table.put_item(Item={'userId': TEST_USER_ID, 'fileId': 'pending', 'fileName': 'p.txt',
+                         's3Key': f'{TEST_USER_ID}/pending/p.txt', 'status': 'pending'})
+
+    response = handler.lambda_handler(archive_event(['a', 'b', 'theirs', 'pending']), FakeContext())
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 202
+    assert body['skipped'] == ['pending', 'theirs']
+    run_jobs(handler)
+
+    archive = read_archive(s3, body['archiveId'])
+    assert sorted(archive.namelist()) == ['notes (1).txt', 'notes.txt']
+
+    response = handler.lambda_handler(archive_event(['theirs']), FakeContext())
+    assert response['statusCode'] == 404
+
+
+def test_failed_build_is_reported_and_retried(setup_aws_resources):
+    """A build that can't read an object is marked failed, and a new request rebuilds it."""
+    table, s3, handler = setup_aws_resources
+    put_file(table, s3, 'a', b'content')
+    s3.delete_object(Bucket=TEST_BUCKET, Key=f'{TEST_USER_ID}/a/a.txt')
+
+    archive_id = json.loads(handler.lambda_handler(archive_event(['a']), FakeContext())['body'])['archiveId']
+    run_jobs(handler)
+
+    body = json.loads(handler.lambda_handler(status_event(archive_id), None)['body'])
+    assert body['status'] == 'failed'
+
+    response = handler.lambda_handler(archive_event(['a']), FakeContext())
+    assert response['statusCode'] == 202
+    assert len(handler.lambda_client.invocations) == 1
+
+
+def test_dead_build_is_reported_as_failed(setup_aws_resources, monkeypatch):
+    """A build whose Lambda died stops reporting "building" once it is stale, and a new request rebuilds it."""
+    table, s3, handler = setup_aws_resources
+    put_file(table, s3, 'a', b'content')
+    archive_id = json.loads(handler.lambda_handler(archive_event(['a']), FakeContext())['body'])['archiveId']
+    # The queued build never runs
+    handler.lambda_client.invocations.clear()
+
+    clock = [time.time() + handler.STALE_BUILD_SECONDS]
+    monkeypatch.setattr(handler.time, 'time', lambda: clock[0])
+    # Not stale yet: still building, and a repeat request doesn't start another build
+    assert json.loads(handler.lambda_handler(status_event(archive_id), None)['body'])['status'] == 'building'
+    assert handler.lambda_handler(archive_event(['a']), FakeContext())['statusCode'] == 202
+    assert handler.lambda_client.invocations == []
+
+    clock[0] += 1
+
+    body = json.loads(handler.lambda_handler(status_event(archive_id), None)['body'])
+    assert body['status'] == 'failed'
+    assert 'request it again' in body['error']
+
+    assert handler.lambda_handler(archive_event(['a']), FakeContext())['statusCode'] == 202
+    assert len(handler.lambda_client.invocations) == 1
+    assert json.loads(handler.lambda_handler(status_event(archive_id), None)['body'])['status'] == 'building'
+
+
+def test_archive_rejects_bad_input(setup_aws_resources):
+    """fileIds must be a non-empty list within the limit."""
+    _, _, handler = setup_aws_resources
+
+    assert handler.lambda_handler(archive_event([]), FakeContext())['statusCode'] == 400
+    assert handler.lambda_handler(archive_event(['x'] * 1001), FakeContext())['statusCode'] == 400
+    assert handler.lambda_handler(status_event('missing'), None)['statusCode'] == 404
@@ -1,17 +1,30 @@
+import ast
+import hashlib
+import io
 import pytest
 import json
 import boto3
+from botocore.exceptions import ClientError
 from moto import mock_aws
 import os
 import sys
+import time
 
 TEST_USER_ID = "test-user-123"
 TEST_FILE_ID = "file-456"
 TEST_BUCKET = "test-bucket"
 TEST_TABLE = "files-test"
+TEST_USERS_TABLE = "users-test"
+TEST_BLOBS_TABLE = "file-blobs-test"
+TEST_TOMBSTONES_TABLE = "file-tombstones-test"
+TEST_SHARED_LINKS_TABLE = "shared-links-test"
 
 # Set environment variables
 os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['USERS_TABLE_NAME'] = TEST_USERS_TABLE
+os.environ['BLOBS_TABLE_NAME'] = TEST_BLOBS_TABLE
+os.environ['TOMBSTONES_TABLE_NAME'] = TEST_TOMBSTONES_TABLE
+os.environ['SHARED_LINKS_TABLE_NAME'] = TEST_SHARED_LINKS_TABLE
 os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
 os.environ['ENVIRONMENT'] = 'test'
 
@@ -23,12 +36,26 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda_functio
 def aws_environment(monkeypatch):
     """Set up environment variables."""
     monkeypatch.setenv('FILES_TABLE_NAME', TEST_TABLE)
+    monkeypatch.setenv('USERS_TABLE_NAME', TEST_USERS_TABLE)
     monkeypatch.setenv('FILE_BUCKET_NAME', TEST_BUCKET)
     monkeypatch.setenv('ENVIRONMENT', 'test')
 
 
+class ShareFileLambdaClient:
+    """Runs delete_file's synchronous share_file invocations in-process."""
+
+    def __init__(self, share_file):
+        self.share_file = share_file
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.invocations.append(json.loads(Payload))
+        result = self.share_file.lambda_handler(json.loads(Payload), None)
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(result).encode('utf-8'))}
+
+
 @pytest.fixture
-def setup_aws_resources(aws_environment):
+def setup_aws_resources(aws_environment, monkeypatch):
     """Create mock DynamoDB table and S3 bucket."""
     with mock_aws():
         # Create DynamoDB table
@@ -46,6 +73,49 @@ def setup_aws_resources(aws_environment):
             BillingMode='PAY_PER_REQUEST'
         )
         
+        users_table = dynamodb.create_table(
+            TableName=TEST_USERS_TABLE,
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        blobs_table = dynamodb.create_table(
+            TableName=TEST_BLOBS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'sha256', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'sha256', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        tombstones_table = dynamodb.create_table(
+            TableName=TEST_TOMBSTONES_TABLE,
+            KeySchema=[{'AttributeName': 's3Prefix', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 's3Prefix', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        shared_links_table = dynamodb.create_table(
+            TableName=TEST_SHARED_LINKS_TABLE,
+            KeySchema=[{'AttributeName': 'shareToken', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[
+                {'AttributeName': 'shareToken', 'AttributeType': 'S'},
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'fileId', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'userId-fileId-index',
+                'KeySchema': [
+                    {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                    {'AttributeName': 'fileId', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['createdAt', 'expiresAt']}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
         # Create S3 bucket
         s3 = boto3.client('s3', region_name='us-west-2')
         s3.create_bucket(
@@ -61,8 +131,16 @@ def setup_aws_resources(aws_environment):
         handler = importlib.import_module(handler_module_name)
         lambda_handler = handler.lambda_handler
         
-        # Patch handler's table reference to use the mocked table
+        # Patch handler's table references to use the mocked tables
         handler.files_table = table
+        handler.users_table = users_table
+        handler.blobs_table = blobs_table
+        handler.tombstones_table = tombstones_table
+        handler.shared_links_table = shared_links_table
+
+        import lambda_functions.share_file.handler as share_file
+        monkeypatch.setattr(share_file, 'shared_links_table', shared_links_table)
+        handler.lambda_client = ShareFileLambdaClient(share_file)
         
         yield table, s3, lambda_handler
 
@@ -85,7 +163,7 @@ def create_test_event(file_id):
 
 @mock_aws
 def test_delete_file_success(aws_environment, setup_aws_resources):
-    """Test successful file deletion removes from S3 and DynamoDB."""
+    """Test successful file deletion removes metadata and tombstones the object."""
     table, s3, lambda_handler = setup_aws_resources
     
     # Setup DynamoDB entry
@@ -113,9 +191,12 @@ def test_delete_file_success(aws_environment, setup_aws_resources):
     assert 'deleted' in body['message'].lower()
     assert body['fileId'] == TEST_FILE_ID
     
-    # Verify file is deleted from S3
-    with pytest.raises(s3.exceptions.NoSuchKey):
-        s3.get_object(Bucket=TEST_BUCKET, Key=s3_key)
+    # The object is left for the purger, which removes every version
+    tombstones = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_TOMBSTONES_TABLE)
+    tombstone = tombstones.get_item(Key={'s3Prefix': f'{TEST_USER_ID}/{TEST_FILE_ID}/'})['Item']
+    assert tombstone['userId'] == TEST_USER_ID
+    assert tombstone['fileId'] == TEST_FILE_ID
+    assert s3.head_object(Bucket=TEST_BUCKET, Key=s3_key)
     
     # Verify file is deleted from DynamoDB
     result = table.get_item(
@@ -230,3 +311,319 @@ def test_delete_file_removes_from_dynamodb(aws_environment, setup_aws_resources)
         }
     )
     assert 'Item' not in result
+
+
+@mock_aws
+def test_delete_bumps_listing_version(aws_environment, setup_aws_resources):
+    """Test that deleting a file increments the user's listing version."""
+    table, s3, lambda_handler = setup_aws_resources
+    users_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_USERS_TABLE)
+
+    s3_key = f'{TEST_USER_ID}/{TEST_FILE_ID}/test.pdf'
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': TEST_FILE_ID,
+        'fileName': 'test.pdf',
+        's3Key': s3_key
+    })
+    s3.put_object(Bucket=TEST_BUCKET, Key=s3_key, Body=b'Content')
+
+    response = lambda_handler(create_test_event(TEST_FILE_ID), None)
+
+    assert response['statusCode'] == 200
+    item = users_table.get_item(Key={'userId': TEST_USER_ID})['Item']
+    assert item['listingVersion'] == 1
+
+
+@mock_aws
+def test_delete_keeps_shared_blob_until_last_reference(aws_environment, setup_aws_resources):
+    """Test that a deduplicated object is only deleted with its last reference."""
+    table, s3, lambda_handler = setup_aws_resources
+    blobs_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_BLOBS_TABLE)
+    sha256 = 'ab' * 32
+    s3_key = f'{TEST_USER_ID}/file-1/report.pdf'
+    s3.put_object(Bucket=TEST_BUCKET, Key=s3_key, Body=b'content')
+    blobs_table.put_item(Item={'userId': TEST_USER_ID, 'sha256': sha256, 's3Key': s3_key, 'size': 7, 'refCount': 2})
+    for file_id in ('file-1', 'file-2'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'report.pdf',
+                             's3Key': s3_key, 'sha256': sha256})
+
+    def delete(file_id):
+        return lambda_handler({
+            'pathParameters': {'fileId': file_id},
+            'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}}
+        }, None)
+
+    tombstones = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_TOMBSTONES_TABLE)
+
+    assert delete('file-1')['statusCode'] == 200
+    assert tombstones.scan()['Count'] == 0
+    assert blobs_table.get_item(Key={'userId': TEST_USER_ID, 'sha256': sha256})['Item']['refCount'] == 1
+
+    assert delete('file-2')['statusCode'] == 200
+    # The object lives under file-1's prefix, whichever reference goes last
+    assert [t['s3Prefix'] for t in tombstones.scan()['Items']] == [f'{TEST_USER_ID}/file-1/']
+    assert 'Item' not in blobs_table.get_item(Key={'userId': TEST_USER_ID, 'sha256': sha256})
+    assert table.scan()['Count'] == 0
+
+
+@mock_aws
+def test_concurrent_delete_drops_the_blob_reference_once(aws_environment, setup_aws_resources, monkeypatch):
+    """A delete that lost the race to another finds the item gone and leaves the blob's count alone."""
+    table, s3, lambda_handler = setup_aws_resources
+    handler = sys.modules['lambda_functions.delete_file.handler']
+    blobs_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_BLOBS_TABLE)
+    tombstones = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_TOMBSTONES_TABLE)
+    sha256 = 'cd' * 32
+    s3_key = f'{TEST_USER_ID}/file-1/report.pdf'
+    blobs_table.put_item(Item={'userId': TEST_USER_ID, 'sha256': sha256, 's3Key': s3_key, 'size': 7, 'refCount': 2})
+    for file_id in ('file-1', 'file-2'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'report.pdf',
+                             's3Key': s3_key, 'sha256': sha256})
+    event = {
+        'pathParameters': {'fileId': 'file-1'},
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}}
+    }
+
+    # Both requests read the item before either deletes it
+    stale = handler.files_table.get_item(Key={'userId': TEST_USER_ID, 'fileId': 'file-1'})
+    monkeypatch.setattr(handler.files_table, 'get_item', lambda **kwargs: stale)
+
+    assert lambda_handler(event, None)['statusCode'] == 200
+    assert lambda_handler(event, None)['statusCode'] == 404
+
+    assert blobs_table.get_item(Key={'userId': TEST_USER_ID, 'sha256': sha256})['Item']['refCount'] == 1
+    assert tombstones.scan()['Count'] == 0
+
+
+@mock_aws
+def test_soft_delete_skips_files_already_deleted(aws_environment, setup_aws_resources):
+    """A chunk containing a file deleted concurrently is retried without it, and it isn't tombstoned twice."""
+    table, _, _ = setup_aws_resources
+    handler = sys.modules['lambda_functions.delete_file.handler']
+    items = []
+    for file_id in ('a', 'b', 'c'):
+        item = {'userId': TEST_USER_ID, 'fileId': file_id, 's3Key': f'{TEST_USER_ID}/{file_id}/f'}
+        table.put_item(Item=item)
+        items.append(item)
+    table.delete_item(Key={'userId': TEST_USER_ID, 'fileId': 'b'})
+
+    errors, gone = handler._soft_delete_items(TEST_USER_ID, items)
+
+    assert errors == {}
+    assert gone == {'b'}
+    assert table.scan()['Count'] == 0
+    tombstones = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_TOMBSTONES_TABLE).scan()['Items']
+    assert {t['fileId'] for t in tombstones} == {'a', 'c'}
+
+
+def create_bulk_event(file_ids):
+    """Create a POST /files/delete event (API Gateway sends null pathParameters)."""
+    return {
+        'resource': '/files/delete',
+        'pathParameters': None,
+        'httpMethod': 'POST',
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}},
+        'body': json.dumps({'fileIds': file_ids})
+    }
+
+
+@mock_aws
+def test_bulk_delete_reports_each_file(aws_environment, setup_aws_resources):
+    """Owned files are deleted in batches; shared blobs keep their refcount; others are not_found."""
+    table, s3, lambda_handler = setup_aws_resources
+    dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+    blobs_table = dynamodb.Table(TEST_BLOBS_TABLE)
+    users_table = dynamodb.Table(TEST_USERS_TABLE)
+
+    # More than one BatchWriteItem chunk of plain files
+    for i in range(30):
+        s3_key = f'{TEST_USER_ID}/file-{i}/doc.txt'
+        s3.put_object(Bucket=TEST_BUCKET, Key=s3_key, Body=b'content')
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': f'file-{i}', 'fileName': 'doc.txt', 's3Key': s3_key})
+
+    # Two deduplicated files sharing one object, plus a third reference kept outside the request
+    sha256 = 'cd' * 32
+    shared_key = f'{TEST_USER_ID}/shared-1/photo.png'
+    s3.put_object(Bucket=TEST_BUCKET, Key=shared_key, Body=b'png')
+    blobs_table.put_item(Item={'userId': TEST_USER_ID, 'sha256': sha256, 's3Key': shared_key, 'size': 3, 'refCount': 3})
+    for file_id in ('shared-1', 'shared-2', 'shared-3'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'photo.png',
+                             's3Key': shared_key, 'sha256': sha256})
+
+    table.put_item(Item={'userId': 'other-user', 'fileId': 'theirs', 'fileName': 'x', 's3Key': 'other-user/theirs/x'})
+    s3.put_object(Bucket=TEST_BUCKET, Key='other-user/theirs/x', Body=b'x')
+
+    file_ids = [f'file-{i}' for i in range(30)] + ['shared-1', 'shared-2', 'theirs', 'missing']
+    response = lambda_handler(create_bulk_event(file_ids), None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    statuses = {result['fileId']: result['status'] for result in body['results']}
+    assert [result['fileId'] for result in body['results']] == file_ids
+    assert all(statuses[f'file-{i}'] == 'deleted' for i in range(30))
+    assert statuses['shared-1'] == statuses['shared-2'] == 'deleted'
+    assert statuses['theirs'] == statuses['missing'] == 'not_found'
+    assert (body['deleted'], body['notFound'], body['failed']) == (32, 2, 0)
+
+    remaining = {(item['userId'], item['fileId']) for item in table.scan()['Items']}
+    assert remaining == {(TEST_USER_ID, 'shared-3'), ('other-user', 'theirs')}
+    tombstones = dynamodb.Table(TEST_TOMBSTONES_TABLE).scan()['Items']
+    assert {t['s3Prefix'] for t in tombstones} == {f'{TEST_USER_ID}/file-{i}/' for i in range(30)}
+    assert blobs_table.get_item(Key={'userId': TEST_USER_ID, 'sha256': sha256})['Item']['refCount'] == 1
+    assert users_table.get_item(Key={'userId': TEST_USER_ID})['Item']['listingVersion'] >= 1
+
+
+@mock_aws
+def test_bulk_delete_reports_failed_transactions(aws_environment, setup_aws_resources, monkeypatch):
+    """Files in a transaction that failed are reported as failed and left untouched."""
+    table, s3, lambda_handler = setup_aws_resources
+    handler = sys.modules['lambda_functions.delete_file.handler']
+    monkeypatch.setattr(handler, 'FILES_PER_TRANSACTION', 1)
+    for file_id in ('ok', 'stuck'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'f',
+                             's3Key': f'{TEST_USER_ID}/{file_id}/f'})
+
+    client = table.meta.client
+    real_transact = client.transact_write_items
+
+    def throttled_transact(TransactItems):
+        if TransactItems[0]['Delete']['Key']['fileId'] == 'stuck':
+            raise ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message': 'Throttled'},
+                               'CancellationReasons': [{'Code': 'ThrottlingError'}]}, 'TransactWriteItems')
+        return real_transact(TransactItems=TransactItems)
+
+    monkeypatch.setattr(client, 'transact_write_items', throttled_transact)
+
+    body = json.loads(lambda_handler(create_bulk_event(['ok', 'stuck']), None)['body'])
+
+    assert body['results'] == [
+        {'fileId': 'ok', 'status': 'deleted'},
+        {'fileId': 'stuck', 'status': 'failed', 'error': 'TransactionCanceledException'}
+    ]
+    assert [item['fileId'] for item in table.scan()['Items']] == ['stuck']
+
+
+@mock_aws
+def test_bulk_delete_rejects_bad_input(aws_environment, setup_aws_resources):
+    """fileIds must be a non-empty list within the limit."""
+    _, _, lambda_handler = setup_aws_resources
+
+    assert lambda_handler(create_bulk_event([]), None)['statusCode'] == 400
+    assert lambda_handler(create_bulk_event(['x'] * 1001), None)['statusCode'] == 400
+
+
+def put_share(file_id, token, user_id=TEST_USER_ID):
+    links = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_SHARED_LINKS_TABLE)
+    links.put_item(Item={'shareToken': token, 'linkId': token, 'fileId': file_id, 'userId': user_id,
+                         's3Key': f'{user_id}/{file_id}/f', 'fileName': 'f',
+                         'createdAt': '2024-01-01T00:00:00', 'expiresAt': 4102444800})
+
+
+@mock_aws
+def test_delete_revokes_share_links(aws_environment, setup_aws_resources):
+    """Deleting a file removes its share links and leaves other files' links alone."""
+    table, _, lambda_handler = setup_aws_resources
+    links = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_SHARED_LINKS_TABLE)
+    for file_id in (TEST_FILE_ID, 'other-file'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'f',
+                             's3Key': f'{TEST_USER_ID}/{file_id}/f'})
+    put_share(TEST_FILE_ID, 'token-1')
+    put_share(TEST_FILE_ID, 'token-2')
+    put_share('other-file', 'token-3')
+
+    assert lambda_handler(create_test_event(TEST_FILE_ID), None)['statusCode'] == 200
+
+    assert [link['shareToken'] for link in links.scan()['Items']] == ['token-3']
+
+
+def handler_invocations(lambda_handler):
+    return sys.modules[lambda_handler.__module__].lambda_client.invocations
+
+
+def revocation_shard(revoked_id):
+    return f"#revoked#{hashlib.sha256(revoked_id.encode()).hexdigest()[0]}"
+
+
+@mock_aws
+def test_bulk_delete_revokes_signed_share_links(aws_environment, setup_aws_resources):
+    """Only deleted files with signed links go on the revocation list, and expired entries are pruned."""
+    table, _, lambda_handler = setup_aws_resources
+    links = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_SHARED_LINKS_TABLE)
+    links.put_item(Item={'shareToken': revocation_shard('a'), 'revoked': {'stale-token': 1}})
+    until = int(time.time()) + 7200
+    links.put_item(Item={'shareToken': f'#signed#{TEST_USER_ID}#a', 'userId': TEST_USER_ID, 'fileId': 'a',
+                         'expiresAt': until})
+    for file_id in ('a', 'b'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'f',
+                             's3Key': f'{TEST_USER_ID}/{file_id}/f'})
+
+    lambda_handler(create_bulk_event(['a', 'b']), None)
+
+    items = {item['shareToken']: item for item in links.scan()['Items']}
+    # "b" never had a signed link, so it costs the revocation list nothing
+    assert set(items) == {revocation_shard('a')}
+    assert items[revocation_shard('a')]['revoked'] == {'a': until}
+    assert handler_invocations(lambda_handler) == [{'revocations': {'a': until}}]
+
+
+@mock_aws
+def test_failed_revocation_does_not_fail_a_committed_delete(aws_environment, setup_aws_resources, monkeypatch):
+    """Once the delete has committed, a revocation failure is logged and the delete still reports success."""
+    table, _, lambda_handler = setup_aws_resources
+    links = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_SHARED_LINKS_TABLE)
+    until = int(time.time()) + 7200
+    for file_id in (TEST_FILE_ID, 'a', 'b'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'f',
+                             's3Key': f'{TEST_USER_ID}/{file_id}/f'})
+        links.put_item(Item={'shareToken': f'#signed#{TEST_USER_ID}#{file_id}', 'userId': TEST_USER_ID,
+                             'fileId': file_id, 'expiresAt': until})
+    handler = sys.modules[lambda_handler.__module__]
+
+    def share_file_down(**kwargs):
+        raise ClientError({'Error': {'Code': 'TooManyRequestsException', 'Message': 'Rate exceeded'}}, 'Invoke')
+
+    monkeypatch.setattr(handler.lambda_client, 'invoke', share_file_down)
+
+    response = lambda_handler(create_test_event(TEST_FILE_ID), None)
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['fileId'] == TEST_FILE_ID
+
+    body = json.loads(lambda_handler(create_bulk_event(['a', 'b']), None)['body'])
+    assert body['deleted'] == 2
+    assert table.scan()['Count'] == 0
+    # The markers stay until their revocation succeeds
+    assert links.scan()['Count'] == 3
+
+
+def test_share_file_is_the_only_revocation_writer():
+    """Delete and purge hand signed-link revocations to share_file instead of writing the list."""
+    writers = []
+    markers = set()
+    for module in ('delete_file', 'share_file', 'account_purger', 'shared_link'):
+        path = os.path.join(os.path.dirname(__file__), '..', 'lambda_functions', module, 'handler.py')
+        with open(path) as f:
+            tree = ast.parse(f.read())
+        if any(isinstance(node, ast.FunctionDef) and node.name == '_add_revocations' for node in tree.body):
+            writers.append(module)
+        markers.update(ast.literal_eval(node.value) for node in tree.body
+                       if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name)
+                       and node.targets[0].id == 'SIGNED_LINKS_MARKER')
+    assert writers == ['share_file']
+    assert markers == {'#signed'}
+
+
+@mock_aws
+def test_bulk_delete_revokes_share_links(aws_environment, setup_aws_resources):
+    """Bulk deletes revoke the links of every deleted file in one pass over the owner's links."""
+    table, _, lambda_handler = setup_aws_resources
+    links = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_SHARED_LINKS_TABLE)
+    for file_id in ('a', 'b', 'keep'):
+        table.put_item(Item={'userId': TEST_USER_ID, 'fileId': file_id, 'fileName': 'f',
+                             's3Key': f'{TEST_USER_ID}/{file_id}/f'})
+        put_share(file_id, f'token-{file_id}')
+    put_share('a', 'token-other-user', user_id='other-user')
+
+    lambda_handler(create_bulk_event(['a', 'b']), None)
+
+    assert sorted(link['shareToken'] for link in links.scan()['Items']) == ['token-keep', 'token-other-user']
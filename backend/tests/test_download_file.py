@@ -1,4 +1,5 @@
 import pytest
+import base64
 import json
 import boto3
 from moto import mock_aws
@@ -177,3 +178,179 @@ def test_download_file_wrong_owner(aws_environment, setup_aws_resources):
     
     # Should return 404 (not found for this user) since composite key doesn't match
     assert response['statusCode'] == 404
+
+
+def put_file(table, s3, body, content_type, file_name='server.log'):
+    s3_key = f'{TEST_USER_ID}/{TEST_FILE_ID}/{file_name}'
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': TEST_FILE_ID,
+        'fileName': file_name,
+        's3Key': s3_key,
+        'contentType': content_type
+    })
+    s3.put_object(Bucket=TEST_BUCKET, Key=s3_key, Body=body)
+
+
+def create_preview_event(preview_kb=None):
+    event = create_test_event(TEST_FILE_ID)
+    event['queryStringParameters'] = {'preview': 'true'}
+    if preview_kb is not None:
+        event['queryStringParameters']['previewKB'] = str(preview_kb)
+    return event
+
+
+@mock_aws
+def test_preview_returns_first_kilobytes_of_text(aws_environment, setup_aws_resources):
+    """Test that a text preview is the first N KB, cut on a character boundary."""
+    table, s3, lambda_handler = setup_aws_resources
+    # 1023 ASCII bytes then a 2-byte character straddling the 1 KB boundary
+    content = b'a' * 1023 + 'é'.encode('utf-8') + b'tail' * 1000
+    put_file(table, s3, content, 'text/plain')
+
+    response = lambda_handler(create_preview_event(1), None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['encoding'] == 'utf-8'
+    assert body['preview'] == 'a' * 1023
+    assert body['previewBytes'] == 1024
+    assert body['totalSize'] == len(content)
+    assert body['truncated'] is True
+
+
+@mock_aws
+def test_preview_of_binary_is_base64(aws_environment, setup_aws_resources):
+    """Test that binary previews are base64 and small files aren't marked truncated."""
+    table, s3, lambda_handler = setup_aws_resources
+    content = bytes(range(256))
+    put_file(table, s3, content, 'application/octet-stream', 'blob.bin')
+
+    body = json.loads(lambda_handler(create_preview_event(), None)['body'])
+
+    assert body['encoding'] == 'base64'
+    assert base64.b64decode(body['preview']) == content
+    assert body['truncated'] is False
+
+
+@mock_aws
+def test_preview_of_empty_file(aws_environment, setup_aws_resources):
+    """Test that an empty object previews as empty instead of failing the range."""
+    table, s3, lambda_handler = setup_aws_resources
+    put_file(table, s3, b'', 'text/plain')
+
+    response = lambda_handler(create_preview_event(), None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['preview'] == ''
+    assert body['totalSize'] == 0
+
+
+@mock_aws
+def test_preview_of_missing_object(aws_environment, setup_aws_resources):
+    """Test that a preview without an S3 object is 409 while the upload is pending and 404 otherwise."""
+    table, s3, lambda_handler = setup_aws_resources
+    put_file(table, s3, b'', 'text/plain')
+    s3.delete_object(Bucket=TEST_BUCKET, Key=f'{TEST_USER_ID}/{TEST_FILE_ID}/server.log')
+
+    assert lambda_handler(create_preview_event(), None)['statusCode'] == 404
+
+    table.update_item(
+        Key={'userId': TEST_USER_ID, 'fileId': TEST_FILE_ID},
+        UpdateExpression='SET #status = :pending',
+        ExpressionAttributeNames={'#status': 'status'},
+        ExpressionAttributeValues={':pending': 'pending'}
+    )
+    response = lambda_handler(create_preview_event(), None)
+
+    assert response['statusCode'] == 409
+    assert json.loads(response['body'])['error'] == 'File upload has not completed'
+
+
+def create_batch_event(file_ids):
+    """Create a POST /files/download-urls event (API Gateway sends null pathParameters)."""
+    return {
+        'resource': '/files/download-urls',
+        'httpMethod': 'POST',
+        'pathParameters': None,
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}},
+        'body': json.dumps({'fileIds': file_ids})
+    }
+
+
+@mock_aws
+def test_batch_download_urls(aws_environment, setup_aws_resources):
+    """Owned files get URLs; other users' and unknown files are reported as notFound."""
+    table, _, lambda_handler = setup_aws_resources
+    for i in range(150):
+        table.put_item(Item={
+            'userId': TEST_USER_ID,
+            'fileId': f'file-{i}',
+            'fileName': f'doc-{i}.txt',
+            's3Key': f'{TEST_USER_ID}/file-{i}/doc-{i}.txt'
+        })
+    table.put_item(Item={
+        'userId': 'other-user',
+        'fileId': 'theirs',
+        'fileName': 'secret.txt',
+        's3Key': 'other-user/theirs/secret.txt'
+    })
+
+    # More than one BatchGetItem chunk, plus a duplicate
+    file_ids = [f'file-{i}' for i in range(150)] + ['file-0', 'theirs', 'missing']
+    response = lambda_handler(create_batch_event(file_ids), None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert [f['fileId'] for f in body['files']] == [f'file-{i}' for i in range(150)]
+    assert all('doc-' in f['downloadUrl'] for f in body['files'])
+    assert body['notFound'] == ['theirs', 'missing']
+    assert body['failed'] == []
+
+
+@mock_aws
+def test_batch_download_retries_unprocessed_keys(aws_environment, setup_aws_resources, monkeypatch):
+    """Keys left unprocessed by BatchGetItem are retried."""
+    table, _, lambda_handler = setup_aws_resources
+    handler = sys.modules['lambda_functions.download_file.handler']
+    monkeypatch.setattr(handler.time, 'sleep', lambda _: None)
+    for file_id in ('a', 'b'):
+        table.put_item(Item={
+            'userId': TEST_USER_ID,
+            'fileId': file_id,
+            'fileName': f'{file_id}.txt',
+            's3Key': f'{TEST_USER_ID}/{file_id}/{file_id}.txt'
+        })
+
+    client = table.meta.client
+    real_batch_get = client.batch_get_item
+    calls = []
+
+    def throttled_batch_get(RequestItems):
+        calls.append(RequestItems)
+        if len(calls) == 1:
+            keys = RequestItems[TEST_TABLE]['Keys']
+            response = real_batch_get(RequestItems={TEST_TABLE: dict(RequestItems[TEST_TABLE], Keys=keys[:1])})
+            response['UnprocessedKeys'] = {TEST_TABLE: dict(RequestItems[TEST_TABLE], Keys=keys[1:])}
+            return response
+        return real_batch_get(RequestItems=RequestItems)
+
+    monkeypatch.setattr(client, 'batch_get_item', throttled_batch_get)
+
+    response = lambda_handler(create_batch_event(['a', 'b']), None)
+
+    body = json.loads(response['body'])
+    assert len(calls) == 2
+    assert sorted(f['fileId'] for f in body['files']) == ['a', 'b']
+    assert body['failed'] == []
+
+
+@mock_aws
+def test_batch_download_rejects_bad_input(aws_environment, setup_aws_resources):
+    """fileIds must be a non-empty list within the limit."""
+    _, _, lambda_handler = setup_aws_resources
+
+    assert lambda_handler(create_batch_event([]), None)['statusCode'] == 400
+    assert lambda_handler(create_batch_event(['x'] * 501), None)['statusCode'] == 400
+    assert lambda_handler(create_batch_event([1, 2]), None)['statusCode'] == 400
@@ -0,0 +1,103 @@
+import pytest
+import boto3
+from moto import mock_aws
+import os
+import sys
+
+TEST_BUCKET = "test-bucket"
+TEST_TOMBSTONES_TABLE = "file-tombstones-test"
+
+os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
+os.environ['TOMBSTONES_TABLE_NAME'] = TEST_TOMBSTONES_TABLE
+
+
+@pytest.fixture
+def setup_aws_resources():
+    """Create the mock tombstones table and a versioned bucket."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        tombstones_table = dynamodb.create_table(
+            TableName=TEST_TOMBSTONES_TABLE,
+            KeySchema=[{'AttributeName': 's3Prefix', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 's3Prefix', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        s3 = boto3.client('s3', region_name='us-west-2')
+        s3.create_bucket(
+            Bucket=TEST_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'us-west-2'}
+        )
+        s3.put_bucket_versioning(Bucket=TEST_BUCKET, VersioningConfiguration={'Status': 'Enabled'})
+
+        import importlib
+        handler_module_name = 'lambda_functions.file_purger.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.tombstones_table = tombstones_table
+        handler.s3_client = s3
+
+        yield tombstones_table, s3, handler
+
+
+def all_versions(s3):
+    response = s3.list_object_versions(Bucket=TEST_BUCKET)
+    return response.get('Versions', []) + response.get('DeleteMarkers', [])
+
+
+def test_purges_every_version_and_marker_under_the_prefix(setup_aws_resources):
+    """All versions and delete markers of a tombstoned file go; other files are untouched."""
+    tombstones_table, s3, handler = setup_aws_resources
+    key = 'user-1/file-1/report.pdf'
+    for body in (b'v1', b'v2', b'v3'):
+        s3.put_object(Bucket=TEST_BUCKET, Key=key, Body=body)
+    s3.delete_object(Bucket=TEST_BUCKET, Key=key)  # a delete marker from the old code path
+    s3.put_object(Bucket=TEST_BUCKET, Key='user-1/file-10/keep.txt', Body=b'keep')
+    tombstones_table.put_item(Item={'s3Prefix': 'user-1/file-1/', 'userId': 'user-1', 'fileId': 'file-1'})
+
+    result = handler.lambda_handler({}, None)
+
+    assert result == {'purged': 1, 'versionsDeleted': 4, 'failed': 0}
+    assert [v['Key'] for v in all_versions(s3)] == ['user-1/file-10/keep.txt']
+    assert tombstones_table.scan()['Count'] == 0
+
+
+def test_purge_pages_through_many_versions(setup_aws_resources, monkeypatch):
+    """Prefixes with more versions than one page are deleted across several DeleteObjects calls."""
+    tombstones_table, s3, handler = setup_aws_resources
+    monkeypatch.setattr(handler, 'DELETE_BATCH_SIZE', 2)
+    for i in range(5):
+        s3.put_object(Bucket=TEST_BUCKET, Key='user-1/file-1/log.txt', Body=str(i).encode())
+    tombstones_table.put_item(Item={'s3Prefix': 'user-1/file-1/', 'userId': 'user-1', 'fileId': 'file-1'})
+
+    result = handler.lambda_handler({}, None)
+
+    assert result['versionsDeleted'] == 5
+    assert all_versions(s3) == []
+
+
+def test_aborts_open_multipart_uploads(setup_aws_resources):
+    """An upload still in progress under a deleted file's prefix is aborted."""
+    tombstones_table, s3, handler = setup_aws_resources
+    s3.create_multipart_upload(Bucket=TEST_BUCKET, Key='user-1/file-1/big.bin')
+    tombstones_table.put_item(Item={'s3Prefix': 'user-1/file-1/', 'userId': 'user-1', 'fileId': 'file-1'})
+
+    handler.lambda_handler({}, None)
+
+    assert 'Uploads' not in s3.list_multipart_uploads(Bucket=TEST_BUCKET)
+
+
+def test_failed_purge_keeps_tombstone(setup_aws_resources, monkeypatch):
+    """If S3 refuses a delete, the tombstone stays so the next run retries."""
+    tombstones_table, s3, handler = setup_aws_resources
+    s3.put_object(Bucket=TEST_BUCKET, Key='user-1/file-1/a.txt', Body=b'a')
+    tombstones_table.put_item(Item={'s3Prefix': 'user-1/file-1/', 'userId': 'user-1', 'fileId': 'file-1'})
+    monkeypatch.setattr(handler.s3_client, 'delete_objects', lambda Bucket, Delete: {
+        'Errors': [{'Key': 'user-1/file-1/a.txt', 'Code': 'AccessDenied', 'Message': 'Access Denied'}]
+    })
+
+    result = handler.lambda_handler({}, None)
+
+    assert result == {'purged': 0, 'versionsDeleted': 0, 'failed': 1}
+    assert tombstones_table.scan()['Count'] == 1
@@ -0,0 +1,202 @@
+import pytest
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from moto import mock_aws
+import os
+import sys
+
+TEST_USER_ID = "test-user-123"
+TEST_CHANGES_TABLE = "file-changes-test"
+TEST_USAGE_TABLE = "usage-test"
+TEST_PURGES_TABLE = "account-purges-test"
+
+os.environ['FILE_CHANGES_TABLE_NAME'] = TEST_CHANGES_TABLE
+os.environ['USAGE_TABLE_NAME'] = TEST_USAGE_TABLE
+os.environ['PURGES_TABLE_NAME'] = TEST_PURGES_TABLE
+
+serializer = TypeSerializer()
+
+
+@pytest.fixture
+def setup_aws_resources():
+    """Create mock change log and usage tables."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        table = dynamodb.create_table(
+            TableName=TEST_CHANGES_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'changeId', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'changeId', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        usage_table = dynamodb.create_table(
+            TableName=TEST_USAGE_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'contentType', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'contentType', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        purges_table = dynamodb.create_table(
+            TableName=TEST_PURGES_TABLE,
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        import importlib
+        handler_module_name = 'lambda_functions.file_stream_processor.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.file_changes_table = table
+        handler.usage_table = usage_table
+        handler.purges_table = purges_table
+
+        yield table, handler.lambda_handler
+
+
+def stream_record(event_name, sequence_number, file_id, new_image=None, old_image=None, created_at=1700000000):
+    """Build a DynamoDB stream record for a FilesTable item."""
+    keys = {'userId': TEST_USER_ID, 'fileId': file_id}
+    record = {
+        'eventName': event_name,
+        'dynamodb': {
+            'ApproximateCreationDateTime': created_at,
+            'SequenceNumber': sequence_number,
+            'Keys': {k: serializer.serialize(v) for k, v in keys.items()}
+        }
+    }
+    if new_image is not None:
+        record['dynamodb']['NewImage'] = {k: serializer.serialize(v) for k, v in {**keys, **new_image}.items()}
+    if old_image is not None:
+        record['dynamodb']['OldImage'] = {k: serializer.serialize(v) for k, v in {**keys, **old_image}.items()}
+    return record
+
+
+def test_records_created_updated_and_deleted(setup_aws_resources):
+    """Test that each stream event becomes an ordered change log entry."""
+    table, lambda_handler = setup_aws_resources
+
+    event = {'Records': [
+        stream_record('INSERT', '100', 'file-1', new_image={'fileName': 'a.pdf', 's3Key': 'k', 'status': 'pending'}),
+        stream_record('MODIFY', '200', 'file-1', new_image={'fileName': 'a.pdf', 'status': 'completed'},
+                      old_image={'fileName': 'a.pdf', 'status': 'pending'}),
+        stream_record('REMOVE', '1000', 'file-1', old_image={'fileName': 'a.pdf'}),
+    ]}
+    result = lambda_handler(event, None)
+
+    assert result['recorded'] == 3
+    assert usage()['*'] == (0, 0)
+    items = table.query(
+        KeyConditionExpression=boto3.dynamodb.conditions.Key('userId').eq(TEST_USER_ID)
+    )['Items']
+    assert [i['changeType'] for i in items] == ['created', 'updated', 'deleted']
+    assert items[0]['file'] == {'fileId': 'file-1', 'fileName': 'a.pdf', 'status': 'pending'}
+    assert items[1]['file']['status'] == 'completed'
+    assert 'file' not in items[2]
+    assert all(i['expiresAt'] > i['changedAt'] for i in items)
+
+
+def test_retried_batch_does_not_duplicate(setup_aws_resources):
+    """Test that replaying the same records overwrites rather than appends."""
+    table, lambda_handler = setup_aws_resources
+
+    event = {'Records': [stream_record('INSERT', '100', 'file-1', new_image={'fileName': 'a.pdf'})]}
+    lambda_handler(event, None)
+    lambda_handler(event, None)
+
+    assert table.scan()['Count'] == 1
+
+
+def usage(user_id=TEST_USER_ID):
+    """Return {contentType: (fileCount, totalBytes)} from the usage table."""
+    table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_USAGE_TABLE)
+    items = table.query(
+        KeyConditionExpression=boto3.dynamodb.conditions.Key('userId').eq(user_id)
+    )['Items']
+    return {i['contentType']: (int(i['fileCount']), int(i['totalBytes'])) for i in items}
+
+
+def test_usage_tracks_inserts_resizes_and_deletes(setup_aws_resources):
+    """Test that usage counters follow the file's lifecycle."""
+    _, lambda_handler = setup_aws_resources
+
+    lambda_handler({'Records': [
+        stream_record('INSERT', '100', 'file-1', new_image={'contentType': 'application/pdf', 'size': 100}),
+        stream_record('INSERT', '101', 'file-2', new_image={'contentType': 'text/plain', 'size': 10}),
+    ]}, None)
+    assert usage() == {'*': (2, 110), 'application/pdf': (1, 100), 'text/plain': (1, 10)}
+
+    # Finalizer corrects the declared size
+    lambda_handler({'Records': [
+        stream_record('MODIFY', '200', 'file-1',
+                      new_image={'contentType': 'application/pdf', 'size': 150},
+                      old_image={'contentType': 'application/pdf', 'size': 100}),
+    ]}, None)
+    assert usage()['*'] == (2, 160)
+    assert usage()['application/pdf'] == (1, 150)
+
+    lambda_handler({'Records': [
+        stream_record('REMOVE', '300', 'file-2', old_image={'contentType': 'text/plain', 'size': 10}),
+    ]}, None)
+    assert usage()['*'] == (1, 150)
+    assert usage()['text/plain'] == (0, 0)
+
+
+def test_replayed_batch_does_not_double_count(setup_aws_resources):
+    """Test that a retried batch leaves usage unchanged."""
+    _, lambda_handler = setup_aws_resources
+
+    event = {'Records': [
+        stream_record('INSERT', '100', 'file-1', new_image={'contentType': 'application/pdf', 'size': 100}),
+    ]}
+    lambda_handler(event, None)
+    result = lambda_handler(event, None)
+
+    assert result == {'recorded': 0, 'replayed': 1, 'purged': 0}
+    assert usage()['*'] == (1, 100)
+
+
+def test_malformed_size_counts_as_zero(setup_aws_resources):
+    """Test that a non-numeric or negative size doesn't fail the batch."""
+    table, lambda_handler = setup_aws_resources
+
+    result = lambda_handler({'Records': [
+        stream_record('INSERT', '100', 'file-1', new_image={'contentType': 'text/plain', 'size': 'huge'}),
+        stream_record('INSERT', '101', 'file-2', new_image={'contentType': 'text/plain', 'size': -5}),
+        stream_record('INSERT', '102', 'file-3', new_image={'contentType': 'text/plain', 'size': 7}),
+    ]}, None)
+
+    assert result['recorded'] == 3
+    assert usage()['*'] == (3, 7)
+    assert table.scan()['Count'] == 3
+
+
+def test_records_from_before_an_account_purge_are_dropped(setup_aws_resources):
+    """A batch lagging behind a finished purge doesn't recreate change log or usage rows; later writes count."""
+    table, lambda_handler = setup_aws_resources
+    dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+    dynamodb.Table(TEST_PURGES_TABLE).put_item(Item={'userId': TEST_USER_ID, 'status': 'complete',
+                                                     'filesDeletedAt': 1700000100})
+    image = {'fileName': 'a.txt', 'contentType': 'text/plain', 'size': 10}
+    event = {'Records': [
+        stream_record('REMOVE', '100', 'a', old_image=image, created_at=1700000050),
+        stream_record('INSERT', '200', 'b', new_image=image, created_at=1700000200),
+    ]}
+
+    result = lambda_handler(event, None)
+
+    assert result == {'recorded': 1, 'replayed': 0, 'purged': 1}
+    assert [item['fileId'] for item in table.scan()['Items']] == ['b']
+    usage = dynamodb.Table(TEST_USAGE_TABLE).get_item(Key={'userId': TEST_USER_ID, 'contentType': '*'})['Item']
+    assert (usage['fileCount'], usage['totalBytes']) == (1, 10)
@@ -0,0 +1,80 @@
+import pytest
+import json
+import boto3
+from moto import mock_aws
+import os
+import sys
+
+TEST_USER_ID = "test-user-123"
+TEST_USAGE_TABLE = "usage-test"
+
+os.environ['USAGE_TABLE_NAME'] = TEST_USAGE_TABLE
+
+
+@pytest.fixture
+def setup_aws_resources():
+    """Create mock usage table."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        table = dynamodb.create_table(
+            TableName=TEST_USAGE_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'contentType', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'contentType', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        import importlib
+        handler_module_name = 'lambda_functions.get_usage.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.usage_table = table
+
+        yield table, handler.lambda_handler
+
+
+def create_test_event(user_id=TEST_USER_ID):
+    return {'requestContext': {'authorizer': {'claims': {'sub': user_id}}}}
+
+
+def test_usage_totals_and_breakdown(setup_aws_resources):
+    """Test that totals and non-empty content types are returned."""
+    table, lambda_handler = setup_aws_resources
+    table.put_item(Item={'userId': TEST_USER_ID, 'contentType': '*', 'fileCount': 3, 'totalBytes': 600})
+    table.put_item(Item={'userId': TEST_USER_ID, 'contentType': 'application/pdf', 'fileCount': 2, 'totalBytes': 500})
+    table.put_item(Item={'userId': TEST_USER_ID, 'contentType': 'text/plain', 'fileCount': 1, 'totalBytes': 100})
+    table.put_item(Item={'userId': TEST_USER_ID, 'contentType': 'image/png', 'fileCount': 0, 'totalBytes': 0})
+    table.put_item(Item={'userId': 'other-user', 'contentType': '*', 'fileCount': 9, 'totalBytes': 9})
+
+    response = lambda_handler(create_test_event(), None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {
+        'fileCount': 3,
+        'totalBytes': 600,
+        'byContentType': {
+            'application/pdf': {'fileCount': 2, 'totalBytes': 500},
+            'text/plain': {'fileCount': 1, 'totalBytes': 100},
+        }
+    }
+
+
+def test_usage_for_new_user_is_zero(setup_aws_resources):
+    """Test that a user with no files gets zeroed counters."""
+    _, lambda_handler = setup_aws_resources
+
+    body = json.loads(lambda_handler(create_test_event(), None)['body'])
+
+    assert body == {'fileCount': 0, 'totalBytes': 0, 'byContentType': {}}
+
+
+def test_usage_missing_jwt_returns_401(setup_aws_resources):
+    """Test missing JWT returns 401."""
+    _, lambda_handler = setup_aws_resources
+    assert lambda_handler({}, None)['statusCode'] == 401
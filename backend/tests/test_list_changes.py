@@ -0,0 +1,140 @@
+import pytest
+import json
+import time
+import boto3
+from moto import mock_aws
+import os
+import sys
+
+TEST_USER_ID = "test-user-123"
+TEST_CHANGES_TABLE = "file-changes-test"
+
+os.environ['FILE_CHANGES_TABLE_NAME'] = TEST_CHANGES_TABLE
+
+
+@pytest.fixture
+def setup_aws_resources():
+    """Create mock change log table."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        table = dynamodb.create_table(
+            TableName=TEST_CHANGES_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'changeId', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'changeId', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        import importlib
+        handler_module_name = 'lambda_functions.list_changes.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.file_changes_table = table
+
+        yield table, handler
+
+
+def create_test_event(since=None, limit=None):
+    """Create a test event with JWT context."""
+    params = {}
+    if since:
+        params['since'] = since
+    if limit:
+        params['limit'] = str(limit)
+    return {
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}},
+        'queryStringParameters': params or None
+    }
+
+
+def put_change(table, sequence, file_id, change_type='created', user_id=TEST_USER_ID):
+    item = {
+        'userId': user_id,
+        'changeId': str(sequence).zfill(40),
+        'fileId': file_id,
+        'changeType': change_type,
+        'changedAt': 1700000000
+    }
+    if change_type != 'deleted':
+        item['file'] = {'fileId': file_id, 'fileName': f'{file_id}.pdf', 'size': 10}
+    table.put_item(Item=item)
+
+
+def test_initial_token_then_only_new_changes(setup_aws_resources):
+    """Test that a token from the head of the log only sees later changes."""
+    table, handler = setup_aws_resources
+    put_change(table, 100, 'file-old')
+
+    response = handler.lambda_handler(create_test_event(), None)
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['changes'] == []
+    token = body['nextToken']
+
+    put_change(table, 200, 'file-new')
+    put_change(table, 300, 'file-old', change_type='deleted')
+
+    body = json.loads(handler.lambda_handler(create_test_event(since=token), None)['body'])
+    assert [(c['fileId'], c['changeType']) for c in body['changes']] == [
+        ('file-new', 'created'), ('file-old', 'deleted')
+    ]
+    assert body['changes'][0]['file']['size'] == 10
+    assert body['changes'][1]['file'] is None
+
+    body = json.loads(handler.lambda_handler(create_test_event(since=body['nextToken']), None)['body'])
+    assert body['changes'] == []
+
+
+def test_changes_are_paginated(setup_aws_resources):
+    """Test that limit splits changes across tokens without gaps."""
+    table, handler = setup_aws_resources
+    token = json.loads(handler.lambda_handler(create_test_event(), None)['body'])['nextToken']
+    for i in range(1, 6):
+        put_change(table, i, f'file-{i}')
+
+    seen = []
+    while True:
+        body = json.loads(handler.lambda_handler(create_test_event(since=token, limit=2), None)['body'])
+        seen.extend(c['fileId'] for c in body['changes'])
+        token = body['nextToken']
+        if not body['hasMore']:
+            break
+
+    assert seen == [f'file-{i}' for i in range(1, 6)]
+
+
+def test_other_users_token_rejected(setup_aws_resources):
+    """Test that a sync token cannot be replayed by another user."""
+    _, handler = setup_aws_resources
+    token = json.loads(handler.lambda_handler(create_test_event(), None)['body'])['nextToken']
+
+    event = create_test_event(since=token)
+    event['requestContext']['authorizer']['claims']['sub'] = 'other-user-456'
+    response = handler.lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+
+
+def test_expired_token_requires_resync(setup_aws_resources, monkeypatch):
+    """Test that tokens older than the retention window return 410."""
+    _, handler = setup_aws_resources
+    token = json.loads(handler.lambda_handler(create_test_event(), None)['body'])['nextToken']
+
+    later = time.time() + handler.SYNC_TOKEN_MAX_AGE_SECONDS + 60
+    monkeypatch.setattr(handler.time, 'time', lambda: later)
+    response = handler.lambda_handler(create_test_event(since=token), None)
+
+    assert response['statusCode'] == 410
+
+
+def test_missing_jwt_returns_401(setup_aws_resources):
+    """Test missing JWT returns 401."""
+    _, handler = setup_aws_resources
+    response = handler.lambda_handler({}, None)
+    assert response['statusCode'] == 401
@@ -8,9 +8,11 @@ import sys
 TEST_USER_ID = "test-user-123"
 TEST_BUCKET = "test-bucket"
 TEST_TABLE = "files-test"
+TEST_USERS_TABLE = "users-test"
 
 # Set environment variables
 os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['USERS_TABLE_NAME'] = TEST_USERS_TABLE
 os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
 os.environ['ENVIRONMENT'] = 'test'
 
@@ -22,6 +24,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda_functio
 def aws_environment(monkeypatch):
     """Set up environment variables."""
     monkeypatch.setenv('FILES_TABLE_NAME', TEST_TABLE)
+    monkeypatch.setenv('USERS_TABLE_NAME', TEST_USERS_TABLE)
     monkeypatch.setenv('FILE_BUCKET_NAME', TEST_BUCKET)
     monkeypatch.setenv('ENVIRONMENT', 'test')
 
@@ -40,8 +43,33 @@ def setup_aws_resources(aws_environment):
             ],
             AttributeDefinitions=[
                 {'AttributeName': 'userId', 'AttributeType': 'S'},
-                {'AttributeName': 'fileId', 'AttributeType': 'S'}
+                {'AttributeName': 'fileId', 'AttributeType': 'S'},
+                {'AttributeName': 'uploadDate', 'AttributeType': 'S'},
+                {'AttributeName': 'contentTypeDate', 'AttributeType': 'S'},
+                {'AttributeName': 'statusDate', 'AttributeType': 'S'}
             ],
+            GlobalSecondaryIndexes=[
+                {
+                    'IndexName': index_name,
+                    'KeySchema': [
+                        {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                        {'AttributeName': sort_key, 'KeyType': 'RANGE'}
+                    ],
+                    'Projection': {'ProjectionType': 'ALL'}
+                }
+                for index_name, sort_key in [
+                    ('userId-uploadDate-index', 'uploadDate'),
+                    ('userId-contentTypeDate-index', 'contentTypeDate'),
+                    ('userId-statusDate-index', 'statusDate')
+                ]
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        users_table = dynamodb.create_table(
+            TableName=TEST_USERS_TABLE,
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
             BillingMode='PAY_PER_REQUEST'
         )
         
@@ -60,8 +88,9 @@ def setup_aws_resources(aws_environment):
         handler = importlib.import_module(handler_module_name)
         lambda_handler = handler.lambda_handler
         
-        # Patch handler's table reference to use the mocked table
+        # Patch handler's table references to use the mocked tables
         handler.files_table = table
+        handler.users_table = users_table
         
         yield table, s3, lambda_handler
 
@@ -180,3 +209,313 @@ def test_list_files_only_own_files(aws_environment, setup_aws_resources):
     assert len(body['files']) == 1
     assert body['files'][0]['fileId'] == 'file-own'
     assert body['files'][0]['userId'] == TEST_USER_ID
+
+
+@mock_aws
+def test_list_files_paginates_with_cursor(aws_environment, setup_aws_resources):
+    """Test that limit/cursor walk every file exactly once."""
+    table, _, lambda_handler = setup_aws_resources
+
+    for i in range(5):
+        table.put_item(Item={
+            'userId': TEST_USER_ID,
+            'fileId': f'file-{i}',
+            'fileName': f'document{i}.pdf',
+            's3Key': f'{TEST_USER_ID}/file-{i}/document{i}.pdf'
+        })
+
+    seen = []
+    cursor = None
+    pages = 0
+    while True:
+        event = create_test_event()
+        event['queryStringParameters'] = {'limit': '2'}
+        if cursor:
+            event['queryStringParameters']['cursor'] = cursor
+        response = lambda_handler(event, None)
+
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['count'] == len(body['files'])
+        assert body['count'] <= 2
+        seen.extend(f['fileId'] for f in body['files'])
+        pages += 1
+
+        if not body['hasMore']:
+            assert body['nextCursor'] is None
+            break
+        cursor = body['nextCursor']
+
+    assert pages >= 3
+    assert sorted(seen) == [f'file-{i}' for i in range(5)]
+
+
+@mock_aws
+def test_list_files_rejects_tampered_cursor(aws_environment, setup_aws_resources):
+    """Test that a modified cursor returns 400."""
+    table, _, lambda_handler = setup_aws_resources
+
+    for i in range(3):
+        table.put_item(Item={
+            'userId': TEST_USER_ID,
+            'fileId': f'file-{i}',
+            'fileName': f'document{i}.pdf'
+        })
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'limit': '1'}
+    body = json.loads(lambda_handler(event, None)['body'])
+    payload, signature = body['nextCursor'].split('.')
+
+    event['queryStringParameters']['cursor'] = f'{payload}x.{signature}'
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+    assert 'cursor' in json.loads(response['body'])['error'].lower()
+
+
+@mock_aws
+def test_list_files_rejects_other_users_cursor(aws_environment, setup_aws_resources):
+    """Test that a cursor issued to one user cannot be replayed by another."""
+    table, _, lambda_handler = setup_aws_resources
+
+    other_user_id = 'other-user-456'
+    for i in range(2):
+        table.put_item(Item={
+            'userId': other_user_id,
+            'fileId': f'file-{i}',
+            'fileName': f'document{i}.pdf'
+        })
+
+    other_event = create_test_event()
+    other_event['requestContext']['authorizer']['claims']['sub'] = other_user_id
+    other_event['queryStringParameters'] = {'limit': '1'}
+    cursor = json.loads(lambda_handler(other_event, None)['body'])['nextCursor']
+    assert cursor
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'cursor': cursor}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+
+
+def put_dated_file(table, file_id, content_type, upload_date, status='completed'):
+    """Insert a file item carrying the sort keys upload_file writes."""
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': file_id,
+        'fileName': f'{file_id}.bin',
+        'contentType': content_type,
+        'uploadDate': upload_date,
+        'status': status,
+        'contentTypeDate': f'{content_type}#{upload_date}',
+        'statusDate': f'{status}#{upload_date}'
+    })
+
+
+@mock_aws
+def test_list_files_sorted_newest_first(aws_environment, setup_aws_resources):
+    """Test sort=uploadDate&order=desc returns newest files first."""
+    table, _, lambda_handler = setup_aws_resources
+
+    put_dated_file(table, 'file-a', 'text/plain', '2024-01-02T00:00:00')
+    put_dated_file(table, 'file-b', 'text/plain', '2024-01-03T00:00:00')
+    put_dated_file(table, 'file-c', 'text/plain', '2024-01-01T00:00:00')
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'sort': 'uploadDate', 'order': 'desc'}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert [f['fileId'] for f in body['files']] == ['file-b', 'file-a', 'file-c']
+
+
+@mock_aws
+def test_list_files_filter_by_content_type(aws_environment, setup_aws_resources):
+    """Test contentType filter only returns matching files, by upload date."""
+    table, _, lambda_handler = setup_aws_resources
+
+    put_dated_file(table, 'file-a', 'application/pdf', '2024-01-02T00:00:00')
+    put_dated_file(table, 'file-b', 'text/plain', '2024-01-03T00:00:00')
+    put_dated_file(table, 'file-c', 'application/pdf', '2024-01-01T00:00:00')
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'contentType': 'application/pdf'}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert [f['fileId'] for f in body['files']] == ['file-c', 'file-a']
+
+
+@mock_aws
+def test_list_files_filter_by_status(aws_environment, setup_aws_resources):
+    """Test status filter only returns files in that status."""
+    table, _, lambda_handler = setup_aws_resources
+
+    put_dated_file(table, 'file-a', 'text/plain', '2024-01-02T00:00:00', status='pending')
+    put_dated_file(table, 'file-b', 'text/plain', '2024-01-03T00:00:00')
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'status': 'pending'}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert [f['fileId'] for f in body['files']] == ['file-a']
+
+
+@mock_aws
+def test_list_files_invalid_view_returns_400(aws_environment, setup_aws_resources):
+    """Test unsupported sort and combined filters are rejected."""
+    _, _, lambda_handler = setup_aws_resources
+
+    for params in [
+        {'sort': 'fileName'},
+        {'order': 'sideways'},
+        {'contentType': 'text/plain', 'status': 'pending'}
+    ]:
+        event = create_test_event()
+        event['queryStringParameters'] = params
+        response = lambda_handler(event, None)
+        assert response['statusCode'] == 400
+
+
+@mock_aws
+def test_list_files_cursor_bound_to_view(aws_environment, setup_aws_resources):
+    """Test a cursor from one view cannot be reused on another."""
+    table, _, lambda_handler = setup_aws_resources
+
+    put_dated_file(table, 'file-a', 'text/plain', '2024-01-02T00:00:00')
+    put_dated_file(table, 'file-b', 'text/plain', '2024-01-03T00:00:00')
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'sort': 'uploadDate', 'limit': '1'}
+    cursor = json.loads(lambda_handler(event, None)['body'])['nextCursor']
+
+    event['queryStringParameters'] = {'contentType': 'text/plain', 'cursor': cursor}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+
+    # Resuming in the other direction would skip or repeat files
+    event['queryStringParameters'] = {'sort': 'uploadDate', 'order': 'desc', 'cursor': cursor}
+    assert lambda_handler(event, None)['statusCode'] == 400
+    event['queryStringParameters'] = {'sort': 'uploadDate', 'order': 'ASC', 'cursor': cursor}
+    assert lambda_handler(event, None)['statusCode'] == 200
+
+
+@mock_aws
+def test_list_files_summary_projection_by_default(aws_environment, setup_aws_resources):
+    """Test the default listing only returns the summary attributes."""
+    table, _, lambda_handler = setup_aws_resources
+
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': 'file-1',
+        'fileName': 'document1.pdf',
+        's3Key': f'{TEST_USER_ID}/file-1/document1.pdf',
+        'contentType': 'application/pdf',
+        'uploadDate': '2024-01-01T00:00:00',
+        'status': 'completed',
+        'size': 2048
+    })
+
+    body = json.loads(lambda_handler(create_test_event(), None)['body'])
+    file_item = body['files'][0]
+    assert file_item['fileName'] == 'document1.pdf'
+    assert file_item['size'] == 2048
+    assert file_item['status'] == 'completed'
+    assert 's3Key' not in file_item
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'fields': 'all'}
+    body = json.loads(lambda_handler(event, None)['body'])
+    assert body['files'][0]['s3Key'] == f'{TEST_USER_ID}/file-1/document1.pdf'
+
+
+@mock_aws
+def test_list_files_custom_fields(aws_environment, setup_aws_resources):
+    """Test fields= returns exactly the requested attributes."""
+    table, _, lambda_handler = setup_aws_resources
+
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': 'file-1',
+        'fileName': 'document1.pdf',
+        'contentType': 'application/pdf',
+        'size': 2048
+    })
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'fields': 'fileId,size'}
+    body = json.loads(lambda_handler(event, None)['body'])
+    assert body['files'] == [{'fileId': 'file-1', 'size': 2048}]
+
+    event['queryStringParameters'] = {'fields': 'fileId,bad-name'}
+    response = lambda_handler(event, None)
+    assert response['statusCode'] == 400
+
+
+@mock_aws
+def test_list_files_returns_304_for_unchanged_listing(aws_environment, setup_aws_resources):
+    """Test If-None-Match with the current ETag short-circuits to 304."""
+    table, _, lambda_handler = setup_aws_resources
+
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': 'file-1',
+        'fileName': 'document1.pdf'
+    })
+
+    response = lambda_handler(create_test_event(), None)
+    assert response['statusCode'] == 200
+    etag = response['headers']['ETag']
+
+    event = create_test_event()
+    event['headers'] = {'if-none-match': etag}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 304
+    assert response['body'] == ''
+    assert response['headers']['ETag'] == etag
+
+
+@mock_aws
+def test_list_files_etag_changes_with_listing_version(aws_environment, setup_aws_resources):
+    """Test a listing version bump invalidates the previous ETag."""
+    _, _, lambda_handler = setup_aws_resources
+    users_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_USERS_TABLE)
+
+    etag = lambda_handler(create_test_event(), None)['headers']['ETag']
+
+    users_table.update_item(
+        Key={'userId': TEST_USER_ID},
+        UpdateExpression='ADD listingVersion :one',
+        ExpressionAttributeValues={':one': 1}
+    )
+
+    event = create_test_event()
+    event['headers'] = {'If-None-Match': etag}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] != etag
+
+
+@mock_aws
+def test_list_files_etag_differs_per_view(aws_environment, setup_aws_resources):
+    """Test each view of the same listing version gets its own ETag."""
+    _, _, lambda_handler = setup_aws_resources
+
+    default_etag = lambda_handler(create_test_event(), None)['headers']['ETag']
+
+    event = create_test_event()
+    event['queryStringParameters'] = {'fields': 'all'}
+    event['headers'] = {'If-None-Match': default_etag}
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert response['headers']['ETag'] != default_etag
@@ -105,7 +105,7 @@ def test_resources_list_success(aws_environment, setup_aws_resources):
         'fileName': 'test.pdf',
         's3Key': f'{TEST_USER_ID}/{TEST_FILE_ID}/test.pdf',
         'contentType': 'application/pdf',
-        'fileSize': int(1024)  # Use int instead of letting DynamoDB convert to Decimal
+        'size': int(1024)  # Use int instead of letting DynamoDB convert to Decimal
     })
     
     # Add another file
@@ -115,7 +115,7 @@ def test_resources_list_success(aws_environment, setup_aws_resources):
         'fileName': 'document.txt',
         's3Key': f'{TEST_USER_ID}/file-789/document.txt',
         'contentType': 'text/plain',
-        'fileSize': int(512)  # Use int instead of letting DynamoDB convert to Decimal
+        'fileSize': int(512)  # An older item, from before uploads wrote size
     })
     
     # Call handler with action='resources/list'
@@ -138,6 +138,7 @@ def test_resources_list_success(aws_environment, setup_aws_resources):
     assert test_resource['name'] == 'test.pdf'
     assert test_resource['mimeType'] == 'application/pdf'
     assert test_resource['size'] == 1024
+    assert next(r for r in body['resources'] if r['id'] == 'file-789')['size'] == 512
 
 
 # Test 2: resources/list - empty
@@ -345,3 +346,93 @@ def test_resources_read_s3_not_found(aws_environment, setup_aws_resources):
     body = json.loads(response['body'])
     assert 'error' in body
 
+
+
+# Test 12: resources/list - requested fields only
+def test_resources_list_selected_fields(aws_environment, setup_aws_resources):
+    """Test that resources/list only builds the requested properties."""
+    table, _ = setup_aws_resources
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': TEST_FILE_ID,
+        'fileName': 'test.pdf',
+        's3Key': f'{TEST_USER_ID}/{TEST_FILE_ID}/test.pdf',
+        'contentType': 'application/pdf',
+        'size': 1024
+    })
+
+    event = create_test_event('resources/list')
+    body = json.loads(event['body'])
+    body['fields'] = ['name', 'size']
+    event['body'] = json.dumps(body)
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    resources = json.loads(response['body'])['resources']
+    assert resources == [{'id': TEST_FILE_ID, 'name': 'test.pdf', 'size': 1024}]
+
+
+# Test 13: resources/list - unknown field
+def test_resources_list_invalid_fields(aws_environment, setup_aws_resources):
+    """Test that unknown resource properties are rejected."""
+    event = create_test_event('resources/list')
+    body = json.loads(event['body'])
+    body['fields'] = ['name', 'owner']
+    event['body'] = json.dumps(body)
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
+
+
+# Test 14: resources/list - cursor pagination
+def test_resources_list_paginates_with_cursor(aws_environment, setup_aws_resources, monkeypatch):
+    """Test that resources/list pages through the user's files via nextCursor."""
+    table, _ = setup_aws_resources
+    monkeypatch.setattr(handler, 'RESOURCES_PAGE_SIZE', 2)
+    for i in range(5):
+        table.put_item(Item={
+            'userId': TEST_USER_ID,
+            'fileId': f'file-{i}',
+            'fileName': f'doc-{i}.txt',
+            's3Key': f'{TEST_USER_ID}/file-{i}/doc-{i}.txt',
+            'fileSize': 10
+        })
+    table.put_item(Item={'userId': 'other-user', 'fileId': 'file-x', 'fileName': 'x.txt'})
+
+    seen = []
+    cursor = None
+    for _ in range(5):
+        event = create_test_event('resources/list')
+        body = json.loads(event['body'])
+        body['cursor'] = cursor
+        event['body'] = json.dumps(body)
+        response = lambda_handler(event, None)
+        assert response['statusCode'] == 200
+        result = json.loads(response['body'])
+        seen.extend(r['id'] for r in result['resources'])
+        cursor = result.get('nextCursor')
+        if not cursor:
+            break
+
+    assert seen == [f'file-{i}' for i in range(5)]
+
+
+# Test 15: resources/list - cursor from another user
+def test_resources_list_rejects_foreign_cursor(aws_environment, setup_aws_resources, monkeypatch):
+    """Test that a cursor issued to one user cannot be replayed by another."""
+    table, _ = setup_aws_resources
+    monkeypatch.setattr(handler, 'RESOURCES_PAGE_SIZE', 1)
+    for i in range(2):
+        table.put_item(Item={'userId': 'other-user', 'fileId': f'file-{i}', 'fileName': 'x.txt'})
+
+    other_event = create_test_event('resources/list')
+    other_event['requestContext']['authorizer']['claims']['sub'] = 'other-user'
+    cursor = json.loads(lambda_handler(other_event, None)['body'])['nextCursor']
+
+    event = create_test_event('resources/list')
+    body = json.loads(event['body'])
+    body['cursor'] = cursor
+    event['body'] = json.dumps(body)
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 400
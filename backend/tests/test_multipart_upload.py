@@ -0,0 +1,196 @@
+import pytest
+import json
+import boto3
+from moto import mock_aws
+import os
+import sys
+
+TEST_USER_ID = "test-user-123"
+TEST_BUCKET = "test-bucket"
+TEST_TABLE = "files-test"
+TEST_USERS_TABLE = "users-test"
+MIB = 1024 * 1024
+
+os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['USERS_TABLE_NAME'] = TEST_USERS_TABLE
+os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
+
+
+@pytest.fixture
+def setup_aws_resources():
+    """Create mock DynamoDB tables and S3 bucket."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        table = dynamodb.create_table(
+            TableName=TEST_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'fileId', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'fileId', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        users_table = dynamodb.create_table(
+            TableName=TEST_USERS_TABLE,
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        s3 = boto3.client('s3', region_name='us-west-2')
+        s3.create_bucket(
+            Bucket=TEST_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'us-west-2'}
+        )
+
+        import importlib
+        handler_module_name = 'lambda_functions.multipart_upload.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.files_table = table
+        handler.users_table = users_table
+        handler.s3_client = s3
+
+        yield table, s3, handler.lambda_handler
+
+
+def create_test_event(resource, method, body=None, file_id=None, user_id=TEST_USER_ID):
+    return {
+        'resource': resource,
+        'httpMethod': method,
+        'pathParameters': {'fileId': file_id} if file_id else None,
+        'body': json.dumps(body or {}),
+        'requestContext': {'authorizer': {'claims': {'sub': user_id}}}
+    }
+
+
+def create_upload(lambda_handler, size, file_name='video.mp4'):
+    event = create_test_event('/files/multipart', 'POST', {
+        'fileName': file_name, 'contentType': 'video/mp4', 'size': size
+    })
+    response = lambda_handler(event, None)
+    assert response['statusCode'] == 200
+    return json.loads(response['body'])
+
+
+def test_create_records_upload_state(setup_aws_resources):
+    """Test that creating an upload stores its state on the FilesTable item."""
+    table, _, lambda_handler = setup_aws_resources
+
+    upload = create_upload(lambda_handler, 20 * MIB)
+
+    assert upload['partSize'] == 8 * MIB
+    assert upload['partCount'] == 3
+    item = table.get_item(Key={'userId': TEST_USER_ID, 'fileId': upload['fileId']})['Item']
+    assert item['uploadId'] == upload['uploadId']
+    assert item['status'] == 'pending'
+    assert item['size'] == 20 * MIB
+    assert item['partCount'] == 3
+
+
+def test_part_size_grows_to_stay_under_part_limit(setup_aws_resources):
+    """Test that very large files get a part size that keeps them within 10,000 parts."""
+    _, _, lambda_handler = setup_aws_resources
+
+    upload = create_upload(lambda_handler, 200 * 1024 * MIB)
+
+    assert upload['partCount'] <= 10000
+    assert upload['partSize'] % MIB == 0
+
+
+def test_create_requires_size(setup_aws_resources):
+    """Test that size is required to plan the parts."""
+    _, _, lambda_handler = setup_aws_resources
+    event = create_test_event('/files/multipart', 'POST', {'fileName': 'video.mp4'})
+
+    assert lambda_handler(event, None)['statusCode'] == 400
+
+
+def test_sign_parts_returns_presigned_urls(setup_aws_resources):
+    """Test that a batch of part URLs is issued for the requested parts."""
+    _, _, lambda_handler = setup_aws_resources
+    upload = create_upload(lambda_handler, 20 * MIB)
+
+    event = create_test_event('/files/{fileId}/multipart/parts', 'POST',
+                              {'partNumbers': [3, 1]}, file_id=upload['fileId'])
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    parts = json.loads(response['body'])['parts']
+    assert [p['partNumber'] for p in parts] == [1, 3]
+    assert all(upload['uploadId'] in p['url'] for p in parts)
+
+
+def test_sign_parts_rejects_out_of_range_parts(setup_aws_resources):
+    """Test that part numbers beyond the planned part count are rejected."""
+    _, _, lambda_handler = setup_aws_resources
+    upload = create_upload(lambda_handler, 20 * MIB)
+
+    event = create_test_event('/files/{fileId}/multipart/parts', 'POST',
+                              {'partNumbers': [4]}, file_id=upload['fileId'])
+
+    assert lambda_handler(event, None)['statusCode'] == 400
+
+
+def test_other_user_cannot_sign_parts(setup_aws_resources):
+    """Test that uploads are scoped to their owner."""
+    _, _, lambda_handler = setup_aws_resources
+    upload = create_upload(lambda_handler, 20 * MIB)
+
+    event = create_test_event('/files/{fileId}/multipart/parts', 'POST',
+                              {'partNumbers': [1]}, file_id=upload['fileId'], user_id='other-user')
+
+    assert lambda_handler(event, None)['statusCode'] == 404
+
+
+def test_complete_assembles_object(setup_aws_resources):
+    """Test that completing the upload assembles the object and clears the upload state."""
+    table, s3, lambda_handler = setup_aws_resources
+    upload = create_upload(lambda_handler, 8 * MIB + 10)
+    item = table.get_item(Key={'userId': TEST_USER_ID, 'fileId': upload['fileId']})['Item']
+
+    parts = []
+    for number, data in ((1, b'a' * 8 * MIB), (2, b'b' * 10)):
+        etag = s3.upload_part(Bucket=TEST_BUCKET, Key=item['s3Key'], UploadId=upload['uploadId'],
+                              PartNumber=number, Body=data)['ETag']
+        parts.append({'partNumber': number, 'etag': etag})
+
+    event = create_test_event('/files/{fileId}/multipart/complete', 'POST',
+                              {'parts': parts}, file_id=upload['fileId'])
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert s3.head_object(Bucket=TEST_BUCKET, Key=item['s3Key'])['ContentLength'] == 8 * MIB + 10
+    item = table.get_item(Key={'userId': TEST_USER_ID, 'fileId': upload['fileId']})['Item']
+    assert 'uploadId' not in item
+
+    # The upload can't be completed twice
+    assert lambda_handler(event, None)['statusCode'] == 409
+
+
+def test_complete_requires_every_part(setup_aws_resources):
+    """Test that completing with missing parts is rejected before calling S3."""
+    _, _, lambda_handler = setup_aws_resources
+    upload = create_upload(lambda_handler, 20 * MIB)
+
+    event = create_test_event('/files/{fileId}/multipart/complete', 'POST',
+                              {'parts': [{'partNumber': 1, 'etag': '"x"'}]}, file_id=upload['fileId'])
+
+    assert lambda_handler(event, None)['statusCode'] == 400
+
+
+def test_abort_discards_upload_and_item(setup_aws_resources):
+    """Test that aborting frees the upload and removes the pending item."""
+    table, s3, lambda_handler = setup_aws_resources
+    upload = create_upload(lambda_handler, 20 * MIB)
+
+    event = create_test_event('/files/{fileId}/multipart', 'DELETE', file_id=upload['fileId'])
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    assert 'Item' not in table.get_item(Key={'userId': TEST_USER_ID, 'fileId': upload['fileId']})
+    assert s3.list_multipart_uploads(Bucket=TEST_BUCKET).get('Uploads', []) == []
@@ -0,0 +1,177 @@
+import pytest
+import boto3
+from moto import mock_aws
+from datetime import datetime, timedelta
+import os
+import sys
+
+TEST_BUCKET = "test-bucket"
+TEST_TABLE = "files-test"
+TEST_USERS_TABLE = "users-test"
+TEST_TOMBSTONES_TABLE = "file-tombstones-test"
+
+os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['USERS_TABLE_NAME'] = TEST_USERS_TABLE
+os.environ['TOMBSTONES_TABLE_NAME'] = TEST_TOMBSTONES_TABLE
+os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
+
+
+@pytest.fixture
+def setup_aws_resources(monkeypatch):
+    """Create mock tables (with the sparse pending index) and bucket."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        table = dynamodb.create_table(
+            TableName=TEST_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'fileId', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'fileId', 'AttributeType': 'S'},
+                {'AttributeName': 'pendingShard', 'AttributeType': 'S'},
+                {'AttributeName': 'uploadDate', 'AttributeType': 'S'}
+            ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'pendingShard-uploadDate-index',
+                'KeySchema': [
+                    {'AttributeName': 'pendingShard', 'KeyType': 'HASH'},
+                    {'AttributeName': 'uploadDate', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['s3Key', 'uploadId']}
+            }],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        users_table = dynamodb.create_table(
+            TableName=TEST_USERS_TABLE,
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        tombstones_table = dynamodb.create_table(
+            TableName=TEST_TOMBSTONES_TABLE,
+            KeySchema=[{'AttributeName': 's3Prefix', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 's3Prefix', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        s3 = boto3.client('s3', region_name='us-west-2')
+        s3.create_bucket(
+            Bucket=TEST_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'us-west-2'}
+        )
+
+        import importlib
+        handler_module_name = 'lambda_functions.pending_reaper.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.files_table = table
+        handler.users_table = users_table
+        handler.tombstones_table = tombstones_table
+        handler.s3_client = s3
+        monkeypatch.setattr(handler.time, 'sleep', lambda seconds: None)
+
+        yield table, s3, handler
+
+
+def put_item(table, file_id, hours_old, pending=True, user_id='user-1', **extra):
+    upload_date = (datetime.utcnow() - timedelta(hours=hours_old)).isoformat()
+    item = {
+        'userId': user_id,
+        'fileId': file_id,
+        's3Key': f'{user_id}/{file_id}/file.bin',
+        'uploadDate': upload_date,
+        'status': 'pending' if pending else 'completed',
+        **extra
+    }
+    if pending:
+        item['pendingShard'] = file_id[0]
+    table.put_item(Item=item)
+
+
+def test_reaps_only_stale_pending_items(setup_aws_resources):
+    """Test that stale pending items go, while fresh and completed items stay."""
+    table, _, handler = setup_aws_resources
+    put_item(table, 'a-stale', 72)
+    put_item(table, 'b-stale', 100, user_id='user-2')
+    put_item(table, 'c-fresh', 1)
+    put_item(table, 'd-done', 200, pending=False)
+
+    result = handler.lambda_handler({}, None)
+
+    assert result == {'reaped': 2, 'aborted': 0}
+    remaining = sorted(item['fileId'] for item in table.scan()['Items'])
+    assert remaining == ['c-fresh', 'd-done']
+    dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+    users = dynamodb.Table(TEST_USERS_TABLE)
+    assert users.get_item(Key={'userId': 'user-2'})['Item']['listingVersion'] == 1
+    # Anything a client PUT under a reaped item is left to file_purger
+    tombstones = dynamodb.Table(TEST_TOMBSTONES_TABLE).scan()['Items']
+    assert sorted(t['s3Prefix'] for t in tombstones) == ['user-1/a-stale/', 'user-2/b-stale/']
+
+
+def test_aborts_stale_multipart_uploads(setup_aws_resources):
+    """Test that the incomplete multipart upload behind a stale item is aborted."""
+    table, s3, handler = setup_aws_resources
+    upload = s3.create_multipart_upload(Bucket=TEST_BUCKET, Key='user-1/e-big/file.bin')
+    put_item(table, 'e-big', 72, uploadId=upload['UploadId'])
+
+    result = handler.lambda_handler({}, None)
+
+    assert result == {'reaped': 1, 'aborted': 1}
+    assert s3.list_multipart_uploads(Bucket=TEST_BUCKET).get('Uploads', []) == []
+
+
+def test_respects_per_run_limit(setup_aws_resources, monkeypatch):
+    """Test that a run stops at MAX_ITEMS_PER_RUN and leaves the rest for later."""
+    table, _, handler = setup_aws_resources
+    monkeypatch.setattr(handler, 'MAX_ITEMS_PER_RUN', 3)
+    for i in range(5):
+        put_item(table, f'{i}-stale', 72)
+
+    assert handler.lambda_handler({}, None)['reaped'] == 3
+    assert table.scan()['Count'] == 2
+    assert handler.lambda_handler({}, None)['reaped'] == 2
+
+
+def test_skips_items_completed_since_indexing(setup_aws_resources, monkeypatch):
+    """Test that an item the index still lists as pending is kept once it has completed."""
+    table, _, handler = setup_aws_resources
+    put_item(table, 'a-stale', 72)
+    real_query = handler.files_table.query
+
+    def query_then_complete(**kwargs):
+        response = real_query(**kwargs)
+        table.update_item(Key={'userId': 'user-1', 'fileId': 'a-stale'},
+                          UpdateExpression='REMOVE pendingShard')
+        return response
+
+    monkeypatch.setattr(handler.files_table, 'query', query_then_complete)
+
+    assert handler.lambda_handler({}, None)['reaped'] == 0
+    assert table.scan()['Count'] == 1
+
+
+def test_keeps_items_completed_after_the_recheck(setup_aws_resources, monkeypatch):
+    """Test that an upload finalized between the recheck and the delete is neither deleted nor tombstoned."""
+    table, _, handler = setup_aws_resources
+    put_item(table, 'a-stale', 72)
+    put_item(table, 'b-stale', 72)
+    real_still_pending = handler._still_pending
+
+    def recheck_then_complete(items):
+        pending = real_still_pending(items)
+        table.update_item(Key={'userId': 'user-1', 'fileId': 'a-stale'},
+                          UpdateExpression='SET #status = :done REMOVE pendingShard',
+                          ExpressionAttributeNames={'#status': 'status'},
+                          ExpressionAttributeValues={':done': 'completed'})
+        return pending
+
+    monkeypatch.setattr(handler, '_still_pending', recheck_then_complete)
+
+    assert handler.lambda_handler({}, None)['reaped'] == 1
+    assert [item['fileId'] for item in table.scan()['Items']] == ['a-stale']
+    tombstones = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_TOMBSTONES_TABLE).scan()['Items']
+    assert [t['s3Prefix'] for t in tombstones] == ['user-1/b-stale/']
@@ -1,6 +1,8 @@
 import copy
+import hashlib
 import json
 import os
+import time
 from datetime import datetime, timedelta, timezone
 
 import boto3
@@ -11,6 +13,7 @@ os.environ['FILES_TABLE_NAME'] = 'test-files-table'
 os.environ['SHARED_LINKS_TABLE_NAME'] = 'test-shared-links-table'
 os.environ['SHARE_BASE_URL'] = 'https://api.example.com/test'
 
+import lambda_functions.share_file.handler as share_file_handler  # noqa: E402
 from lambda_functions.share_file.handler import lambda_handler  # noqa: E402
 
 
@@ -34,12 +37,20 @@ def dynamodb_tables():
 
         shared_links_table = dynamodb.create_table(
             TableName='test-shared-links-table',
-            KeySchema=[
-                {'AttributeName': 'linkId', 'KeyType': 'HASH'},
-            ],
+            KeySchema=[{'AttributeName': 'shareToken', 'KeyType': 'HASH'}],
             AttributeDefinitions=[
-                {'AttributeName': 'linkId', 'AttributeType': 'S'},
+                {'AttributeName': 'shareToken', 'AttributeType': 'S'},
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'fileId', 'AttributeType': 'S'}
             ],
+            GlobalSecondaryIndexes=[{
+                'IndexName': 'userId-fileId-index',
+                'KeySchema': [
+                    {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                    {'AttributeName': 'fileId', 'KeyType': 'RANGE'}
+                ],
+                'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': ['createdAt', 'expiresAt']}
+            }],
             BillingMode='PAY_PER_REQUEST',
         )
 
@@ -86,7 +97,7 @@ def test_share_file_success(dynamodb_tables, sample_file_record, valid_event):
     assert 'expiresAt' in body
 
     link_id = body['shareUrl'].split('/')[-1]
-    record = shared_links_table.get_item(Key={'linkId': link_id})
+    record = shared_links_table.get_item(Key={'shareToken': link_id})
     assert 'Item' in record
     assert record['Item']['fileId'] == 'file-456'
     assert record['Item']['userId'] == 'test-user-123'
@@ -151,4 +162,212 @@ def test_share_file_expiration_clamping(dynamodb_tables, sample_file_record, val
     assert lambda_handler(event, None)['statusCode'] == 200
 
     event['body'] = json.dumps({'expirationHours': 1000})
-    assert lambda_handler(event, None)['statusCode'] == 200
\ No newline at end of file
+    assert lambda_handler(event, None)['statusCode'] == 200
+
+def _owner_event(resource, method, path_parameters, user_id='test-user-123'):
+    return {
+        'resource': resource,
+        'httpMethod': method,
+        'requestContext': {'authorizer': {'claims': {'sub': user_id}}},
+        'pathParameters': path_parameters,
+    }
+
+
+def test_list_shares_returns_active_links_for_file(dynamodb_tables, sample_file_record, valid_event):
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+    first = json.loads(lambda_handler(valid_event, None)['body'])['shareUrl'].split('/')[-1]
+    second = json.loads(lambda_handler(valid_event, None)['body'])['shareUrl'].split('/')[-1]
+    shared_links_table.put_item(Item={'shareToken': 'expired', 'fileId': 'file-456', 'userId': 'test-user-123',
+                                      'createdAt': '2020-01-01T00:00:00', 'expiresAt': 1})
+    shared_links_table.put_item(Item={'shareToken': 'other-file', 'fileId': 'file-789', 'userId': 'test-user-123',
+                                      'createdAt': '2020-01-01T00:00:00', 'expiresAt': 4102444800})
+
+    response = lambda_handler(_owner_event('/files/{fileId}/shares', 'GET', {'fileId': 'file-456'}), None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['count'] == 2
+    assert {share['shareToken'] for share in body['shares']} == {first, second}
+    assert all(share['shareUrl'].endswith(share['shareToken']) for share in body['shares'])
+
+
+def test_revoke_share(dynamodb_tables, sample_file_record, valid_event):
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+    token = json.loads(lambda_handler(valid_event, None)['body'])['shareUrl'].split('/')[-1]
+
+    # Another user can't revoke it (and can't tell it exists)
+    response = lambda_handler(_owner_event('/shares/{token}', 'DELETE', {'token': token}, user_id='other-user'), None)
+    assert response['statusCode'] == 404
+    assert 'Item' in shared_links_table.get_item(Key={'shareToken': token})
+
+    response = lambda_handler(_owner_event('/shares/{token}', 'DELETE', {'token': token}), None)
+    assert response['statusCode'] == 200
+    assert 'Item' not in shared_links_table.get_item(Key={'shareToken': token})
+
+    response = lambda_handler(_owner_event('/shares/{token}', 'DELETE', {'token': token}), None)
+    assert response['statusCode'] == 404
+
+
+@pytest.fixture
+def signed_mode(monkeypatch):
+    monkeypatch.setattr(share_file_handler, 'SHARE_TOKEN_MODE', 'signed')
+    monkeypatch.setattr(share_file_handler, 'SHARE_SIGNING_KEYS', {'k1': 'old-secret', 'k2': 'new-secret'})
+    monkeypatch.setattr(share_file_handler, 'SHARE_SIGNING_KEY_ID', 'k2')
+
+
+def test_signed_share_is_not_stored(dynamodb_tables, sample_file_record, valid_event, signed_mode):
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+
+    response = lambda_handler(valid_event, None)
+
+    assert response['statusCode'] == 200
+    token = json.loads(response['body'])['shareUrl'].split('/')[-1]
+    key_id, _, _ = token.split('.')
+    assert key_id == 'k2'
+    claims = share_file_handler._verify_share_token(token)
+    assert claims['k'] == 'test-user-123/file-456/document.pdf'
+    assert claims['n'] == 'document.pdf'
+    # No link record, only the marker telling delete_file the file has signed links
+    items = shared_links_table.scan()['Items']
+    assert [item['shareToken'] for item in items] == ['#signed#test-user-123#file-456']
+    assert items[0]['expiresAt'] == claims['e']
+    assert items[0]['fileId'] == 'file-456'
+
+    # Markers are bookkeeping: not listed, not revocable as links
+    body = json.loads(lambda_handler(_owner_event('/files/{fileId}/shares', 'GET', {'fileId': 'file-456'}), None)['body'])
+    assert body['shares'] == []
+    response = lambda_handler(_owner_event('/shares/{token}', 'DELETE', {'token': items[0]['shareToken']}), None)
+    assert response['statusCode'] == 404
+
+    # Tampered payloads and retired keys don't verify
+    assert share_file_handler._verify_share_token(token[:-2] + 'xx') is None
+    assert share_file_handler._verify_share_token('k9.' + token.split('.', 1)[1]) is None
+
+
+def test_revoke_signed_share(dynamodb_tables, sample_file_record, valid_event, signed_mode):
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+    token = json.loads(lambda_handler(valid_event, None)['body'])['shareUrl'].split('/')[-1]
+    claims = share_file_handler._verify_share_token(token)
+    shard_key = f"#revoked#{hashlib.sha256(claims['i'].encode()).hexdigest()[0]}"
+    shared_links_table.put_item(Item={'shareToken': shard_key, 'revoked': {'old-token': 1}})
+
+    response = lambda_handler(_owner_event('/shares/{token}', 'DELETE', {'token': token}, user_id='other-user'), None)
+    assert response['statusCode'] == 404
+
+    response = lambda_handler(_owner_event('/shares/{token}', 'DELETE', {'token': token}), None)
+    assert response['statusCode'] == 200
+    revoked = shared_links_table.get_item(Key={'shareToken': shard_key})['Item']['revoked']
+    # The new entry lasts as long as the link would have; expired entries are pruned
+    assert revoked == {claims['i']: claims['e']}
+
+
+def test_revocations_invoked_by_other_functions(dynamodb_tables):
+    """delete_file and account_purger invoke share_file directly to revoke deleted files' signed links."""
+    _, shared_links_table = dynamodb_tables
+    until = int(time.time()) + 3600
+
+    assert lambda_handler({'revocations': {'file-456': until}}, None) == {'revoked': 1}
+
+    shard_key = f"#revoked#{hashlib.sha256(b'file-456').hexdigest()[0]}"
+    assert shared_links_table.get_item(Key={'shareToken': shard_key})['Item']['revoked'] == {'file-456': until}
+
+
+def test_share_with_max_downloads(dynamodb_tables, sample_file_record, valid_event, signed_mode):
+    """A download cap is stored on the link (even in signed mode) and reported with its usage."""
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+    event = copy.deepcopy(valid_event)
+    event['body'] = json.dumps({'maxDownloads': 5})
+
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['maxDownloads'] == 5
+    token = body['shareUrl'].split('/')[-1]
+    assert '.' not in token
+    shared_links_table.update_item(
+        Key={'shareToken': token},
+        UpdateExpression='SET downloadCount = :count, lastAccessedAt = :at',
+        ExpressionAttributeValues={':count': 2, ':at': 1700000000}
+    )
+
+    listing = json.loads(lambda_handler(_owner_event('/files/{fileId}/shares', 'GET', {'fileId': 'file-456'}), None)['body'])
+    assert listing['shares'][0]['downloadCount'] == 2
+    assert listing['shares'][0]['maxDownloads'] == 5
+    assert listing['shares'][0]['lastAccessedAt'] == '2023-11-14T22:13:20Z'
+
+    for bad in (0, -1, 'ten', True, 10 ** 7):
+        event['body'] = json.dumps({'maxDownloads': bad})
+        assert lambda_handler(event, None)['statusCode'] == 400
+
+
+def test_share_reuses_live_link(dynamodb_tables, sample_file_record, valid_event):
+    """With reuse, a repeat share returns the existing link instead of writing another."""
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+    event = copy.deepcopy(valid_event)
+    event['body'] = json.dumps({'reuse': True})
+
+    first = json.loads(lambda_handler(event, None)['body'])
+    second = json.loads(lambda_handler(event, None)['body'])
+
+    assert second['shareUrl'] == first['shareUrl']
+    assert second['reused'] is True
+    assert 'reused' not in first
+    assert shared_links_table.scan()['Count'] == 1
+
+    # A different lifetime, or no reuse flag, gets a new link
+    event['body'] = json.dumps({'reuse': True, 'expirationHours': 168})
+    assert json.loads(lambda_handler(event, None)['body'])['shareUrl'] != first['shareUrl']
+    assert json.loads(lambda_handler(valid_event, None)['body'])['shareUrl'] != first['shareUrl']
+    assert shared_links_table.scan()['Count'] == 3
+
+
+def test_share_reuse_skips_capped_and_expired_links(dynamodb_tables, sample_file_record, valid_event):
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+    event = copy.deepcopy(valid_event)
+    event['body'] = json.dumps({'maxDownloads': 3})
+    capped = json.loads(lambda_handler(event, None)['body'])['shareUrl']
+    shared_links_table.put_item(Item={'shareToken': 'old', 'fileId': 'file-456', 'userId': 'test-user-123',
+                                      'createdAt': '2020-01-01T00:00:00', 'expiresAt': 1})
+
+    event['body'] = json.dumps({'reuse': True})
+    body = json.loads(lambda_handler(event, None)['body'])
+
+    assert body['shareUrl'] != capped
+    assert not body['shareUrl'].endswith('/old')
+    assert 'reused' not in body
+
+    # A capped request never reuses, even its own earlier link
+    event['body'] = json.dumps({'reuse': True, 'maxDownloads': 3})
+    assert json.loads(lambda_handler(event, None)['body'])['shareUrl'] != capped
+
+
+def test_share_reuse_skips_links_about_to_expire(dynamodb_tables, sample_file_record, valid_event):
+    """A short link is only reused when it has nearly the whole requested lifetime left."""
+    files_table, shared_links_table = dynamodb_tables
+    files_table.put_item(Item=sample_file_record)
+    now = int(time.time())
+    shared_links_table.put_item(Item={'shareToken': 'dying', 'fileId': 'file-456', 'userId': 'test-user-123',
+                                      'createdAt': '2020-01-01T00:00:00', 'expiresAt': now + 60})
+    event = copy.deepcopy(valid_event)
+    event['body'] = json.dumps({'reuse': True, 'expirationHours': 1})
+
+    body = json.loads(lambda_handler(event, None)['body'])
+
+    assert not body['shareUrl'].endswith('/dying')
+    assert 'reused' not in body
+
+    # A 1-hour link with ~58 minutes left is close enough
+    shared_links_table.put_item(Item={'shareToken': 'fresh', 'fileId': 'file-456', 'userId': 'test-user-123',
+                                      'createdAt': '2020-01-01T00:00:00', 'expiresAt': now + 3480})
+    shared_links_table.delete_item(Key={'shareToken': body['shareUrl'].rsplit('/', 1)[1]})
+    body = json.loads(lambda_handler(event, None)['body'])
+    assert body['shareUrl'].endswith('/fresh')
+    assert body['reused'] is True
@@ -1,4 +1,7 @@
+import base64
 import copy
+import hashlib
+import hmac
 import json
 import os
 import time
@@ -10,9 +13,23 @@ from moto import mock_aws
 os.environ['SHARED_LINKS_TABLE'] = 'test-shared-links-table'
 os.environ['FILE_BUCKET'] = 'test-file-bucket'
 
+import lambda_functions.shared_link.handler as shared_link_handler  # noqa: E402
 from lambda_functions.shared_link.handler import lambda_handler  # noqa: E402
 
 
+@pytest.fixture(autouse=True)
+def empty_link_cache():
+    shared_link_handler._link_cache.clear()
+    shared_link_handler._pending_downloads.clear()
+    shared_link_handler._flushed_at.clear()
+    shared_link_handler._download_leases.clear()
+    yield
+    shared_link_handler._link_cache.clear()
+    shared_link_handler._pending_downloads.clear()
+    shared_link_handler._flushed_at.clear()
+    shared_link_handler._download_leases.clear()
+
+
 @pytest.fixture
 def dynamodb_table():
     with mock_aws():
@@ -142,3 +159,324 @@ def test_shared_link_cors_headers(dynamodb_table):
     assert 'Access-Control-Allow-Headers' in headers
     assert 'Access-Control-Allow-Methods' in headers
 
+
+def _signed_token(claims, key_id='k1', secret='old-secret'):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b'=').decode()
+    signature = hmac.new(secret.encode(), f'{key_id}.{payload}'.encode(), hashlib.sha256).digest()
+    return f"{key_id}.{payload}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode()}"
+
+
+def _revocation_shard(revoked_id):
+    return f"#revoked#{hashlib.sha256(revoked_id.encode()).hexdigest()[0]}"
+
+
+@pytest.fixture
+def signed_mode(monkeypatch):
+    monkeypatch.setattr(shared_link_handler, 'SHARE_TOKEN_MODE', 'signed')
+    monkeypatch.setattr(shared_link_handler, 'SHARE_SIGNING_KEYS', {'k1': 'old-secret', 'k2': 'new-secret'})
+    monkeypatch.setattr(shared_link_handler, '_revocation_cache', {'revoked': {}, 'loadedAt': 0.0})
+
+
+@pytest.fixture
+def signed_claims():
+    return {
+        'u': 'test-user-123',
+        'f': 'file-456',
+        'k': 'test-user/test-file/document.pdf',
+        'n': 'document.pdf',
+        'e': int(time.time()) + 3600,
+        'i': 'token-1',
+    }
+
+
+def test_signed_link_resolves_without_a_share_record(dynamodb_table, s3_bucket, signed_mode, signed_claims):
+    """Tokens signed with the current or a previous key resolve; only the revocation list is read."""
+    for key_id, secret in (('k1', 'old-secret'), ('k2', 'new-secret')):
+        response = lambda_handler({'pathParameters': {'linkId': _signed_token(signed_claims, key_id, secret)}}, None)
+        assert response['statusCode'] == 200
+        body = json.loads(response['body'])
+        assert body['fileName'] == 'document.pdf'
+        assert 'document.pdf' in body['downloadUrl']
+        assert body['expiresAt'] == signed_claims['e']
+
+
+def test_signed_link_rejects_bad_tokens(dynamodb_table, signed_mode, signed_claims):
+    token = _signed_token(signed_claims)
+    key_id, payload, signature = token.split('.')
+    forged = dict(signed_claims, k='someone-else/file/secret.pdf')
+    forged_payload = base64.urlsafe_b64encode(json.dumps(forged).encode()).rstrip(b'=').decode()
+
+    for bad in (f'{key_id}.{forged_payload}.{signature}',
+                _signed_token(signed_claims, key_id='k9', secret='retired'),
+                'k1.not-base64.sig',
+                _signed_token(dict(signed_claims, e=int(time.time()) - 10))):
+        assert lambda_handler({'pathParameters': {'linkId': bad}}, None)['statusCode'] == 404
+
+
+def test_signed_link_honours_revocations(dynamodb_table, s3_bucket, signed_mode, signed_claims):
+    """Links revoked by token ID or by fileId stop resolving once the cache refreshes."""
+    token = _signed_token(signed_claims)
+    other = _signed_token(dict(signed_claims, i='token-2'))
+    assert lambda_handler({'pathParameters': {'linkId': token}}, None)['statusCode'] == 200
+
+    dynamodb_table.put_item(Item={'shareToken': _revocation_shard('token-1'), 'revoked': {'token-1': signed_claims['e']}})
+    shared_link_handler._revocation_cache['loadedAt'] = 0.0
+    shared_link_handler._link_cache.clear()
+    assert lambda_handler({'pathParameters': {'linkId': token}}, None)['statusCode'] == 404
+    assert lambda_handler({'pathParameters': {'linkId': other}}, None)['statusCode'] == 200
+
+    dynamodb_table.put_item(Item={'shareToken': _revocation_shard('file-456'), 'revoked': {'file-456': signed_claims['e']}})
+    shared_link_handler._revocation_cache['loadedAt'] = 0.0
+    shared_link_handler._link_cache.clear()
+    assert lambda_handler({'pathParameters': {'linkId': other}}, None)['statusCode'] == 404
+    # The revocation list and signed-link markers aren't share links
+    assert lambda_handler({'pathParameters': {'linkId': _revocation_shard('file-456')}}, None)['statusCode'] == 404
+    dynamodb_table.put_item(Item={'shareToken': '#signed#test-user-123#file-456', 'userId': 'test-user-123',
+                                  'fileId': 'file-456', 'expiresAt': signed_claims['e']})
+    marker = {'pathParameters': {'linkId': '#signed#test-user-123#file-456'}}
+    assert lambda_handler(marker, None)['statusCode'] == 404
+
+
+def test_signed_link_rejected_when_signed_mode_is_off(dynamodb_table, signed_claims, monkeypatch):
+    monkeypatch.setattr(shared_link_handler, 'SHARE_SIGNING_KEYS', {'k1': 'old-secret'})
+    response = lambda_handler({'pathParameters': {'linkId': _signed_token(signed_claims)}}, None)
+    assert response['statusCode'] == 404
+
+
+class CountingTable:
+    """Wraps the table to count reads."""
+
+    def __init__(self, table):
+        self.table = table
+        self.reads = 0
+
+    def get_item(self, **kwargs):
+        self.reads += 1
+        return self.table.get_item(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+
+def test_hot_link_is_served_from_cache(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    """Repeat hits reuse the cached record and presigned URL without reading the table."""
+    dynamodb_table.put_item(Item=valid_share_record)
+    counting = CountingTable(dynamodb_table)
+    monkeypatch.setattr(shared_link_handler, 'shared_links_table', counting)
+    hits_before = shared_link_handler.cache_stats['hits']
+
+    event = {'pathParameters': {'linkId': 'valid-link-123'}}
+    first = lambda_handler(event, None)
+    second = lambda_handler(event, None)
+
+    assert first['headers']['X-Cache'] == 'Miss'
+    assert second['headers']['X-Cache'] == 'Hit'
+    assert json.loads(second['body'])['downloadUrl'] == json.loads(first['body'])['downloadUrl']
+    assert counting.reads == 1
+    assert shared_link_handler.cache_stats['hits'] == hits_before + 1
+
+
+def test_missing_link_is_negatively_cached(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    """Probes for an unknown token hit the table once until the negative entry expires."""
+    counting = CountingTable(dynamodb_table)
+    monkeypatch.setattr(shared_link_handler, 'shared_links_table', counting)
+    event = {'pathParameters': {'linkId': 'valid-link-123'}}
+
+    for _ in range(3):
+        assert lambda_handler(event, None)['statusCode'] == 404
+    assert counting.reads == 1
+
+    dynamodb_table.put_item(Item=valid_share_record)
+    later = time.time() + shared_link_handler.NOT_FOUND_CACHE_SECONDS + 1
+    monkeypatch.setattr(shared_link_handler.time, 'time', lambda: later)
+    assert lambda_handler(event, None)['statusCode'] == 200
+    assert counting.reads == 2
+
+
+def test_cached_link_does_not_outlive_its_expiry(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    record = dict(valid_share_record, expiresAt=int(time.time()) + 5)
+    dynamodb_table.put_item(Item=record)
+    event = {'pathParameters': {'linkId': 'valid-link-123'}}
+    assert lambda_handler(event, None)['statusCode'] == 200
+
+    later = time.time() + 6
+    monkeypatch.setattr(shared_link_handler.time, 'time', lambda: later)
+    response = lambda_handler(event, None)
+    assert response['statusCode'] == 404
+    assert 'expired' in json.loads(response['body'])['error'].lower()
+
+
+def test_cache_evicts_least_recently_used(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    monkeypatch.setattr(shared_link_handler, 'LINK_CACHE_SIZE', 2)
+    for token in ('a', 'b', 'c'):
+        dynamodb_table.put_item(Item=dict(valid_share_record, shareToken=token))
+
+    for token in ('a', 'b', 'a', 'c'):
+        lambda_handler({'pathParameters': {'linkId': token}}, None)
+
+    assert list(shared_link_handler._link_cache) == ['a', 'c']
+
+
+def test_redirect_mode_by_query_parameter(dynamodb_table, s3_bucket, valid_share_record):
+    """?redirect=true answers with a 302 cacheable for the rest of the URL's lifetime."""
+    dynamodb_table.put_item(Item=valid_share_record)
+    event = {'pathParameters': {'linkId': 'valid-link-123'}, 'queryStringParameters': {'redirect': 'true'}}
+
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 302
+    assert 'document.pdf' in response['headers']['Location']
+    assert response['headers']['Cache-Control'] == 'public, max-age=270'
+    assert response['body'] == ''
+
+
+def test_redirect_from_cache_shortens_max_age(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    """A redirect served from the cache only advertises the URL's remaining lifetime."""
+    dynamodb_table.put_item(Item=valid_share_record)
+    event = {'pathParameters': {'linkId': 'valid-link-123'}, 'headers': {'Accept': 'text/html,application/xhtml+xml'}}
+    location = lambda_handler(event, None)['headers']['Location']
+
+    later = time.time() + 20
+    monkeypatch.setattr(shared_link_handler.time, 'time', lambda: later)
+    response = lambda_handler(event, None)
+
+    assert response['headers']['X-Cache'] == 'Hit'
+    assert response['headers']['Location'] == location
+    assert response['headers']['Cache-Control'] in ('public, max-age=249', 'public, max-age=250')
+
+
+def test_json_stays_the_default(dynamodb_table, s3_bucket, valid_share_record):
+    """API clients asking for JSON, or sending no Accept header, still get the JSON body."""
+    dynamodb_table.put_item(Item=valid_share_record)
+    for event in ({'pathParameters': {'linkId': 'valid-link-123'}, 'headers': {'accept': 'application/json'}},
+                  {'pathParameters': {'linkId': 'valid-link-123'}, 'queryStringParameters': {'redirect': 'false'},
+                   'headers': {'Accept': 'text/html'}}):
+        response = lambda_handler(event, None)
+        assert response['statusCode'] == 200
+        assert 'downloadUrl' in json.loads(response['body'])
+
+
+def test_redirect_mode_missing_link_is_404(dynamodb_table):
+    event = {'pathParameters': {'linkId': 'missing'}, 'queryStringParameters': {'redirect': '1'}}
+    assert lambda_handler(event, None)['statusCode'] == 404
+
+
+def test_downloads_are_counted_in_batches(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    """A link's first hit is written at once; later hits are one increment per link when the interval passes."""
+    dynamodb_table.put_item(Item=valid_share_record)
+    event = {'pathParameters': {'linkId': 'valid-link-123'}}
+    now = time.time()
+    monkeypatch.setattr(shared_link_handler.time, 'time', lambda: now)
+
+    assert lambda_handler(event, None)['statusCode'] == 200
+    # A link hit only once still gets its count
+    assert dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount'] == 1
+    for _ in range(2):
+        assert lambda_handler(event, None)['statusCode'] == 200
+    assert dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount'] == 1
+
+    later = now + shared_link_handler.METER_FLUSH_SECONDS
+    monkeypatch.setattr(shared_link_handler.time, 'time', lambda: later)
+    lambda_handler(event, None)
+
+    record = dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']
+    assert record['downloadCount'] == 4
+    assert record['lastAccessedAt'] == int(later)
+
+
+def test_full_download_buffer_is_flushed_early(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    """Reaching METER_FLUSH_HITS buffered hits flushes before the interval is up."""
+    dynamodb_table.put_item(Item=valid_share_record)
+    event = {'pathParameters': {'linkId': 'valid-link-123'}}
+    now = time.time()
+    monkeypatch.setattr(shared_link_handler.time, 'time', lambda: now)
+    monkeypatch.setattr(shared_link_handler, 'METER_FLUSH_HITS', 3)
+
+    counts = []
+    for _ in range(7):
+        lambda_handler(event, None)
+        counts.append(int(dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount']))
+
+    assert counts == [1, 1, 1, 4, 4, 4, 7]
+
+
+def test_max_downloads_is_enforced_near_the_cap(dynamodb_table, s3_bucket, valid_share_record):
+    """Every hit on a capped link is a conditional increment, so the cap is exact."""
+    dynamodb_table.put_item(Item=dict(valid_share_record, maxDownloads=3))
+    event = {'pathParameters': {'linkId': 'valid-link-123'}, 'queryStringParameters': {'redirect': 'true'}}
+
+    for expected in (1, 2, 3):
+        response = lambda_handler(event, None)
+        assert response['statusCode'] == 302
+        # A capped link's redirect mustn't be replayed by a browser or CDN
+        assert response['headers']['Cache-Control'] == 'no-store'
+        assert dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount'] == expected
+
+    response = lambda_handler(event, None)
+    assert response['statusCode'] == 404
+    assert 'limit' in json.loads(response['body'])['error']
+    assert dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount'] == 3
+
+
+def test_cap_holds_across_flushes_and_containers(dynamodb_table, s3_bucket, valid_share_record, monkeypatch):
+    """A cached resolution spanning several flush intervals, plus another container's hits, never passes the cap."""
+    dynamodb_table.put_item(Item=dict(valid_share_record, maxDownloads=30))
+    event = {'pathParameters': {'linkId': 'valid-link-123'}}
+    clock = [time.time()]
+    monkeypatch.setattr(shared_link_handler.time, 'time', lambda: clock[0])
+
+    statuses = []
+    for second in range(25):
+        clock[0] += 1
+        if second == 12:
+            # Another container serves five downloads of the same link
+            dynamodb_table.update_item(
+                Key={'shareToken': 'valid-link-123'},
+                UpdateExpression='ADD downloadCount :n',
+                ExpressionAttributeValues={':n': 5}
+            )
+        statuses += [lambda_handler(event, None)['statusCode'] for _ in range(2)]
+
+    assert statuses.count(200) == 25
+    assert statuses[25:] == [404] * 25
+    assert dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount'] == 30
+    assert shared_link_handler._pending_downloads == {}
+
+
+def test_capped_link_far_from_its_cap_claims_downloads_in_blocks(dynamodb_table, s3_bucket, valid_share_record,
+                                                                 monkeypatch):
+    """Far from the cap, one conditional write covers METER_LEASE_SIZE downloads; the cap itself stays exact."""
+    dynamodb_table.put_item(Item=dict(valid_share_record, maxDownloads=120))
+    event = {'pathParameters': {'linkId': 'valid-link-123'}}
+    claims = []
+    real_update_item = shared_link_handler.shared_links_table.update_item
+
+    def recording_update_item(**kwargs):
+        if 'ConditionExpression' in kwargs and ':below' in kwargs['ExpressionAttributeValues']:
+            claims.append(kwargs['ExpressionAttributeValues'][':count'])
+        return real_update_item(**kwargs)
+
+    monkeypatch.setattr(shared_link_handler.shared_links_table, 'update_item', recording_update_item)
+
+    statuses = [lambda_handler(event, None)['statusCode'] for _ in range(20)]
+    assert statuses == [200] * 20
+    assert claims == [10, 10]
+    assert dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount'] == 20
+
+    statuses = [lambda_handler(event, None)['statusCode'] for _ in range(130)]
+
+    # Within METER_LEASE_HEADROOM of the cap every download is claimed on its own
+    assert statuses.count(200) == 100
+    assert dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})['Item']['downloadCount'] == 120
+
+
+def test_revoked_link_counts_are_dropped(dynamodb_table, s3_bucket, valid_share_record):
+    """Flushing counts for a link deleted in the meantime doesn't recreate it."""
+    dynamodb_table.put_item(Item=valid_share_record)
+    lambda_handler({'pathParameters': {'linkId': 'valid-link-123'}}, None)
+    dynamodb_table.delete_item(Key={'shareToken': 'valid-link-123'})
+
+    shared_link_handler._flush_downloads(time.time(), force=True)
+
+    assert 'Item' not in dynamodb_table.get_item(Key={'shareToken': 'valid-link-123'})
+    assert shared_link_handler._pending_downloads == {}
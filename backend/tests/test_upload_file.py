@@ -8,9 +8,13 @@ import sys
 TEST_USER_ID = "test-user-123"
 TEST_BUCKET = "test-bucket"
 TEST_TABLE = "files-test"
+TEST_USERS_TABLE = "users-test"
+TEST_BLOBS_TABLE = "file-blobs-test"
 
 # Set environment variables
 os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['USERS_TABLE_NAME'] = TEST_USERS_TABLE
+os.environ['BLOBS_TABLE_NAME'] = TEST_BLOBS_TABLE
 os.environ['FILE_BUCKET_NAME'] = TEST_BUCKET
 os.environ['ENVIRONMENT'] = 'test'
 
@@ -22,6 +26,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lambda_functio
 def aws_environment(monkeypatch):
     """Set up environment variables."""
     monkeypatch.setenv('FILES_TABLE_NAME', TEST_TABLE)
+    monkeypatch.setenv('USERS_TABLE_NAME', TEST_USERS_TABLE)
     monkeypatch.setenv('FILE_BUCKET_NAME', TEST_BUCKET)
     monkeypatch.setenv('ENVIRONMENT', 'test')
 
@@ -45,6 +50,25 @@ def setup_aws_resources(aws_environment):
             BillingMode='PAY_PER_REQUEST'
         )
         
+        users_table = dynamodb.create_table(
+            TableName=TEST_USERS_TABLE,
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        blobs_table = dynamodb.create_table(
+            TableName=TEST_BLOBS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'sha256', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'sha256', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
         # Create S3 bucket
         s3 = boto3.client('s3', region_name='us-west-2')
         s3.create_bucket(
@@ -60,8 +84,10 @@ def setup_aws_resources(aws_environment):
         handler = importlib.import_module(handler_module_name)
         lambda_handler = handler.lambda_handler
         
-        # Patch handler's table reference to use the mocked table
+        # Patch handler's table references to use the mocked tables
         handler.files_table = table
+        handler.users_table = users_table
+        handler.blobs_table = blobs_table
         
         yield table, s3, lambda_handler
 
@@ -168,3 +194,156 @@ def test_upload_creates_dynamodb_entry(aws_environment, setup_aws_resources):
     assert 's3Key' in item
     assert TEST_USER_ID in item['s3Key']
     assert file_id in item['s3Key']
+
+
+@mock_aws
+def test_upload_bumps_listing_version(aws_environment, setup_aws_resources):
+    """Test that each upload increments the user's listing version."""
+    _, _, lambda_handler = setup_aws_resources
+    users_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_USERS_TABLE)
+
+    lambda_handler(create_test_event('first.pdf'), None)
+    lambda_handler(create_test_event('second.pdf'), None)
+
+    item = users_table.get_item(Key={'userId': TEST_USER_ID})['Item']
+    assert item['listingVersion'] == 2
+
+
+def create_batch_event(files):
+    """Create a POST /files/batch event with JWT context."""
+    return {
+        'resource': '/files/batch',
+        'requestContext': {'authorizer': {'claims': {'sub': TEST_USER_ID}}},
+        'body': json.dumps({'files': files})
+    }
+
+
+@mock_aws
+def test_batch_upload_issues_urls_and_items(aws_environment, setup_aws_resources):
+    """Test that a batch request writes every item and returns every URL."""
+    table, _, lambda_handler = setup_aws_resources
+    files = [{'fileName': f'scan-{i}.pdf', 'contentType': 'application/pdf', 'size': i} for i in range(60)]
+
+    response = lambda_handler(create_batch_event(files), None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['failed'] == []
+    assert [f['fileName'] for f in body['files']] == [f['fileName'] for f in files]
+    assert all('uploadUrl' in f for f in body['files'])
+    assert table.scan()['Count'] == 60
+
+    users_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_USERS_TABLE)
+    assert users_table.get_item(Key={'userId': TEST_USER_ID})['Item']['listingVersion'] == 1
+
+
+@mock_aws
+def test_batch_upload_retries_unprocessed_items(aws_environment, setup_aws_resources, monkeypatch):
+    """Test that unprocessed puts are retried until they are written."""
+    table, _, lambda_handler = setup_aws_resources
+    import lambda_functions.upload_file.handler as handler
+    monkeypatch.setattr(handler.time, 'sleep', lambda seconds: None)
+
+    client = table.meta.client
+    real_batch_write = client.batch_write_item
+    calls = []
+
+    def flaky_batch_write(RequestItems):
+        calls.append(RequestItems)
+        requests = RequestItems[TEST_TABLE]
+        if len(calls) == 1:
+            # Write all but the last put and hand that one back as unprocessed
+            real_batch_write(RequestItems={TEST_TABLE: requests[:-1]})
+            return {'UnprocessedItems': {TEST_TABLE: requests[-1:]}}
+        return real_batch_write(RequestItems=RequestItems)
+
+    monkeypatch.setattr(client, 'batch_write_item', flaky_batch_write)
+
+    response = lambda_handler(create_batch_event([{'fileName': 'a.txt'}, {'fileName': 'b.txt'}]), None)
+
+    body = json.loads(response['body'])
+    assert len(calls) == 2
+    assert len(calls[1][TEST_TABLE]) == 1
+    assert body['failed'] == []
+    assert table.scan()['Count'] == 2
+
+
+@mock_aws
+def test_batch_upload_rejects_missing_filename(aws_environment, setup_aws_resources):
+    """Test that every descriptor needs a fileName."""
+    table, _, lambda_handler = setup_aws_resources
+
+    response = lambda_handler(create_batch_event([{'fileName': 'a.txt'}, {'size': 3}]), None)
+
+    assert response['statusCode'] == 400
+    assert table.scan()['Count'] == 0
+
+
+@mock_aws
+def test_upload_with_sha256_miss_presigns_checksum(aws_environment, setup_aws_resources):
+    """Test that new content gets a checksum-bound upload URL and records its digest."""
+    table, _, lambda_handler = setup_aws_resources
+    event = create_test_event('report.pdf')
+    event['body'] = json.dumps({'fileName': 'report.pdf', 'sha256': 'AB' * 32})
+
+    response = lambda_handler(event, None)
+
+    body = json.loads(response['body'])
+    assert 'checksum-sha256' in body['uploadUrl']
+    item = table.get_item(Key={'userId': TEST_USER_ID, 'fileId': body['fileId']})['Item']
+    assert item['sha256'] == 'ab' * 32
+    assert item['status'] == 'pending'
+    assert item['pendingShard'] == body['fileId'][0]
+
+
+@mock_aws
+def test_upload_with_sha256_hit_skips_upload(aws_environment, setup_aws_resources):
+    """Test that already-stored content is deduplicated onto the existing object."""
+    table, _, lambda_handler = setup_aws_resources
+    blobs_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_BLOBS_TABLE)
+    sha256 = 'ab' * 32
+    blobs_table.put_item(Item={
+        'userId': TEST_USER_ID, 'sha256': sha256,
+        's3Key': f'{TEST_USER_ID}/original/report.pdf', 'size': 2048, 'refCount': 1
+    })
+    event = create_test_event('copy.pdf')
+    event['body'] = json.dumps({'fileName': 'copy.pdf', 'sha256': sha256})
+
+    response = lambda_handler(event, None)
+
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert body['deduplicated'] is True
+    assert body['uploadUrl'] is None
+    item = table.get_item(Key={'userId': TEST_USER_ID, 'fileId': body['fileId']})['Item']
+    assert item['s3Key'] == f'{TEST_USER_ID}/original/report.pdf'
+    assert item['fileName'] == 'copy.pdf'
+    assert item['status'] == 'completed'
+    assert 'pendingShard' not in item
+    assert item['size'] == 2048
+    assert blobs_table.get_item(Key={'userId': TEST_USER_ID, 'sha256': sha256})['Item']['refCount'] == 2
+
+
+@mock_aws
+def test_upload_rejects_malformed_sha256(aws_environment, setup_aws_resources):
+    """Test that sha256 must be a hex digest."""
+    _, _, lambda_handler = setup_aws_resources
+    event = create_test_event('report.pdf')
+    event['body'] = json.dumps({'fileName': 'report.pdf', 'sha256': 'not-a-digest'})
+
+    assert lambda_handler(event, None)['statusCode'] == 400
+
+
+@mock_aws
+def test_upload_rejects_invalid_size(aws_environment, setup_aws_resources):
+    """Test that size, when given, must be a non-negative integer."""
+    table, _, lambda_handler = setup_aws_resources
+
+    for size in ('12', -1, 1.5, True):
+        event = create_test_event('report.pdf')
+        event['body'] = json.dumps({'fileName': 'report.pdf', 'size': size})
+        assert lambda_handler(event, None)['statusCode'] == 400
+
+    response = lambda_handler(create_batch_event([{'fileName': 'a.txt', 'size': 3}, {'fileName': 'b.txt', 'size': 'x'}]), None)
+    assert response['statusCode'] == 400
+    assert table.scan()['Count'] == 0
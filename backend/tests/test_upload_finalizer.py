@@ -0,0 +1,208 @@
+import pytest
+import base64
+import hashlib
+import boto3
+from moto import mock_aws
+import os
+import sys
+
+TEST_USER_ID = "test-user-123"
+TEST_TABLE = "files-test"
+TEST_BUCKET = "test-bucket"
+TEST_USERS_TABLE = "users-test"
+TEST_BLOBS_TABLE = "file-blobs-test"
+
+os.environ['FILES_TABLE_NAME'] = TEST_TABLE
+os.environ['USERS_TABLE_NAME'] = TEST_USERS_TABLE
+os.environ['BLOBS_TABLE_NAME'] = TEST_BLOBS_TABLE
+
+
+@pytest.fixture
+def setup_aws_resources():
+    """Create mock files and users tables."""
+    with mock_aws():
+        dynamodb = boto3.resource('dynamodb', region_name='us-west-2')
+        table = dynamodb.create_table(
+            TableName=TEST_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'fileId', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'fileId', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        users_table = dynamodb.create_table(
+            TableName=TEST_USERS_TABLE,
+            KeySchema=[{'AttributeName': 'userId', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'userId', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        blobs_table = dynamodb.create_table(
+            TableName=TEST_BLOBS_TABLE,
+            KeySchema=[
+                {'AttributeName': 'userId', 'KeyType': 'HASH'},
+                {'AttributeName': 'sha256', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'userId', 'AttributeType': 'S'},
+                {'AttributeName': 'sha256', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+
+        s3 = boto3.client('s3', region_name='us-west-2')
+        s3.create_bucket(
+            Bucket=TEST_BUCKET,
+            CreateBucketConfiguration={'LocationConstraint': 'us-west-2'}
+        )
+
+        import importlib
+        handler_module_name = 'lambda_functions.upload_finalizer.handler'
+        if handler_module_name in sys.modules:
+            del sys.modules[handler_module_name]
+        handler = importlib.import_module(handler_module_name)
+        handler.files_table = table
+        handler.users_table = users_table
+        handler.blobs_table = blobs_table
+        handler.s3_client = s3
+
+        yield table, users_table, handler.lambda_handler
+
+
+def put_pending(table, file_id, file_name='report.pdf'):
+    table.put_item(Item={
+        'userId': TEST_USER_ID,
+        'fileId': file_id,
+        'fileName': file_name,
+        's3Key': f'{TEST_USER_ID}/{file_id}/{file_name}',
+        'uploadDate': '2024-01-01T00:00:00',
+        'status': 'pending',
+        'statusDate': 'pending#2024-01-01T00:00:00',
+        'pendingShard': file_id[0]
+    })
+
+
+def s3_record(file_id, size=2048, etag='abc123', file_name='report.pdf'):
+    return {
+        'eventName': 'ObjectCreated:Put',
+        'eventTime': '2024-01-01T00:05:00.000Z',
+        's3': {
+            'bucket': {'name': TEST_BUCKET},
+            'object': {
+                'key': f'{TEST_USER_ID}/{file_id}/{file_name}',
+                'size': size,
+                'eTag': etag,
+                'versionId': 'v1'
+            }
+        }
+    }
+
+
+def test_finalizes_pending_uploads(setup_aws_resources):
+    """Test that every object in the batch completes its item."""
+    table, users_table, lambda_handler = setup_aws_resources
+    put_pending(table, 'file-1')
+    put_pending(table, 'file-2', 'my+photo.png')
+
+    result = lambda_handler({'Records': [s3_record('file-1'), s3_record('file-2', 10, 'def456', 'my%2Bphoto.png')]}, None)
+
+    assert result == {'finalized': 2, 'skipped': 0}
+    item = table.get_item(Key={'userId': TEST_USER_ID, 'fileId': 'file-1'})['Item']
+    assert item['status'] == 'completed'
+    assert item['statusDate'] == 'completed#2024-01-01T00:00:00'
+    assert item['size'] == 2048
+    assert item['etag'] == 'abc123'
+    assert item['versionId'] == 'v1'
+    assert item['completedAt'] == '2024-01-01T00:05:00'
+    assert 'pendingShard' not in item
+    assert users_table.get_item(Key={'userId': TEST_USER_ID})['Item']['listingVersion'] == 2
+
+
+def test_redelivered_event_is_skipped(setup_aws_resources):
+    """Test that a redelivered notification doesn't bump the listing version again."""
+    table, users_table, lambda_handler = setup_aws_resources
+    put_pending(table, 'file-1')
+
+    lambda_handler({'Records': [s3_record('file-1')]}, None)
+    result = lambda_handler({'Records': [s3_record('file-1')]}, None)
+
+    assert result == {'finalized': 0, 'skipped': 1}
+    assert users_table.get_item(Key={'userId': TEST_USER_ID})['Item']['listingVersion'] == 1
+
+
+def test_objects_without_items_are_skipped(setup_aws_resources):
+    """Test that objects whose item was deleted, or foreign keys, are ignored."""
+    table, _, lambda_handler = setup_aws_resources
+    foreign = s3_record('file-1')
+    foreign['s3']['object']['key'] = 'lambda-functions/code.zip'
+
+    result = lambda_handler({'Records': [s3_record('missing'), foreign]}, None)
+
+    assert result == {'finalized': 0, 'skipped': 1}
+    assert table.scan()['Count'] == 0
+
+
+def test_eventbridge_object_created(setup_aws_resources):
+    """Test that EventBridge 'Object Created' events are handled too."""
+    table, _, lambda_handler = setup_aws_resources
+    put_pending(table, 'file-1')
+
+    event = {
+        'detail-type': 'Object Created',
+        'source': 'aws.s3',
+        'time': '2024-01-01T00:05:00Z',
+        'detail': {'object': {'key': f'{TEST_USER_ID}/file-1/report.pdf', 'size': 99, 'etag': 'e1'}}
+    }
+    result = lambda_handler(event, None)
+
+    assert result == {'finalized': 1, 'skipped': 0}
+    item = table.get_item(Key={'userId': TEST_USER_ID, 'fileId': 'file-1'})['Item']
+    assert item['size'] == 99
+    assert item['completedAt'] == '2024-01-01T00:05:00'
+
+
+def test_verified_sha256_registers_blob(setup_aws_resources, monkeypatch):
+    """Test that an upload whose checksum S3 verified becomes the user's blob for that digest."""
+    table, _, lambda_handler = setup_aws_resources
+    blobs_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_BLOBS_TABLE)
+    s3 = boto3.client('s3', region_name='us-west-2')
+    content = b'quarterly report'
+    digest = hashlib.sha256(content)
+
+    # moto doesn't echo stored checksums back, so report the one S3 would
+    handler = sys.modules['lambda_functions.upload_finalizer.handler']
+    real_head_object = handler.s3_client.head_object
+    monkeypatch.setattr(handler.s3_client, 'head_object', lambda **kwargs: {
+        **real_head_object(**kwargs), 'ChecksumSHA256': base64.b64encode(digest.digest()).decode()
+    })
+
+    put_pending(table, 'file-1')
+    table.update_item(Key={'userId': TEST_USER_ID, 'fileId': 'file-1'},
+                      UpdateExpression='SET sha256 = :h', ExpressionAttributeValues={':h': digest.hexdigest()})
+    s3.put_object(Bucket=TEST_BUCKET, Key=f'{TEST_USER_ID}/file-1/report.pdf', Body=content,
+                  ChecksumSHA256=base64.b64encode(digest.digest()).decode())
+
+    lambda_handler({'Records': [s3_record('file-1', size=len(content))]}, None)
+
+    blob = blobs_table.get_item(Key={'userId': TEST_USER_ID, 'sha256': digest.hexdigest()})['Item']
+    assert blob['s3Key'] == f'{TEST_USER_ID}/file-1/report.pdf'
+    assert blob['refCount'] == 1
+
+
+def test_unverified_sha256_is_not_registered(setup_aws_resources):
+    """Test that a claimed digest without a matching S3 checksum is never trusted."""
+    table, _, lambda_handler = setup_aws_resources
+    blobs_table = boto3.resource('dynamodb', region_name='us-west-2').Table(TEST_BLOBS_TABLE)
+    s3 = boto3.client('s3', region_name='us-west-2')
+
+    put_pending(table, 'file-1')
+    table.update_item(Key={'userId': TEST_USER_ID, 'fileId': 'file-1'},
+                      UpdateExpression='SET sha256 = :h', ExpressionAttributeValues={':h': 'a' * 64})
+    s3.put_object(Bucket=TEST_BUCKET, Key=f'{TEST_USER_ID}/file-1/report.pdf', Body=b'something else')
+
+    lambda_handler({'Records': [s3_record('file-1')]}, None)
+
+    assert blobs_table.scan()['Count'] == 0
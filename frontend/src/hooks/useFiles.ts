@@ -1,22 +1,41 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import FileService, { FileMetadata } from '../services/fileService';
 import { ApiClientError } from '../services/api';
 
 /**
  * Hook to manage file list with loading and error states
+ * The first page is shown as soon as it arrives; later pages stream in behind it
  */
 export function useFileList() {
   const [files, setFiles] = useState<FileMetadata[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [error, setError] = useState<string | null>(null);
+  // Incremented on every load so pages from a superseded load are dropped
+  const loadGeneration = useRef<number>(0);
 
   const loadFiles = useCallback(async () => {
+    const generation = ++loadGeneration.current;
+    const isCurrent = () => generation === loadGeneration.current;
+
     try {
       setLoading(true);
       setError(null);
-      const filesData = await FileService.listFiles();
-      setFiles(filesData);
+
+      let page = await FileService.listFilesPage();
+      if (!isCurrent()) return;
+      setFiles(page.files);
+      setLoading(false);
+
+      while (page.hasMore && page.nextCursor) {
+        setLoadingMore(true);
+        page = await FileService.listFilesPage(page.nextCursor);
+        if (!isCurrent()) return;
+        const pageFiles = page.files;
+        setFiles((prev) => [...prev, ...pageFiles]);
+      }
     } catch (err) {
+      if (!isCurrent()) return;
       const errorMessage =
         err instanceof ApiClientError
           ? err.message
@@ -24,7 +43,10 @@ export function useFileList() {
       setError(errorMessage);
       console.error('Error loading files:', err);
     } finally {
-      setLoading(false);
+      if (isCurrent()) {
+        setLoading(false);
+        setLoadingMore(false);
+      }
     }
   }, []);
 
@@ -35,6 +57,7 @@ export function useFileList() {
   return {
     files,
     loading,
+    loadingMore,
     error,
     refetch: loadFiles,
   };
@@ -249,6 +272,7 @@ export function useFileOperations() {
     // File list
     files: fileList.files,
     loading: fileList.loading,
+    loadingMore: fileList.loadingMore,
     error: fileList.error,
     refetch: fileList.refetch,
 
@@ -156,7 +156,8 @@ export async function uploadToS3(
   presignedUrl: string,
   file: File,
   contentType: string,
-  onProgress?: (progress: number) => void
+  onProgress?: (progress: number) => void,
+  headers: Record<string, string> = {}
 ): Promise<void> {
   return new Promise((resolve, reject) => {
     const xhr = new XMLHttpRequest();
@@ -194,8 +195,55 @@ export async function uploadToS3(
 
     xhr.open('PUT', presignedUrl);
     xhr.setRequestHeader('Content-Type', contentType);
+    Object.keys(headers).forEach((name) => xhr.setRequestHeader(name, headers[name]));
     xhr.send(file);
   });
 }
 
+/**
+ * Upload one multipart part to S3 using a presigned upload_part URL
+ * Resolves with the part's ETag, which is needed to complete the upload
+ * (the bucket's CORS configuration exposes the ETag header)
+ */
+export async function uploadPartToS3(
+  presignedUrl: string,
+  part: Blob,
+  onProgress?: (loadedBytes: number) => void
+): Promise<string> {
+  return new Promise((resolve, reject) => {
+    const xhr = new XMLHttpRequest();
+
+    if (onProgress) {
+      xhr.upload.addEventListener('progress', (event) => {
+        onProgress(event.loaded);
+      });
+    }
+
+    xhr.addEventListener('load', () => {
+      const etag = xhr.getResponseHeader('ETag');
+      if (xhr.status >= 200 && xhr.status < 300 && etag) {
+        resolve(etag);
+      } else {
+        reject(
+          new ApiClientError(
+            `S3 part upload failed: ${xhr.statusText || 'missing ETag'}`,
+            xhr.status
+          )
+        );
+      }
+    });
+
+    xhr.addEventListener('error', () => {
+      reject(new ApiClientError('S3 part upload failed: Network error'));
+    });
+
+    xhr.addEventListener('abort', () => {
+      reject(new ApiClientError('S3 part upload aborted'));
+    });
+
+    xhr.open('PUT', presignedUrl);
+    xhr.send(part);
+  });
+}
+
 export default api;
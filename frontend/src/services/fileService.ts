@@ -1,4 +1,5 @@
 import api, { uploadToS3 } from './api';
+import { MULTIPART_THRESHOLD, uploadMultipart } from './multipartUpload';
 import { getCurrentUserId } from '../utils/auth';
 
 // Type definitions matching backend DynamoDB schema
@@ -6,7 +7,7 @@ export interface FileMetadata {
   userId: string;
   fileId: string;
   fileName: string;
-  s3Key: string;
+  s3Key?: string; // omitted by the default "summary" listing projection
   contentType: string;
   uploadDate: string;
   status: 'pending' | 'completed' | 'failed';
@@ -15,20 +16,81 @@ export interface FileMetadata {
 }
 
 export interface UploadFileResponse {
-  uploadUrl: string;
+  uploadUrl: string | null; // null when the content was deduplicated
   fileId: string;
+  deduplicated?: boolean;
   message: string;
 }
 
+export interface BatchUploadResponse {
+  files: { fileName: string; fileId: string; uploadUrl: string }[];
+  failed: { fileName: string; error: string }[];
+  message: string;
+}
+
+export interface BatchDownloadResponse {
+  files: { fileId: string; fileName: string; downloadUrl: string }[];
+  notFound: string[];
+  failed: string[]; // throttled; safe to request again
+  expiresIn: number;
+}
+
+export interface ArchiveResponse {
+  archiveId: string;
+  status: 'building' | 'ready' | 'failed';
+  downloadUrl?: string; // present once ready
+  size?: number;
+  fileCount?: number;
+  skipped?: string[]; // selected files that were unavailable
+  error?: string;
+}
+
 export interface ListFilesResponse {
   files: FileMetadata[];
   count: number;
+  hasMore: boolean;
+  nextCursor: string | null;
+}
+
+export interface FileChange {
+  fileId: string;
+  changeType: 'created' | 'updated' | 'deleted';
+  changedAt: number;
+  file: Partial<FileMetadata> | null; // null for deletions
+}
+
+export interface FileChangesResponse {
+  changes: FileChange[];
+  count: number;
+  hasMore: boolean;
+  nextToken: string;
+}
+
+export interface UsageCounters {
+  fileCount: number;
+  totalBytes: number;
+}
+
+export interface UsageResponse extends UsageCounters {
+  byContentType: Record<string, UsageCounters>;
 }
 
 export interface DownloadFileResponse {
   downloadUrl: string;
   fileName: string;
   fileId: string;
+  acceptRanges: 'bytes'; // the URL honours Range requests
+}
+
+export interface FilePreviewResponse {
+  fileId: string;
+  fileName: string;
+  contentType: string;
+  preview: string;
+  encoding: 'utf-8' | 'base64';
+  previewBytes: number;
+  totalSize: number;
+  truncated: boolean;
 }
 
 export interface ShareFileResponse {
@@ -36,6 +98,24 @@ export interface ShareFileResponse {
   shareToken: string;
   expiresAt: string;
   message: string;
+  maxDownloads?: number;
+  reused?: boolean; // an existing live link was returned
+}
+
+export interface ShareLink {
+  shareToken: string;
+  shareUrl: string;
+  createdAt: string;
+  expiresAt: string;
+  downloadCount: number; // updated in batches, may lag a few seconds
+  lastAccessedAt: string | null;
+  maxDownloads: number | null;
+}
+
+export interface ListSharesResponse {
+  fileId: string;
+  shares: ShareLink[];
+  count: number;
 }
 
 export interface DeleteFileResponse {
@@ -43,6 +123,62 @@ export interface DeleteFileResponse {
   fileId: string;
 }
 
+export interface BulkDeleteResponse {
+  results: {
+    fileId: string;
+    status: 'deleted' | 'not_found' | 'failed';
+    error?: string; // failed files can be retried
+  }[];
+  deleted: number;
+  notFound: number;
+  failed: number;
+}
+
+export interface AccountPurgeResponse {
+  status: 'running' | 'complete';
+  phase: string;
+  startedAt: number;
+  updatedAt: number;
+  invocations: number;
+  deleted: {
+    sharesDeleted: number;
+    filesDeleted: number;
+    blobsDeleted: number;
+    archivesDeleted: number;
+    versionsDeleted: number;
+  };
+  activeSeconds: number;
+  deletesPerSecond: number | null;
+}
+
+// POST /files/batch accepts up to 500 files per request
+const BATCH_UPLOAD_SIZE = 500;
+const BATCH_DOWNLOAD_SIZE = 500; // matches the backend's per-request limit
+const ARCHIVE_POLL_INTERVAL_MS = 2000;
+const BULK_DELETE_SIZE = 1000; // matches the backend's per-request limit
+const BATCH_UPLOAD_CONCURRENCY = 4;
+
+/**
+ * SHA-256 of a file's content as hex (for the API) and base64 (for S3)
+ * Returns null where Web Crypto is unavailable (e.g. non-secure contexts)
+ */
+async function sha256Digest(
+  file: File
+): Promise<{ hex: string; base64: string } | null> {
+  if (!window.crypto?.subtle) return null;
+
+  const bytes = new Uint8Array(
+    await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer())
+  );
+  let hex = '';
+  let binary = '';
+  bytes.forEach((byte) => {
+    hex += byte.toString(16).padStart(2, '0');
+    binary += String.fromCharCode(byte);
+  });
+  return { hex, base64: btoa(binary) };
+}
+
 /**
  * File Service - Handles all file-related API operations
  */
@@ -52,6 +188,8 @@ export class FileService {
    * 1. Request presigned URL from backend
    * 2. Upload file directly to S3
    * 3. Backend automatically updates DynamoDB status
+   * Files of MULTIPART_THRESHOLD or more are uploaded as parallel,
+   * resumable multipart parts instead of a single PUT
    */
   static async uploadFile(
     file: File,
@@ -62,23 +200,128 @@ export class FileService {
       throw new Error('User not authenticated');
     }
 
+    if (file.size >= MULTIPART_THRESHOLD) {
+      return uploadMultipart(file, { onProgress });
+    }
+
     // Step 1: Get presigned URL from backend
+    // The digest lets the backend skip the upload for content we already store
+    const digest = await sha256Digest(file);
     const response = await api.post<UploadFileResponse>('/files', {
       fileName: file.name,
       userId,
       contentType: file.type || 'application/octet-stream',
       size: file.size,
+      sha256: digest?.hex,
     });
 
     // Step 2: Upload file to S3 using presigned URL
-    await uploadToS3(response.uploadUrl, file, file.type, onProgress);
+    if (response.uploadUrl) {
+      // The URL is bound to the digest; S3 rejects a body that doesn't match it
+      const headers: Record<string, string> = digest
+        ? { 'x-amz-checksum-sha256': digest.base64 }
+        : {};
+      await uploadToS3(response.uploadUrl, file, file.type, onProgress, headers);
+    } else if (onProgress) {
+      onProgress(100);
+    }
 
     // Return the fileId for tracking
     return response.fileId;
   }
 
+  /**
+   * Upload many files (e.g. a dropped folder)
+   * Small files get their upload URLs from one POST /files/batch per
+   * BATCH_UPLOAD_SIZE files and are PUT a few at a time; large files go
+   * through the multipart engine. Progress is reported across all files.
+   * Returns the fileIds of the files that were uploaded
+   */
+  static async uploadFiles(
+    files: File[],
+    onProgress?: (progress: number) => void
+  ): Promise<string[]> {
+    const userId = await getCurrentUserId();
+    if (!userId) {
+      throw new Error('User not authenticated');
+    }
+
+    const totalBytes = files.reduce((sum, file) => sum + file.size, 0) || 1;
+    const loaded: Record<string, number> = {};
+    const track = (key: string, file: File) => (progress: number) => {
+      loaded[key] = (file.size * progress) / 100;
+      if (onProgress) {
+        const sum = Object.keys(loaded).reduce((acc, k) => acc + loaded[k], 0);
+        onProgress(Math.round((sum / totalBytes) * 100));
+      }
+    };
+
+    const fileIds: string[] = [];
+    const small = files.filter((file) => file.size < MULTIPART_THRESHOLD);
+    for (let start = 0; start < small.length; start += BATCH_UPLOAD_SIZE) {
+      const batch = small.slice(start, start + BATCH_UPLOAD_SIZE);
+      const response = await api.post<BatchUploadResponse>('/files/batch', {
+        files: batch.map((file) => ({
+          fileName: file.name,
+          contentType: file.type || 'application/octet-stream',
+          size: file.size,
+        })),
+      });
+      if (response.failed.length > 0) {
+        throw new Error(`Could not start uploads for: ${response.failed.map((f) => f.fileName).join(', ')}`);
+      }
+
+      // With no failures the response lists files in request order
+      const queue = response.files.map((issued, i) => ({ issued, file: batch[i] }));
+      const worker = async (): Promise<void> => {
+        let next = queue.shift();
+        while (next) {
+          const { issued, file } = next;
+          await uploadToS3(issued.uploadUrl, file, file.type, track(issued.fileId, file));
+          fileIds.push(issued.fileId);
+          next = queue.shift();
+        }
+      };
+      const workers: Promise<void>[] = [];
+      for (let i = 0; i < Math.min(BATCH_UPLOAD_CONCURRENCY, queue.length); i++) {
+        workers.push(worker());
+      }
+      await Promise.all(workers);
+    }
+
+    const large = files.filter((file) => file.size >= MULTIPART_THRESHOLD);
+    for (let i = 0; i < large.length; i++) {
+      fileIds.push(await uploadMultipart(large[i], { onProgress: track(`large-${i}`, large[i]) }));
+    }
+
+    return fileIds;
+  }
+
+  /**
+   * List one page of files for the current user
+   * Pass the previous page's nextCursor to continue where it left off
+   * Listings are sent with an ETag and `Cache-Control: no-cache`, so the
+   * browser revalidates with If-None-Match and unchanged pages come back as 304
+   */
+  static async listFilesPage(
+    cursor?: string | null,
+    limit?: number
+  ): Promise<ListFilesResponse> {
+    const currentUserId = await getCurrentUserId();
+    if (!currentUserId) {
+      throw new Error('User not authenticated');
+    }
+
+    const params = new URLSearchParams({ userId: currentUserId });
+    if (limit) params.set('limit', String(limit));
+    if (cursor) params.set('cursor', cursor);
+
+    return api.get<ListFilesResponse>(`/files?${params.toString()}`);
+  }
+
   /**
    * List all files for the current user
+   * Follows nextCursor until every page has been fetched
    */
   static async listFiles(userId?: string): Promise<FileMetadata[]> {
     const currentUserId = userId || (await getCurrentUserId());
@@ -86,11 +329,100 @@ export class FileService {
       throw new Error('User not authenticated');
     }
 
-    const response = await api.get<ListFilesResponse>(
-      `/files?userId=${currentUserId}`
-    );
+    const files: FileMetadata[] = [];
+    let cursor: string | null = null;
+    do {
+      const params = new URLSearchParams({ userId: currentUserId });
+      if (cursor) params.set('cursor', cursor);
+
+      const response: ListFilesResponse = await api.get<ListFilesResponse>(
+        `/files?${params.toString()}`
+      );
+      files.push(...response.files);
+      cursor = response.hasMore ? response.nextCursor : null;
+    } while (cursor);
+
+    return files;
+  }
+
+  /**
+   * Get files created, updated or deleted since a sync token
+   * Call without a token to get the current head; do that *before* the
+   * initial listFiles() so no change falls between the two
+   * Throws ApiClientError with status 410 when the token is too old to resume
+   */
+  static async getChanges(since?: string): Promise<FileChangesResponse> {
+    const params = new URLSearchParams();
+    if (since) params.set('since', since);
+
+    const query = params.toString();
+    return api.get<FileChangesResponse>(`/files/changes${query ? `?${query}` : ''}`);
+  }
 
-    return response.files;
+  /**
+   * Get the current user's storage usage (totals and per-content-type breakdown)
+   */
+  static async getUsage(): Promise<UsageResponse> {
+    return api.get<UsageResponse>('/usage');
+  }
+
+  /**
+   * Close the account: purge every file, share link and stored version
+   * The purge runs in the background; poll getAccountPurge for progress
+   */
+  static async closeAccount(): Promise<AccountPurgeResponse> {
+    return api.delete<AccountPurgeResponse>('/account', {
+      body: JSON.stringify({ confirm: true }),
+    });
+  }
+
+  /**
+   * Progress of the account purge started by closeAccount
+   */
+  static async getAccountPurge(): Promise<AccountPurgeResponse> {
+    return api.get<AccountPurgeResponse>('/account/purge');
+  }
+
+  /**
+   * Get download URLs for many files in as few requests as possible
+   * Files the user doesn't own are silently omitted; throttled ones are retried
+   */
+  static async getDownloadUrls(
+    fileIds: string[]
+  ): Promise<BatchDownloadResponse['files']> {
+    const files: BatchDownloadResponse['files'] = [];
+    for (let start = 0; start < fileIds.length; start += BATCH_DOWNLOAD_SIZE) {
+      let pending = fileIds.slice(start, start + BATCH_DOWNLOAD_SIZE);
+      for (let attempt = 0; pending.length > 0; attempt++) {
+        const response = await api.post<BatchDownloadResponse>('/files/download-urls', {
+          fileIds: pending,
+        });
+        files.push(...response.files);
+        pending = response.failed;
+        if (pending.length > 0 && attempt >= 2) {
+          throw new Error(`Could not get download URLs for: ${pending.join(', ')}`);
+        }
+      }
+    }
+    return files;
+  }
+
+  /**
+   * Get a download URL for a ZIP of the selected files
+   * The archive is built server-side (or reused if the same files were zipped recently);
+   * this polls until it is ready
+   */
+  static async downloadAsZip(fileIds: string[]): Promise<ArchiveResponse> {
+    let archive = await api.post<ArchiveResponse>('/files/archive', { fileIds });
+    const skipped = archive.skipped;
+    while (archive.status === 'building') {
+      await new Promise((resolve) => setTimeout(resolve, ARCHIVE_POLL_INTERVAL_MS));
+      archive = await api.get<ArchiveResponse>(`/files/archive/${archive.archiveId}`);
+    }
+    if (archive.status === 'failed') {
+      throw new Error(archive.error || 'Archive could not be built');
+    }
+    return { ...archive, skipped };
   }
 
   /**
@@ -110,6 +442,21 @@ export class FileService {
     return response.downloadUrl;
   }
 
+  /**
+   * Get the first `previewKB` KB of a file inline (text as UTF-8, otherwise base64)
+   * For other byte ranges, fetch the downloadFile() URL with a Range header
+   */
+  static async getPreview(
+    fileId: string,
+    previewKB: number = 64
+  ): Promise<FilePreviewResponse> {
+    const params = new URLSearchParams({
+      preview: 'true',
+      previewKB: String(previewKB),
+    });
+    return api.get<FilePreviewResponse>(`/files/${fileId}?${params.toString()}`);
+  }
+
   /**
    * Delete a file
    * Removes both S3 object and DynamoDB metadata
@@ -123,13 +470,29 @@ export class FileService {
     await api.delete<DeleteFileResponse>(`/files/${fileId}?userId=${userId}`);
   }
 
+  /**
+   * Delete many files in one request per 1000 files
+   * Returns the per-file results; failed files are left in place
+   */
+  static async deleteFiles(fileIds: string[]): Promise<BulkDeleteResponse['results']> {
+    const results: BulkDeleteResponse['results'] = [];
+    for (let start = 0; start < fileIds.length; start += BULK_DELETE_SIZE) {
+      const response = await api.post<BulkDeleteResponse>('/files/delete', {
+        fileIds: fileIds.slice(start, start + BULK_DELETE_SIZE),
+      });
+      results.push(...response.results);
+    }
+    return results;
+  }
+
   /**
    * Share a file
    * Creates a shareable link with optional expiration
    */
   static async shareFile(
     fileId: string,
-    expirationHours: number = 24
+    expirationHours: number = 24,
+    maxDownloads?: number
   ): Promise<ShareFileResponse> {
     const userId = await getCurrentUserId();
     if (!userId) {
@@ -138,12 +501,28 @@ export class FileService {
 
     const response = await api.post<ShareFileResponse>(
       `/files/${fileId}/share?userId=${userId}`,
-      { expirationHours }
+      // Uncapped shares reuse a live link, so repeat clicks don't mint new ones
+      maxDownloads ? { expirationHours, maxDownloads } : { expirationHours, reuse: true }
     );
 
     return response;
   }
 
+  /**
+   * List the active share links for a file
+   */
+  static async listShares(fileId: string): Promise<ShareLink[]> {
+    const response = await api.get<ListSharesResponse>(`/files/${fileId}/shares`);
+    return response.shares;
+  }
+
+  /**
+   * Revoke a share link so it stops resolving immediately
+   */
+  static async revokeShare(shareToken: string): Promise<void> {
+    await api.delete(`/shares/${shareToken}`);
+  }
+
   /**
    * Helper: Trigger browser download from presigned URL
    */
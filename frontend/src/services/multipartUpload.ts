@@ -0,0 +1,242 @@
+import api, { ApiClientError, uploadPartToS3 } from './api';
+
+// Files at or above this size are uploaded in parallel parts
+export const MULTIPART_THRESHOLD = 64 * 1024 * 1024; // 64 MB
+
+const DEFAULT_CONCURRENCY = 4;
+const MAX_PART_RETRIES = 3;
+const RETRY_BASE_DELAY_MS = 1000;
+const SIGN_BATCH_SIZE = 100; // matches the backend's per-call limit
+const STORAGE_PREFIX = 'multipart-upload:';
+
+export interface CreateMultipartUploadResponse {
+  fileId: string;
+  uploadId: string;
+  partSize: number;
+  partCount: number;
+  message: string;
+}
+
+export interface SignPartsResponse {
+  fileId: string;
+  parts: { partNumber: number; url: string }[];
+  expiresIn: number;
+}
+
+export interface MultipartUploadOptions {
+  onProgress?: (progress: number) => void;
+  concurrency?: number;
+}
+
+// What survives a tab reload: enough to pick the upload back up by fileId
+interface StoredUpload {
+  fileId: string;
+  uploadId: string;
+  partSize: number;
+  partCount: number;
+  etags: Record<number, string>;
+}
+
+/**
+ * Upload a large file as S3 multipart parts
+ * - Parts are PUT through a bounded pool of `concurrency` workers
+ * - Each part is retried with exponential backoff (fresh URL per retry)
+ * - Progress is aggregated across in-flight parts
+ * - Finished parts are recorded in localStorage, so selecting the same file
+ *   after a reload resumes with only the missing parts
+ * Returns the fileId
+ */
+export async function uploadMultipart(
+  file: File,
+  options: MultipartUploadOptions = {}
+): Promise<string> {
+  const { onProgress, concurrency = DEFAULT_CONCURRENCY } = options;
+  const storageKey = getStorageKey(file);
+
+  let upload = loadUpload(storageKey);
+  let pending = upload ? remainingParts(upload) : [];
+  let urls: Record<number, string> = {};
+
+  if (upload && pending.length > 0) {
+    // The upload may have been aborted or expired since the state was saved
+    try {
+      urls = await signParts(upload.fileId, pending.slice(0, SIGN_BATCH_SIZE));
+    } catch (error) {
+      if (!isGone(error)) throw error;
+      upload = null;
+    }
+  }
+
+  if (!upload) {
+    const created = await api.post<CreateMultipartUploadResponse>('/files/multipart', {
+      fileName: file.name,
+      contentType: file.type || 'application/octet-stream',
+      size: file.size,
+    });
+    upload = {
+      fileId: created.fileId,
+      uploadId: created.uploadId,
+      partSize: created.partSize,
+      partCount: created.partCount,
+      etags: {},
+    };
+    saveUpload(storageKey, upload);
+    pending = remainingParts(upload);
+    urls = {};
+  }
+
+  const state = upload;
+  const loadedByPart: Record<number, number> = {};
+  const reportProgress = () => {
+    if (!onProgress) return;
+    let loaded = 0;
+    Object.keys(state.etags).forEach((partNumber) => {
+      loaded += partLength(file, state, Number(partNumber));
+    });
+    Object.keys(loadedByPart).forEach((partNumber) => {
+      loaded += loadedByPart[Number(partNumber)];
+    });
+    onProgress(Math.min(100, Math.round((loaded / file.size) * 100)));
+  };
+  reportProgress();
+
+  // Sign lazily in batches, starting at the part that needs a URL
+  let signing: Promise<void> | null = null;
+  const getPartUrl = async (partNumber: number): Promise<string> => {
+    while (!urls[partNumber]) {
+      if (!signing) {
+        const batch = pending
+          .filter((n) => n >= partNumber && !urls[n] && !state.etags[n])
+          .slice(0, SIGN_BATCH_SIZE);
+        signing = signParts(state.fileId, batch).then((signed) => {
+          urls = { ...urls, ...signed };
+        }).finally(() => {
+          signing = null;
+        });
+      }
+      await signing;
+    }
+    return urls[partNumber];
+  };
+
+  const uploadPart = async (partNumber: number): Promise<void> => {
+    const start = (partNumber - 1) * state.partSize;
+    const blob = file.slice(start, start + partLength(file, state, partNumber));
+
+    for (let attempt = 0; ; attempt++) {
+      try {
+        const url = await getPartUrl(partNumber);
+        const etag = await uploadPartToS3(url, blob, (loaded) => {
+          loadedByPart[partNumber] = loaded;
+          reportProgress();
+        });
+        delete loadedByPart[partNumber];
+        state.etags[partNumber] = etag;
+        saveUpload(storageKey, state);
+        reportProgress();
+        return;
+      } catch (error) {
+        delete loadedByPart[partNumber];
+        if (attempt >= MAX_PART_RETRIES) throw error;
+        // The URL may have expired; sign a fresh one for the retry
+        delete urls[partNumber];
+        await delay(RETRY_BASE_DELAY_MS * Math.pow(2, attempt));
+      }
+    }
+  };
+
+  // Bounded pool: each worker pulls the next part until the queue is empty
+  const queue = pending.slice();
+  const worker = async (): Promise<void> => {
+    let partNumber = queue.shift();
+    while (partNumber !== undefined) {
+      await uploadPart(partNumber);
+      partNumber = queue.shift();
+    }
+  };
+  const workers: Promise<void>[] = [];
+  for (let i = 0; i < Math.min(concurrency, queue.length); i++) {
+    workers.push(worker());
+  }
+  // On failure the saved state is kept so the upload can be resumed later
+  await Promise.all(workers);
+
+  const parts = [];
+  for (let partNumber = 1; partNumber <= state.partCount; partNumber++) {
+    parts.push({ partNumber, etag: state.etags[partNumber] });
+  }
+  await api.post(`/files/${state.fileId}/multipart/complete`, { parts });
+  localStorage.removeItem(storageKey);
+
+  return state.fileId;
+}
+
+/**
+ * Abort a multipart upload and forget any saved resume state for the file
+ */
+export async function abortMultipartUpload(file: File): Promise<void> {
+  const storageKey = getStorageKey(file);
+  const upload = loadUpload(storageKey);
+  localStorage.removeItem(storageKey);
+  if (upload) {
+    await api.delete(`/files/${upload.fileId}/multipart`);
+  }
+}
+
+async function signParts(
+  fileId: string,
+  partNumbers: number[]
+): Promise<Record<number, string>> {
+  const response = await api.post<SignPartsResponse>(
+    `/files/${fileId}/multipart/parts`,
+    { partNumbers }
+  );
+  const urls: Record<number, string> = {};
+  response.parts.forEach((part) => {
+    urls[part.partNumber] = part.url;
+  });
+  return urls;
+}
+
+function remainingParts(upload: StoredUpload): number[] {
+  const parts: number[] = [];
+  for (let partNumber = 1; partNumber <= upload.partCount; partNumber++) {
+    if (!upload.etags[partNumber]) parts.push(partNumber);
+  }
+  return parts;
+}
+
+function partLength(file: File, upload: StoredUpload, partNumber: number): number {
+  const start = (partNumber - 1) * upload.partSize;
+  return Math.min(upload.partSize, file.size - start);
+}
+
+// A re-selected file is recognised by name, size and modification time
+function getStorageKey(file: File): string {
+  return `${STORAGE_PREFIX}${file.name}:${file.size}:${file.lastModified}`;
+}
+
+function loadUpload(storageKey: string): StoredUpload | null {
+  try {
+    const raw = localStorage.getItem(storageKey);
+    return raw ? (JSON.parse(raw) as StoredUpload) : null;
+  } catch {
+    return null;
+  }
+}
+
+function saveUpload(storageKey: string, upload: StoredUpload): void {
+  try {
+    localStorage.setItem(storageKey, JSON.stringify(upload));
+  } catch {
+    // Storage full or disabled: the upload still works, it just can't resume
+  }
+}
+
+function isGone(error: unknown): boolean {
+  return error instanceof ApiClientError && (error.status === 404 || error.status === 409);
+}
+
+function delay(ms: number): Promise<void> {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
@@ -0,0 +1,40 @@
+#!/bin/bash
+set -e
+
+if [ -z "$1" ]; then
+    echo "Usage: ./deploy-infrastructure.sh <environment>"
+    exit 1
+fi
+
+ENVIRONMENT="$1"
+STACK_NAME="file-storage-$ENVIRONMENT-infrastructure"
+TEMPLATE="infrastructure/cloudformation/infrastructure.yml"
+FINAL_STAGE=4
+
+# DynamoDB accepts only one new GSI per table update, so FilesTable's indexes
+# are added one deploy per FilesTableIndexStage, starting after the stack's
+# current stage. A stack from before the parameter existed is at stage 0.
+# Never deploy a lower stage than the current one: that drops indexes.
+CURRENT_STAGE=$(aws cloudformation describe-stacks \
+    --stack-name "$STACK_NAME" \
+    --query "Stacks[0].Parameters[?ParameterKey=='FilesTableIndexStage'].ParameterValue" \
+    --output text 2>/dev/null || true)
+if ! [[ "$CURRENT_STAGE" =~ ^[0-9]+$ ]]; then
+    CURRENT_STAGE=0
+fi
+
+FIRST_STAGE=$((CURRENT_STAGE + 1))
+if [ "$FIRST_STAGE" -gt "$FINAL_STAGE" ]; then
+    FIRST_STAGE=$FINAL_STAGE
+fi
+
+for STAGE in $(seq "$FIRST_STAGE" "$FINAL_STAGE"); do
+    echo "Deploying $STACK_NAME at FilesTableIndexStage=$STAGE..."
+    aws cloudformation deploy \
+        --template-file "$TEMPLATE" \
+        --stack-name "$STACK_NAME" \
+        --parameter-overrides Environment="$ENVIRONMENT" FilesTableIndexStage="$STAGE" \
+        --no-fail-on-empty-changeset
+done
+
+echo "Infrastructure stack is at FilesTableIndexStage=$FINAL_STAGE"
@@ -10,7 +10,7 @@ BUCKET_NAME="$1"
 ENVIRONMENT="$2"
 FUNCTIONS_DIR="backend/lambda_functions"
 BUILD_DIR="build/lambda-packages"
-FUNCTIONS=("upload_file" "list_files" "download_file" "delete_file" "share_file" "shared_link" "mcp_handler" "chat_handler")
+FUNCTIONS=("upload_file" "list_files" "download_file" "delete_file" "share_file" "shared_link" "mcp_handler" "chat_handler" "list_changes" "file_stream_processor" "get_usage" "multipart_upload" "upload_finalizer" "pending_reaper" "create_archive" "file_purger" "account_purger")
 
 echo "Packaging Lambda functions for deployment.."
 rm -rf "$BUILD_DIR"